@@ -0,0 +1,173 @@
+import numpy as np
+from django.conf import settings
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from .market_data import TTLCache, prefetch_prices
+from .models import Holding, PortfolioHistory, Profile, Transaction
+
+# PortfolioHistory has one row per calendar day
+PERIODS_PER_YEAR = 365
+
+analytics_cache = TTLCache(
+    'analytics',
+    ttl=settings.ANALYTICS_CACHE_TTL,
+    local_size=1024,
+    alias=settings.QUOTE_CACHE_ALIAS,
+)
+
+
+def invalidate_analytics(user_ids, chunk_size=2000):
+    """
+    Make every process recompute analytics for ``user_ids`` on next request.
+    The version lives on Profile, so bumps from workers and management
+    commands reach web processes whatever cache backend they use.
+    """
+    user_ids = sorted(set(user_ids))
+    for i in range(0, len(user_ids), chunk_size):
+        Profile.objects.filter(user_id__in=user_ids[i:i + chunk_size]).update(analytics_version=F('analytics_version') + 1)
+
+
+def analytics_version(user_id):
+    """Changes whenever a trade or a history write invalidates ``user_id``'s analytics."""
+    return Profile.objects.filter(user_id=user_id).values_list('analytics_version', flat=True).first() or 0
+
+
+def _number(value):
+    value = float(value)
+    return None if not np.isfinite(value) else value
+
+
+def performance(dates, values, risk_free_rate=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """
+    Return, volatility, Sharpe ratio and drawdown statistics of a daily value
+    series. Rates are annualized over ``periods_per_year`` and returned as
+    fractions.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2 or values[0] <= 0:
+        return {
+            'daily_returns': [],
+            'cumulative_returns': [],
+            'total_return': None,
+            'annualized_return': None,
+            'annualized_volatility': None,
+            'sharpe_ratio': None,
+            'max_drawdown': None,
+            'max_drawdown_peak': None,
+            'max_drawdown_trough': None,
+        }
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily = values[1:] / values[:-1] - 1
+        daily = np.where(np.isfinite(daily), daily, 0.0)
+        cumulative = values / values[0] - 1
+        years = (len(values) - 1) / periods_per_year
+        annualized = (1 + cumulative[-1]) ** (1 / years) - 1 if cumulative[-1] > -1 else -1.0
+        volatility = daily.std(ddof=1) * np.sqrt(periods_per_year) if len(daily) > 1 else np.nan
+        sharpe = (daily.mean() * periods_per_year - risk_free_rate) / volatility if volatility else np.nan
+
+        peaks = np.maximum.accumulate(values)
+        drawdowns = np.where(peaks > 0, values / peaks - 1, 0.0)
+    trough = int(np.argmin(drawdowns))
+    peak = int(np.argmax(values[:trough + 1]))
+
+    return {
+        'daily_returns': [{'date': day, 'return': value} for day, value in zip(dates[1:], daily.round(6).tolist())],
+        'cumulative_returns': [{'date': day, 'return': value} for day, value in zip(dates, cumulative.round(6).tolist())],
+        'total_return': _number(cumulative[-1]),
+        'annualized_return': _number(annualized),
+        'annualized_volatility': _number(volatility),
+        'sharpe_ratio': _number(sharpe),
+        'max_drawdown': _number(drawdowns[trough]),
+        'max_drawdown_peak': dates[peak] if drawdowns[trough] < 0 else None,
+        'max_drawdown_trough': dates[trough] if drawdowns[trough] < 0 else None,
+    }
+
+
+def position_pnl(ledger, holdings):
+    """
+    Realized and unrealized P&L per ticker. ``ledger`` is a list of
+    (ticker, type, quantity, total_amount) rows and ``holdings`` a list of
+    Holding objects with prices prefetched. A holding's cost basis is
+    shares × average price, so whatever was paid beyond that basis has left
+    through sells: realized = sell proceeds - buy cost + remaining basis.
+    """
+    held = {holding.ticker.ticker: holding for holding in holdings}
+    ledger_tickers = [row[0] for row in ledger]
+    tickers, inverse = np.unique(np.array(ledger_tickers + list(held), dtype=str), return_inverse=True)
+    if not len(tickers):
+        return []
+    n = len(tickers)
+
+    tx = inverse[:len(ledger)]
+    types = np.array([row[1] for row in ledger], dtype=str)
+    amounts = np.array([row[3] for row in ledger], dtype=float)
+    bought = np.bincount(tx, weights=np.where(types == 'BUY', amounts, 0.0), minlength=n)
+    sold = np.bincount(tx, weights=np.where(types == 'SELL', amounts, 0.0), minlength=n)
+
+    h = inverse[len(ledger):]
+    shares = np.zeros(n)
+    average = np.zeros(n)
+    prices = np.zeros(n)
+    shares[h] = [float(holding.shares_owned) for holding in held.values()]
+    average[h] = [float(holding.average_price) for holding in held.values()]
+    prices[h] = [holding.current_price() for holding in held.values()]
+
+    basis = shares * average
+    market_value = shares * prices
+    unrealized = market_value - basis
+    realized = sold - bought + basis
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unrealized_pct = np.where(basis > 0, unrealized / basis, np.nan)
+
+    columns = zip(
+        tickers.tolist(), shares.tolist(), average.tolist(), prices.tolist(), market_value.round(2).tolist(),
+        basis.round(2).tolist(), unrealized.round(2).tolist(), unrealized_pct.tolist(), realized.round(2).tolist(),
+    )
+    return [
+        {
+            'ticker': ticker,
+            'shares_owned': shares_owned,
+            'average_price': average_price,
+            'current_price': current_price,
+            'market_value': value,
+            'cost_basis': cost_basis,
+            'unrealized_pnl': unrealized_pnl,
+            'unrealized_pnl_pct': _number(pct),
+            'realized_pnl': realized_pnl,
+            'total_pnl': round(unrealized_pnl + realized_pnl, 2),
+        }
+        for ticker, shares_owned, average_price, current_price, value, cost_basis, unrealized_pnl, pct, realized_pnl in columns
+    ]
+
+
+def compute_analytics(user):
+    history = list(PortfolioHistory.objects.filter(user=user).order_by('date').values_list('date', Cast('total_value', FloatField())))
+    dates, values = zip(*history) if history else ((), ())
+    dates = [day.isoformat() for day in dates]
+
+    ledger = list(Transaction.objects.filter(user=user).values_list(
+        'stock__ticker', 'transaction_type', Cast('quantity', FloatField()), Cast('total_amount', FloatField())
+    ))
+    holdings = prefetch_prices(Holding.objects.filter(user=user).select_related('ticker'))
+    positions = position_pnl(ledger, holdings)
+
+    return {
+        'start_date': dates[0] if dates else None,
+        'end_date': dates[-1] if dates else None,
+        **performance(dates, values, settings.RISK_FREE_RATE),
+        'positions': positions,
+        'realized_pnl': round(sum(position['realized_pnl'] for position in positions), 2),
+        'unrealized_pnl': round(sum(position['unrealized_pnl'] for position in positions), 2),
+    }
+
+
+def get_analytics(user):
+    """
+    Cached ``compute_analytics(user)``. Entries are keyed by a per-user version
+    that trades and new history rows bump, and expire after
+    ANALYTICS_CACHE_TTL so unrealized P&L follows the market.
+    """
+    version = analytics_version(user.pk)
+    return analytics_cache.get_or_fetch(f'{user.pk}:{version}', lambda: compute_analytics(user))
@@ -6,3 +6,6 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals
+        from django.db.backends.signals import connection_created
+        from api.instrumentation import install_query_hook
+        connection_created.connect(install_query_hook)
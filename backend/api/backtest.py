@@ -0,0 +1,254 @@
+import itertools
+import logging
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .analytics import performance
+from .bars import close_matrix
+from .leaderboard import STARTING_CASH
+from .market_hours import is_trading_day
+from .price_matrix import forward_fill
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def sma(closes, window):
+    """Simple moving average down each column; the first ``window - 1`` rows are NaN."""
+    sums = np.cumsum(np.vstack([np.zeros((1, closes.shape[1])), closes]), axis=0)
+    averages = np.full(closes.shape, np.nan)
+    averages[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return averages
+
+
+def rsi(closes, period):
+    """Wilder's relative strength index down each column."""
+    delta = np.diff(closes, axis=0, prepend=closes[:1])
+    smooth = {'alpha': 1 / period, 'adjust': False, 'min_periods': period}
+    gain = pd.DataFrame(np.clip(delta, 0, None)).ewm(**smooth).mean().to_numpy()
+    loss = pd.DataFrame(np.clip(-delta, 0, None)).ewm(**smooth).mean().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(loss > 0, 100 - 100 / (1 + gain / loss), np.where(np.isnan(loss), np.nan, 100.0))
+
+
+def sma_cross_signal(closes, fast=20, slow=50):
+    """Long while the fast moving average is above the slow one."""
+    return sma(closes, fast) > sma(closes, slow)
+
+
+def rsi_signal(closes, period=14, lower=30, upper=70):
+    """Enter when RSI falls below ``lower`` and stay long until it rises above ``upper``."""
+    values = rsi(closes, period)
+    state = np.where(values < lower, 1.0, np.where(values > upper, 0.0, np.nan))
+    state[0] = np.nan_to_num(state[0])
+    return forward_fill(state) > 0
+
+
+# name: (signal function, {parameter: (default, minimum, maximum)}, lookback in bars)
+STRATEGIES = {
+    'sma_cross': (sma_cross_signal, {'fast': (20, 1, 250), 'slow': (50, 2, 500)}, lambda p: p['slow']),
+    'rsi': (rsi_signal, {'period': (14, 2, 250), 'lower': (30, 1, 99), 'upper': (70, 1, 99)}, lambda p: p['period'] * 5),
+}
+
+
+def load_closes(tickers, start, end, lookback=0):
+    """
+    Trading-day closes for ``tickers`` from ``lookback`` trading days before
+    ``start`` through ``end``, read through close_matrix. Returns the dates and
+    a days × tickers array plus the row where ``start`` falls.
+    """
+    first = start - timedelta(days=math.ceil(lookback * 7 / 5) + 10)
+    closes = close_matrix(tickers, first, end + timedelta(days=1))
+    dates = [first + timedelta(days=offset) for offset in range(closes.shape[0])]
+    trading = np.array([is_trading_day(day) for day in dates], dtype=bool)
+    dates = [day for day, keep in zip(dates, trading) if keep]
+    closes = closes[trading]
+    return dates, closes, int(np.searchsorted(np.array(dates), start))
+
+
+def simulate(closes, target, initial_cash=STARTING_CASH, position_size=0.1):
+    """
+    Trade ``target`` (days × tickers booleans, True = hold) at each day's close
+    with the same rules as BuyStockView and SellStockView: fills at the close
+    rounded to cents, quantities to 4 decimal places, a position is sold in
+    full, and a buy never spends more cash than is available. Each entry is
+    sized at ``position_size`` of equity at that close.
+
+    Signals and valuation are whole-array operations; the only loop is over
+    days on which some position opens or closes. Returns (cash, shares,
+    trades) where cash is per day, shares is days × tickers and trades are
+    (day, column, side, quantity, price, total_amount) tuples.
+    """
+    n_days, n_tickers = closes.shape
+    prices = np.round(closes, 2)
+    target = target & ~np.isnan(closes)
+    change = np.diff(target.astype(np.int8), axis=0, prepend=np.zeros((1, n_tickers), dtype=np.int8))
+
+    cash = np.full(n_days, np.nan)
+    shares = np.full((n_days, n_tickers), np.nan)
+    cash[0] = float(initial_cash)
+    shares[0] = 0.0
+    held = np.zeros(n_tickers)
+    balance = float(initial_cash)
+    trades = []
+    for day in np.flatnonzero((change != 0).any(axis=1)):
+        price = prices[day]
+        sells = np.flatnonzero((change[day] < 0) & (held > 0))
+        proceeds = np.round(held[sells] * price[sells], 2)
+        balance += proceeds.sum()
+        trades.extend((day, column, 'SELL', held[column], price[column], amount) for column, amount in zip(sells, proceeds))
+        held[sells] = 0.0
+
+        buys = np.flatnonzero(change[day] > 0)
+        if len(buys):
+            equity = balance + np.nansum(held * price)
+            budget = np.full(len(buys), position_size * equity)
+            if budget.sum() > balance:
+                budget *= balance / budget.sum()
+            quantity = np.floor(budget / price[buys] * 10000) / 10000
+            cost = np.round(quantity * price[buys], 2)
+            keep = quantity > 0
+            balance -= cost[keep].sum()
+            held[buys[keep]] = quantity[keep]
+            trades.extend((day, column, 'BUY', qty, price[column], amount)
+                          for column, qty, amount in zip(buys[keep], quantity[keep], cost[keep]))
+
+        cash[day] = balance
+        shares[day] = held
+    forward_fill(cash[:, None])
+    forward_fill(shares)
+    return cash, shares, trades
+
+
+def run_backtest(dates, closes, tickers, strategy, params, initial_cash=STARTING_CASH, offset=0, detail=True):
+    """
+    Backtest one parameter set over ``closes`` and report its performance.
+    Signals see the ``offset`` warm-up rows, trading starts after them, and a
+    signal is acted on at the next day's close.
+    """
+    signal, _, _ = STRATEGIES[strategy]
+    signal_params = {name: value for name, value in params.items() if name != 'position_size'}
+    target = signal(closes, **signal_params)
+    target = np.vstack([np.zeros((1, target.shape[1]), dtype=bool), target[:-1]])[offset:]
+    closes = closes[offset:]
+    dates = [day.isoformat() for day in dates[offset:]]
+
+    cash, shares, trades = simulate(closes, target, initial_cash, params.get('position_size', 0.1))
+    equity = cash + np.nansum(shares * np.nan_to_num(closes), axis=1)
+    stats = performance(dates, equity, settings.RISK_FREE_RATE, periods_per_year=TRADING_DAYS_PER_YEAR)
+    result = {
+        'params': params,
+        'final_value': round(float(equity[-1]), 2) if len(equity) else float(initial_cash),
+        'trade_count': len(trades),
+        **{key: value for key, value in stats.items() if key not in ('daily_returns', 'cumulative_returns')},
+    }
+    if detail:
+        result['equity'] = [{'date': day, 'value': value} for day, value in zip(dates, equity.round(2).tolist())]
+        result['trades'] = [
+            {'date': dates[day], 'ticker': tickers[column], 'transaction_type': side,
+             'quantity': float(quantity), 'price_per_share': float(price), 'total_amount': float(amount)}
+            for day, column, side, quantity, price, amount in trades
+        ]
+    return result
+
+
+def parameter_grid(strategy, params):
+    """Expand ``params`` (each a value or a list of values) into validated parameter sets."""
+    _, defaults, _ = STRATEGIES[strategy]
+    specs = {**defaults, 'position_size': (0.1, 0.0001, 1)}
+    unknown = set(params) - set(specs)
+    if unknown:
+        raise ValueError(f'Unknown parameter(s) for {strategy}: {", ".join(sorted(unknown))}.')
+
+    names = list(specs)
+    choices = []
+    for name in names:
+        default, low, high = specs[name]
+        values = params.get(name, default)
+        values = values if isinstance(values, list) else [values]
+        if not values:
+            raise ValueError(f'{name} needs at least one value.')
+        for value in values:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+                raise ValueError(f'{name} must be a number from {low} to {high}.')
+            if isinstance(default, int) and value != int(value):
+                raise ValueError(f'{name} must be an integer.')
+        choices.append([type(default)(value) for value in values])
+    return [dict(zip(names, combination)) for combination in itertools.product(*choices)]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_backtest_pool():
+    """
+    This process's sweep pool of BACKTEST_WORKERS processes, started on first
+    use and kept for later requests. Workers are spawned rather than forked
+    so they never inherit a web worker's threads or database connections.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.BACKTEST_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=django.setup)
+        return _pool
+
+
+def close_backtest_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _sweep_chunk(data, grid):
+    return [run_backtest(**data, params=params, detail=False) for params in grid]
+
+
+def sweep(tickers, start, end, strategy, params, initial_cash=STARTING_CASH, workers=None):
+    """
+    Backtest every parameter set in the grid ``params`` describes. Prices are
+    loaded once. Grids of at least BACKTEST_PARALLEL_MIN_RUNS sets are split
+    into ``workers`` chunks for the shared pool, each shipped with its own
+    copy of the arrays; smaller ones run in this process, where they finish
+    before the pool would pay for itself. Returns results best total return
+    first; a single run also carries its equity curve and trades.
+    """
+    grid = parameter_grid(strategy, params)
+    lookback = max(STRATEGIES[strategy][2](combination) for combination in grid)
+    dates, closes, offset = load_closes(tickers, start, end, lookback)
+    data = {'dates': dates, 'closes': closes, 'tickers': tickers, 'strategy': strategy,
+            'initial_cash': initial_cash, 'offset': offset}
+
+    if len(grid) == 1:
+        return [run_backtest(**data, params=grid[0])]
+
+    workers = min(workers or settings.BACKTEST_WORKERS, len(grid))
+    results = None
+    if workers > 1 and len(grid) >= settings.BACKTEST_PARALLEL_MIN_RUNS:
+        try:
+            futures = [get_backtest_pool().submit(_sweep_chunk, data, grid[i::workers]) for i in range(workers)]
+            # Put results back in grid order so ties sort as they would in process
+            pooled = [None] * len(grid)
+            for i, future in enumerate(futures):
+                pooled[i::workers] = future.result()
+            results = pooled
+        except BrokenProcessPool as e:
+            # A worker died; start a fresh pool next time and finish this sweep here
+            logger.warning('Backtest pool failed, running sweep in process: %s', e)
+            close_backtest_pool()
+    if results is None:
+        results = _sweep_chunk(data, grid)
+    return sorted(results, key=lambda result: -math.inf if result['total_return'] is None else -result['total_return'])
@@ -0,0 +1,187 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.db.models import FloatField, Max, Min, Q
+from django.db.models.functions import Cast
+
+from .market_data import BAR_COLUMNS, get_provider
+from .models import Holding, PriceBar, Stock, Transaction
+from .price_matrix import forward_fill, get_price_matrix, write_price_matrix
+
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def tracked_tickers():
+    """Tickers anyone holds or has ever traded, i.e. everything history valuation needs."""
+    held = Holding.objects.values_list('ticker__ticker', flat=True)
+    traded = Transaction.objects.values_list('stock__ticker', flat=True)
+    return set(held) | set(traded)
+
+
+def _decimal(value):
+    return Decimal(str(round(float(value), 4)))
+
+
+def _bars_from_frame(stock, frame):
+    return [
+        PriceBar(
+            stock=stock,
+            date=day,
+            open=_decimal(open_),
+            high=_decimal(high),
+            low=_decimal(low),
+            close=_decimal(close),
+            volume=int(volume) if volume == volume else 0,
+        )
+        for day, open_, high, low, close, volume in frame[BAR_COLUMNS].itertuples()
+    ]
+
+
+def sync_bars(tickers=None, since=None, batch_size=50, chunk_size=1000, rebuild_matrix=True, log=None):
+    """
+    Bring the bar store up to date for ``tickers`` (default: every tracked
+    ticker). Each ticker is fetched from its last stored bar onwards, so a
+    partial bar for today is refreshed on the next sync, and tickers sharing
+    a start date are fetched together in batches of ``batch_size``. Refetched
+    bars identical to the stored ones are not written. With ``rebuild_matrix``
+    the shared price matrix is rebuilt when bars changed or it no longer
+    reaches today. Returns the number of bars written.
+    """
+    if tickers is None:
+        tickers = tracked_tickers()
+    stocks = {stock.ticker: stock for stock in Stock.objects.filter(ticker__in=[ticker.upper() for ticker in tickers])}
+    if not stocks:
+        return 0
+
+    end = date.today() + timedelta(days=1)
+    if since is None:
+        first_joined = User.objects.aggregate(first=Min('date_joined'))['first']
+        since = first_joined.date() if first_joined else date.today()
+    last_bars = dict(
+        PriceBar.objects.filter(stock__in=stocks.values()).values('stock').annotate(last=Max('date')).values_list('stock', 'last')
+    )
+    # The last stored bar of each ticker is fetched again; remember it to tell whether it moved
+    stored = {
+        (stock_id, day): values
+        for stock_id, day, *values in PriceBar.objects.filter(
+            stock__in=list(last_bars), date__in=set(last_bars.values())
+        ).values_list('stock', 'date', *BAR_FIELDS)
+        if last_bars[stock_id] == day
+    }
+
+    # Group tickers by the first date they are missing so each batch is one request
+    by_start = {}
+    for ticker, stock in stocks.items():
+        start = last_bars.get(stock.pk, since)
+        by_start.setdefault(start, []).append(ticker)
+
+    written = 0
+    provider = get_provider()
+    for start, group in sorted(by_start.items()):
+        for i in range(0, len(group), batch_size):
+            batch = group[i:i + batch_size]
+            bars = provider.get_bars(batch, start, end)
+            rows = [
+                bar for ticker, frame in bars.items() for bar in _bars_from_frame(stocks[ticker], frame)
+                if stored.get((bar.stock_id, bar.date)) != [getattr(bar, field) for field in BAR_FIELDS]
+            ]
+            PriceBar.objects.bulk_create(
+                rows,
+                batch_size=chunk_size,
+                update_conflicts=True,
+                unique_fields=['stock', 'date'],
+                update_fields=BAR_FIELDS,
+            )
+            written += len(rows)
+            if log:
+                log(f'Synced {len(rows)} bars for {len(batch)} tickers from {start}.')
+
+    if rebuild_matrix:
+        shared = get_price_matrix()
+        if written or shared is None or shared.end <= date.today():
+            shape = build_price_matrix()
+            if log and shape:
+                log(f'Rebuilt price matrix: {shape[0]} days x {shape[1]} tickers.')
+    return written
+
+
+def close_matrix(tickers, start, end):
+    """
+    Return a (calendar days in [start, end)) × len(tickers) float array of
+    closes read from the bar store. Days without a bar carry the last known
+    close forward, including the last close before ``start``; a ticker's days
+    before its first known close hold that first close. Tickers without any
+    bars are left as NaN. Served from the shared price matrix when it covers
+    the request.
+    """
+    tickers = [ticker.upper() for ticker in tickers]
+    shared = get_price_matrix()
+    if shared is not None:
+        matrix = shared.range(tickers, start, end)
+        if matrix is not None:
+            return matrix
+
+    columns = {ticker: i for i, ticker in enumerate(tickers)}
+    n_days = max((end - start).days, 0)
+    matrix = np.full((n_days, len(tickers)), np.nan)
+    if not n_days or not tickers:
+        return matrix
+
+    rows = list(PriceBar.objects.filter(
+        stock__ticker__in=tickers, date__gte=start, date__lt=end
+    ).values_list('stock__ticker', 'date', Cast('close', FloatField())))
+    if rows:
+        bar_tickers, bar_dates, bar_closes = zip(*rows)
+        days = np.array([(day - start).days for day in bar_dates])
+        cols = np.array([columns[ticker] for ticker in bar_tickers])
+        matrix[days, cols] = np.array(bar_closes, dtype=float)
+
+    # Seed the first row with each ticker's last close before the range
+    seeds = PriceBar.objects.filter(stock__ticker__in=tickers, date__lt=start).values('stock').annotate(last=Max('date'))
+    seed_filter = Q()
+    for row in seeds:
+        seed_filter |= Q(stock=row['stock'], date=row['last'])
+    if seed_filter:
+        for ticker, close in PriceBar.objects.filter(seed_filter).values_list('stock__ticker', 'close'):
+            if np.isnan(matrix[0, columns[ticker]]):
+                matrix[0, columns[ticker]] = float(close)
+
+    forward_fill(matrix)
+    # Back-fill the leading gap of tickers whose history starts inside the range
+    forward_fill(matrix[::-1])
+    return matrix
+
+
+def build_price_matrix(path=None, chunk_size=10000):
+    """
+    Rebuild the shared price matrix from every bar in the store and swap it in.
+    Rows run through today, carrying the last close forward, so the matrix
+    covers every date the store can answer for. Returns the (days, tickers)
+    shape written, or None if there are no bars.
+    """
+    bounds = PriceBar.objects.aggregate(first=Min('date'), last=Max('date'))
+    if bounds['first'] is None:
+        return None
+    start = bounds['first']
+    end = max(bounds['last'], date.today())
+    tickers = sorted(PriceBar.objects.values_list('stock__ticker', flat=True).distinct())
+    columns = {ticker: i for i, ticker in enumerate(tickers)}
+    closes = np.full(((end - start).days + 1, len(tickers)), np.nan)
+
+    rows = PriceBar.objects.values_list('stock__ticker', 'date', Cast('close', FloatField())).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        bar_tickers, bar_dates, bar_closes = zip(*chunk)
+        days = np.array([(day - start).days for day in bar_dates])
+        cols = np.array([columns[ticker] for ticker in bar_tickers])
+        closes[days, cols] = np.array(bar_closes, dtype=float)
+
+    forward_fill(closes)
+    write_price_matrix(closes, start, tickers, path=path)
+    return closes.shape
@@ -0,0 +1,1112 @@
+import asyncio
+import contextlib
+import io
+import logging
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import OperationalError, connection as db_connection, transaction as db_transaction
+from django.db.models import Case, IntegerField, Q, Sum, When
+from django.test import AsyncClient, Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .analytics import analytics_cache
+from .backtest import close_backtest_pool, load_closes, run_backtest, sweep
+from .bars import build_price_matrix, close_matrix, sync_bars
+from .history import portfolio_values, rebuild_history
+from .intraday import capacity as intraday_capacity, rollup, sample
+from .leaderboard import get_leaderboard, holders, update_scores
+from .market_data import get_provider, history_cache, info_cache, quote_cache
+from .market_hours import last_session_day, session_open
+from .models import Holding, Order, OutboundEmail, PortfolioHistory, PortfolioSnapshot, PriceBar, Profile, Stock, Transaction
+from .orders import load_order_books, match_orders
+from .outbox import send_pending
+from .pagination import KeysetPagination
+from .price_matrix import get_price_matrix
+from .prices import held_tickers, refresh_prices
+from .search import TickerSearchIndex
+from .serializers import DashboardSerializer, HoldingSerializer, PortfolioHistorySerializer, TransactionSerializer
+from .snapshots import refresh_snapshots
+from .trading import OrderError, execute_order
+
+
+@contextlib.contextmanager
+def benchmark_environment(latency=0.0):
+    """
+    Run inside a throwaway test database with the fake market data provider so
+    benchmarks never touch real data or the network.
+    """
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+    try:
+        with tempfile.TemporaryDirectory() as matrix_path, override_settings(
+            MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider',
+            MARKET_DATA_PROVIDER_OPTIONS={'latency': latency},
+            PRICE_MATRIX_PATH=matrix_path,
+            INTRADAY_CACHE_ALIAS='default',
+        ):
+            yield get_provider()
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+@contextlib.contextmanager
+def rollback():
+    with db_transaction.atomic():
+        yield
+        db_transaction.set_rollback(True)
+
+
+@contextlib.contextmanager
+def explicit_timestamps():
+    # Let seeded transactions keep their backdated timestamps
+    field = Transaction._meta.get_field('timestamp')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def clear_market_data_caches():
+    for cache in (quote_cache, info_cache, history_cache):
+        cache.clear()
+        cache.shared.clear()
+
+
+def timed(fn, iterations, before=None):
+    samples = []
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def measure(fn, iterations, before=None):
+    """p50/p95/mean latency, throughput and mean DB queries per call of ``fn``."""
+    samples = []
+    queries = []
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        # The query log is a bounded deque; start empty so long runs still count correctly
+        db_connection.queries_log.clear()
+        with CaptureQueriesContext(db_connection) as context:
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context.captured_queries))
+    mean = statistics.mean(samples)
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'mean_ms': mean,
+        'ops_per_s': 1000 / mean if mean else 0.0,
+        'queries': statistics.mean(queries),
+    }
+
+
+def describe(stats):
+    return f'p50={stats["p50_ms"]:8.2f}ms p95={stats["p95_ms"]:8.2f}ms {stats["queries"]:5.1f} queries'
+
+
+def seed_stocks(count):
+    Stock.objects.bulk_create(
+        [Stock(ticker=f'T{i:04d}', company_name=f'Test Company {i}', current_price=Decimal('100.00')) for i in range(count)],
+        ignore_conflicts=True,
+    )
+    return list(Stock.objects.order_by('ticker')[:count])
+
+
+def bearer(user):
+    return f'Bearer {AccessToken.for_user(user)}'
+
+
+def seed_user(username, stocks, shares=Decimal('10.0000')):
+    user = User.objects.create(username=username)
+    Holding.objects.bulk_create([
+        Holding(user=user, ticker=stock, company_name=stock.company_name, shares_owned=shares, average_price=Decimal('100.00'))
+        for stock in stocks
+    ])
+    return user
+
+
+def seed_traders(count, stocks, days, trades_per_user=10, prefix='trader', seed=0):
+    """
+    Bulk-create ``count`` users who joined ``days`` ago, each with a ledger of
+    buys (selling half of every other position) priced from the bar store,
+    plus Holding and Profile rows consistent with that ledger.
+    """
+    rng = np.random.default_rng(seed)
+    joined = timezone.now() - timedelta(days=days)
+    User.objects.bulk_create([User(username=f'{prefix}_{i}', date_joined=joined) for i in range(count)], batch_size=5000)
+    users = list(User.objects.filter(username__startswith=f'{prefix}_').order_by('pk'))
+    Profile.objects.bulk_create([Profile(user=user, is_email_verified=True) for user in users], batch_size=5000)
+
+    closes = {(stock_id, day): close for stock_id, day, close in PriceBar.objects.values_list('stock_id', 'date', 'close')}
+    bar_dates = sorted({day for _, day in closes})
+    tz = timezone.get_current_timezone()
+    transactions = []
+    holdings = []
+    cash = {}
+    for user in users:
+        balance = Decimal('10000.00')
+        picks = rng.choice(len(stocks), size=min(trades_per_user, len(stocks)), replace=False)
+        trade_days = np.sort(rng.integers(0, len(bar_dates), size=len(picks)))
+        for n, (pick, day_index) in enumerate(zip(picks, trade_days)):
+            stock = stocks[pick]
+            day = bar_dates[day_index]
+            price = closes.get((stock.pk, day))
+            if price is None:
+                continue
+            price = price.quantize(Decimal('0.01'))
+            quantity = (balance / (len(picks) - n) / price).quantize(Decimal('0.0001'))
+            if quantity <= 0:
+                continue
+            stamp = timezone.make_aware(datetime.combine(day, dt_time(12)), tz)
+            transactions.append(Transaction(user=user, stock=stock, transaction_type='BUY', quantity=quantity,
+                                            price_per_share=price, total_amount=quantity * price, timestamp=stamp))
+            balance -= quantity * price
+            if n % 2:
+                sold = (quantity / 2).quantize(Decimal('0.0001'))
+                transactions.append(Transaction(user=user, stock=stock, transaction_type='SELL', quantity=sold,
+                                                price_per_share=price, total_amount=sold * price,
+                                                timestamp=stamp + timedelta(hours=1)))
+                balance += sold * price
+                quantity -= sold
+            holdings.append(Holding(user=user, ticker=stock, company_name=stock.company_name,
+                                    shares_owned=quantity, average_price=price))
+        cash[user.pk] = balance.quantize(Decimal('0.01'))
+
+    with explicit_timestamps():
+        Transaction.objects.bulk_create(transactions, batch_size=5000)
+    Holding.objects.bulk_create(holdings, batch_size=5000)
+    profiles = list(Profile.objects.filter(user__in=users))
+    for profile in profiles:
+        profile.cash = cash[profile.user_id]
+    Profile.objects.bulk_update(profiles, ['cash'], batch_size=5000)
+    return users
+
+
+def legacy_trade(user, stock, side, quantity):
+    """
+    The read-modify-save body BuyStockView and SellStockView used to run. The
+    profile and holding are read at the start of the request, as
+    request.user.profile was, so concurrent orders save over each other.
+    """
+    profile = Profile.objects.get(user=user)
+    holding = Holding.objects.filter(user=user, ticker=stock).first()
+    stock.update_current_price(fresh=True)
+    amount = quantity * stock.current_price
+    with db_transaction.atomic():
+        if side == 'BUY':
+            if profile.cash < amount:
+                raise OrderError('Insufficient balance.')
+            profile.cash -= amount
+            if holding is None:
+                holding = Holding(user=user, ticker=stock, company_name=stock.company_name, shares_owned=0,
+                                  average_price=stock.current_price)
+            else:
+                holding.average_price = (holding.shares_owned * holding.average_price + amount) / (holding.shares_owned + quantity)
+            holding.shares_owned += quantity
+        else:
+            if holding is None or holding.shares_owned < quantity:
+                raise OrderError('Insufficient shares to sell.')
+            profile.cash += amount
+            holding.shares_owned -= quantity
+        profile.save()
+        holding.save()
+        Transaction.objects.create(user=user, stock=stock, transaction_type=side, quantity=quantity,
+                                   price_per_share=stock.current_price, total_amount=amount)
+
+
+def legacy_crossed_orders(stocks):
+    """Scan every open order on ``stocks`` for those their current_price crosses or triggers."""
+    prices = {stock.pk: stock.current_price for stock in stocks}
+    crossed = []
+    rows = Order.objects.filter(status='OPEN', stock__in=list(prices)).values_list(
+        'id', 'stock_id', 'side', 'order_type', 'limit_price', 'stop_price', 'triggered_at'
+    )
+    for order_id, stock_id, side, order_type, limit_price, stop_price, triggered_at in rows:
+        price = prices[stock_id]
+        if order_type == 'LIMIT' or triggered_at:
+            hit = price <= limit_price if side == 'BUY' else price >= limit_price
+        else:
+            hit = price >= stop_price if side == 'BUY' else price <= stop_price
+        if hit:
+            crossed.append(order_id)
+    return crossed
+
+
+def legacy_reset_portfolio_history(users):
+    """
+    The per-user, per-day, per-holding loop reset_portfolio_history used to
+    run, reading closes from the bar store instead of the network.
+    """
+    today = timezone.localdate()
+    for user in users:
+        current_date = timezone.localdate(user.date_joined)
+        while current_date <= today:
+            if not PortfolioHistory.objects.filter(user=user, date=current_date).exists():
+                total_value = float(user.profile.cash)
+                for holding in Holding.objects.filter(user=user):
+                    close = PriceBar.objects.filter(
+                        stock=holding.ticker_id, date__lte=current_date
+                    ).order_by('-date').values_list('close', flat=True).first()
+                    if close is not None:
+                        total_value += float(holding.shares_owned) * float(close)
+                PortfolioHistory.objects.create(user=user, date=current_date, total_value=total_value)
+            current_date += timedelta(days=1)
+
+
+def seed_ticker_universe():
+    # The real ~8k ticker universe shipped with the repo
+    for name in ('tickers.csv', 'tickers1.csv'):
+        call_command('import_stocks', str(settings.BASE_DIR / name), stdout=io.StringIO())
+    return Stock.objects.count()
+
+
+def legacy_ticker_suggestions(query):
+    # The ORM query TickerSuggestionsAPIView used to run on every keystroke
+    return list(Stock.objects.annotate(
+        priority=Case(When(ticker__iexact=query, then=1), default=0, output_field=IntegerField())
+    ).filter(
+        Q(ticker__icontains=query) | Q(company_name__icontains=query)
+    ).order_by('-priority', 'ticker')[:10])
+
+
+class SlowEmailBackend(locmem.EmailBackend):
+    """locmem backend that charges an SMTP/TLS handshake per connection and a round trip per message."""
+
+    handshake = 0.2
+    per_message = 0.01
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_open = False
+
+    def open(self):
+        if self.is_open:
+            return False
+        time.sleep(self.handshake)
+        self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            time.sleep(self.per_message * len(messages))
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+def legacy_dashboard(user):
+    """The body DashboardView used to run: every holding serialized and priced per request."""
+    history = PortfolioHistorySerializer(PortfolioHistory.objects.filter(user=user).order_by('date'), many=True)
+    holdings = HoldingSerializer(Holding.objects.filter(user=user).select_related('ticker'), many=True)
+    return DashboardSerializer({'portfolio_history': history.data, 'current_holdings': holdings.data}).data
+
+
+def bench_dashboard(provider, options, write):
+    """
+    Dashboard latency for 1..200 holdings read from the portfolio snapshot,
+    against the old per-request serialization with a cold quote cache.
+    """
+    client = APIClient()
+    stocks = seed_stocks(200)
+    # Measure the quote path, not prices another scenario left in the database
+    Stock.objects.update(price_updated_at=None)
+    rows = []
+    for count in (1, 10, 50, 100, 200):
+        user = seed_user(f'bench_dashboard_{count}', stocks[:count])
+        client.force_authenticate(user)
+        refresh_snapshots([user.pk])
+        calls = provider.calls
+        stats = measure(lambda: client.get('/api/dashboard/'), options['iterations'], before=clear_market_data_caches)
+        upstream = (provider.calls - calls) / options['iterations']
+        calls = provider.calls
+        legacy = measure(lambda: legacy_dashboard(user), options['iterations'], before=clear_market_data_caches)
+        rows.append({'name': f'holdings={count}', **stats, 'upstream_calls': upstream,
+                     'legacy_p50_ms': legacy['p50_ms'], 'legacy_queries': legacy['queries'],
+                     'legacy_upstream_calls': (provider.calls - calls) / options['iterations']})
+        write(f'holdings={count:<4} {describe(stats)} upstream calls/request={upstream:.1f} | '
+              f'old p50={legacy["p50_ms"]:8.2f}ms {legacy["queries"]:5.1f} queries '
+              f'upstream calls/request={rows[-1]["legacy_upstream_calls"]:.1f}')
+    return rows
+
+
+def bench_dashboard_history(provider, options, write):
+    """Dashboard loads over ``--years`` of daily history: full series, a range, monthly, a delta and a 304 revalidation."""
+    stocks = seed_stocks(20)
+    user = seed_user('bench_dashboard_history', stocks)
+    days = 365 * options['years']
+    today = timezone.localdate()
+    PortfolioHistory.objects.filter(user=user).delete()
+    PortfolioHistory.objects.bulk_create([
+        PortfolioHistory(user=user, date=today - timedelta(days=days - i), total_value=Decimal('10000.00') + i)
+        for i in range(days + 1)
+    ])
+    client = APIClient()
+    client.force_authenticate(user)
+    etag = client.get('/api/dashboard/')['ETag']
+    runs = (
+        ('full series', {}, {}),
+        ('last 3 months', {'from': (today - timedelta(days=90)).isoformat()}, {}),
+        ('monthly', {'resolution': 'monthly'}, {}),
+        ('since yesterday', {'since': (today - timedelta(days=1)).isoformat()}, {}),
+        ('if-none-match', {}, {'HTTP_IF_NONE_MATCH': etag}),
+    )
+    rows = []
+    for name, params, headers in runs:
+        response = client.get('/api/dashboard/', params, **headers)
+        stats = measure(lambda: client.get('/api/dashboard/', params, **headers), options['iterations'])
+        rows.append({'name': name, **stats, 'status': response.status_code, 'payload_bytes': len(response.content)})
+        write(f'{name:<16} {describe(stats)} status={response.status_code} payload={len(response.content) / 1024:.1f}KiB')
+    return rows
+
+
+def bench_intraday(provider, options, write):
+    """
+    A full session of intraday samples for ``--users`` active users, reads of
+    /api/portfolio/intraday/ from the ring buffers, and the roll-up at close.
+    """
+    User.objects.bulk_create([User(username=f'bench_intraday_{i}') for i in range(options['users'])], batch_size=5000)
+    users = list(User.objects.filter(username__startswith='bench_intraday_').order_by('pk'))
+    Profile.objects.bulk_create([Profile(user=user) for user in users], batch_size=5000)
+    PortfolioSnapshot.objects.bulk_create([
+        PortfolioSnapshot(user=user, cash=Decimal('5000.00'), market_value=Decimal('5000.00'), cost_basis=Decimal('5000.00'),
+                          day_change=Decimal('0.00'))
+        for user in users
+    ], batch_size=5000)
+
+    day = last_session_day()
+    interval = settings.INTRADAY_INTERVAL
+    size = intraday_capacity()
+    # A few more samples than the buffer holds, so it wraps
+    moments = [session_open(day) + timedelta(seconds=interval * i) for i in range(size + 5)]
+    samples = []
+    for i, moment in enumerate(moments):
+        PortfolioSnapshot.objects.update(market_value=Decimal('5000.00') + i)
+        start = time.perf_counter()
+        sample(now=moment)
+        samples.append((time.perf_counter() - start) * 1000)
+    rows = [{'name': 'sample', 'p50_ms': float(np.percentile(samples, 50)), 'mean_ms': statistics.mean(samples), 'users': len(users)}]
+    write(f'sample             p50={rows[-1]["p50_ms"]:8.2f}ms for {len(users)} users, {len(moments)} samples into {size} slots')
+
+    client = APIClient()
+    client.force_authenticate(users[-1])
+    response = client.get('/api/portfolio/intraday/')
+    points = response.json()['points']
+    calls = provider.calls
+    stats = measure(lambda: client.get('/api/portfolio/intraday/'), options['iterations'])
+    rows.append({'name': 'endpoint', **stats, 'points': len(points), 'upstream_calls': provider.calls - calls})
+    write(f'endpoint           {describe(stats)} points={len(points)} (newest {points[-1]["value"]}) '
+          f'upstream calls={provider.calls - calls}')
+
+    start = time.perf_counter()
+    written = rollup(day)
+    elapsed = time.perf_counter() - start
+    rows.append({'name': 'rollup', 'elapsed_s': elapsed, 'rows': written})
+    write(f'rollup             {elapsed:7.3f}s wrote {written} PortfolioHistory rows for {day}')
+    return rows
+
+
+def bench_trade(provider, options, write):
+    """BuyStockView and SellStockView round trips, each fetching a fresh quote."""
+    client = APIClient()
+    stocks = seed_stocks(10)
+    user = seed_user('bench_trader', stocks)
+    Profile.objects.filter(user=user).update(is_email_verified=True, cash=Decimal('100000000.00'))
+    client.force_authenticate(User.objects.get(pk=user.pk))
+    rows = []
+    for action in ('buy', 'sell'):
+        url = f'/api/{action}-stock/{stocks[0].ticker}/'
+
+        def trade():
+            response = client.post(url, {'quantity': '1'}, format='json')
+            assert response.status_code == 200, response.content
+
+        stats = measure(trade, options['iterations'])
+        rows.append({'name': action, **stats})
+        write(f'{action:<4} {describe(stats)}')
+    return rows
+
+
+def bench_basket(provider, options, write):
+    """A 50-leg rebalance through /api/orders/batch/ against 50 single trades and against one."""
+    stocks = seed_stocks(50)
+    user = seed_user('bench_basket', stocks)
+    Profile.objects.filter(user=user).update(is_email_verified=True, cash=Decimal('100000000.00'))
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user.pk))
+    legs = [{'ticker': stock.ticker, 'side': 'BUY' if i % 2 else 'SELL', 'quantity': '1'} for i, stock in enumerate(stocks)]
+
+    def post(url, data):
+        response = client.post(url, data, format='json')
+        assert response.status_code == 200, response.content
+
+    rows = []
+    runs = (
+        ('single trade', lambda: post(f'/api/buy-stock/{stocks[0].ticker}/', {'quantity': '1'})),
+        ('50 single trades', lambda: [post(f'/api/{leg["side"].lower()}-stock/{leg["ticker"]}/', {'quantity': '1'}) for leg in legs]),
+        ('50-leg basket', lambda: post('/api/orders/batch/', {'orders': legs})),
+    )
+    for name, fn in runs:
+        calls = provider.calls
+        stats = measure(fn, options['iterations'])
+        rows.append({'name': name, **stats, 'upstream_calls': (provider.calls - calls) / options['iterations']})
+        write(f'{name:<17} {describe(stats)} upstream calls={rows[-1]["upstream_calls"]:.0f}')
+    return rows
+
+
+def bench_trade_contention(provider, options, write):
+    """
+    Orders per second with ``--threads`` workers trading one account at once,
+    and whether cash and shares still agree with the ledger afterwards. The
+    legacy read-modify-save path is run the same way for comparison.
+    """
+    stocks = seed_stocks(4)
+    orders = options['iterations'] * 20
+    rng = np.random.default_rng(0)
+    plan = [(stocks[i % len(stocks)], 'BUY' if buy else 'SELL', Decimal('1'))
+            for i, buy in enumerate(rng.random(orders) < 0.5)]
+    start_cash = Decimal('1000000.00')
+    start_shares = Decimal('100.0000')
+
+    rows = []
+    for label, trade in (('row-locked', execute_order), ('legacy', legacy_trade)):
+        user = seed_user(f'bench_contention_{label}', stocks, shares=start_shares)
+        Profile.objects.filter(user=user).update(cash=start_cash)
+        results = {'rejected': 0, 'retries': 0}
+
+        def place(order):
+            stock, side, quantity = order
+            retries = 0
+            try:
+                while True:
+                    try:
+                        trade(user, stock, side, quantity)
+                        return False, retries
+                    except OrderError:
+                        return True, retries
+                    except OperationalError:
+                        # SQLite locks whole tables and fails instead of waiting; retry like a client would
+                        retries += 1
+                        time.sleep(0.001)
+            finally:
+                db_connection.close()
+
+        begin = time.perf_counter()
+        # Leaderboard refreshes that lose the same race are logged by on_commit, not raised
+        on_commit_log = logging.getLogger('django.db.backends.base')
+        on_commit_log.disabled = True
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            for rejected, retries in pool.map(place, plan):
+                results['rejected'] += rejected
+                results['retries'] += retries
+        on_commit_log.disabled = False
+        elapsed = time.perf_counter() - begin
+
+        ledger = Transaction.objects.filter(user=user)
+        results['filled'] = ledger.count()
+        flows = dict(ledger.values('transaction_type').annotate(total=Sum('total_amount')).values_list('transaction_type', 'total'))
+        cash = Profile.objects.get(user=user).cash
+        expected_cash = start_cash - flows.get('BUY', 0) + flows.get('SELL', 0)
+        consistent = cash == expected_cash
+        for stock in stocks:
+            moved = dict(ledger.filter(stock=stock).values('transaction_type').annotate(total=Sum('quantity'))
+                         .values_list('transaction_type', 'total'))
+            held = Holding.objects.filter(user=user, ticker=stock).values_list('shares_owned', flat=True).first() or 0
+            consistent &= held == start_shares + moved.get('BUY', 0) - moved.get('SELL', 0)
+
+        rows.append({'name': label, 'orders': orders, 'elapsed_s': elapsed, 'orders_per_s': orders / elapsed,
+                     **results, 'consistent': consistent})
+        write(f'{label:<10} threads={options["threads"]} {orders} orders in {elapsed:.2f}s -> {orders / elapsed:7.1f} orders/s '
+              f'filled={results["filled"]} rejected={results["rejected"]} retries={results["retries"]} '
+              f'cash and shares match ledger={consistent}')
+    return rows
+
+
+def bench_order_book(provider, options, write):
+    """
+    Price updates against ``--orders`` open limit, stop and stop-limit orders:
+    per-ticker order books against scanning every open order, then
+    match_orders end to end with each crossed order filled in the database.
+    """
+    count = options['orders']
+    stocks = seed_stocks(100)
+    Stock.objects.update(current_price=Decimal('100.00'))
+    User.objects.bulk_create([User(username=f'bench_orders_{i}') for i in range(options['users'])], batch_size=5000)
+    users = list(User.objects.filter(username__startswith='bench_orders_'))
+    Profile.objects.bulk_create([Profile(user=user, cash=Decimal('1000000000.00')) for user in users], batch_size=5000)
+    Holding.objects.bulk_create([
+        Holding(user=user, ticker=stock, company_name=stock.company_name, shares_owned=Decimal('1000000'),
+                average_price=Decimal('100.00'))
+        for user in users for stock in stocks
+    ], batch_size=5000)
+
+    # Limits and stops spread up to $20 either side of the $100 price, on the side that rests
+    rng = np.random.default_rng(0)
+    sides = rng.choice(['BUY', 'SELL'], count)
+    types = rng.choice(['LIMIT', 'STOP', 'STOP_LIMIT'], count)
+    offsets = np.round(rng.uniform(0.01, 20, count), 2)
+    orders = []
+    for i in range(count):
+        below = (sides[i] == 'BUY') == (types[i] == 'LIMIT')
+        trigger = Decimal('100.00') + Decimal(str(-offsets[i] if below else offsets[i]))
+        limit_price, stop_price = trigger, None
+        if types[i] != 'LIMIT':
+            stop_price = trigger
+            limit_price = trigger + (Decimal('0.50') if sides[i] == 'BUY' else Decimal('-0.50')) if types[i] == 'STOP_LIMIT' else None
+        orders.append(Order(user=users[i % len(users)], stock=stocks[i % len(stocks)], side=sides[i], order_type=types[i],
+                            quantity=Decimal('1'), limit_price=limit_price, stop_price=stop_price))
+    Order.objects.bulk_create(orders, batch_size=5000)
+
+    rows = []
+    start = time.perf_counter()
+    books = load_order_books()
+    elapsed = time.perf_counter() - start
+    rows.append({'name': 'load books', 'elapsed_s': elapsed, 'orders': count})
+    write(f'load books         {elapsed:7.3f}s for {count} open orders in {len(books)} books')
+
+    # Each tick lifts every price 5 cents, crossing the next slice of sell limits and buy stops
+    scan_samples, book_samples = [], []
+    taken = set()
+    matches = True
+    for tick in range(1, options['iterations'] + 1):
+        for stock in stocks:
+            stock.current_price = Decimal('100.00') + Decimal('0.05') * tick
+        start = time.perf_counter()
+        scanned = legacy_crossed_orders(stocks)
+        scan_samples.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        crossed = [books[stock.pk].cross(stock.current_price) for stock in stocks]
+        book_samples.append((time.perf_counter() - start) * 1000)
+        for fills, triggered in crossed:
+            taken.update(fills, triggered)
+        # Nothing is filled in this phase, so the scan keeps finding everything crossed so far
+        matches &= taken == set(scanned)
+    for name, samples in (('scan open orders', scan_samples), ('order books', book_samples)):
+        rows.append({'name': name, 'p50_ms': float(np.percentile(samples, 50)), 'mean_ms': statistics.mean(samples)})
+        write(f'{name:<18} p50={rows[-1]["p50_ms"]:8.3f}ms per update of {len(stocks)} tickers')
+    write(f'books cross the same {len(taken)} orders as the scan: {matches}')
+
+    filled = 0
+    start = time.perf_counter()
+    for tick in range(options['iterations'] + 1, options['iterations'] * 2 + 1):
+        for stock in stocks:
+            stock.current_price = Decimal('100.00') + Decimal('0.05') * tick
+        filled += match_orders(stocks)
+    elapsed = time.perf_counter() - start
+    rows.append({'name': 'match_orders', 'elapsed_s': elapsed, 'filled': filled, 'matches_scan': matches,
+                 'fills_per_s': filled / elapsed if elapsed else 0.0})
+    write(f'match_orders       {options["iterations"]} updates filled {filled} orders in {elapsed:.3f}s ({rows[-1]["fills_per_s"]:.0f}/s) '
+          f'(includes the first full book load)')
+    return rows
+
+
+def bench_history_rebuild(provider, options, write):
+    """Ledger-replay engine against the old reset_portfolio_history loop."""
+    days = 365 * options['years']
+    stocks = seed_stocks(50)
+    calls = provider.calls
+    start = time.perf_counter()
+    sync_bars([stock.ticker for stock in stocks], since=timezone.localdate() - timedelta(days=days + 7))
+    write(f'synced bars for {len(stocks)} tickers in {time.perf_counter() - start:.2f}s ({provider.calls - calls} upstream calls)')
+
+    users = seed_traders(options['users'], stocks, days)
+    first = timezone.localdate(users[0].date_joined)
+
+    start = time.perf_counter()
+    values = portfolio_values([user.pk for user in users], first, timezone.localdate())
+    compute = time.perf_counter() - start
+
+    with rollback():
+        start = time.perf_counter()
+        written = rebuild_history(users, replace=True)
+        total = time.perf_counter() - start
+
+    sample = list(User.objects.filter(pk__in=[user.pk for user in users[:3]]).select_related('profile'))
+    with rollback():
+        start = time.perf_counter()
+        legacy_reset_portfolio_history(sample)
+        legacy_per_user = (time.perf_counter() - start) / len(sample)
+
+    row = {
+        'name': f'users={len(users)} days={values.shape[1]}',
+        'engine_compute_s': compute,
+        'engine_total_s': total,
+        'rows_written': written,
+        'legacy_estimated_s': legacy_per_user * len(users),
+    }
+    write(f'users={len(users)} days={values.shape[1]} engine compute={compute:.2f}s '
+          f'compute+write={total:.2f}s ({written} rows)')
+    write(f'legacy loop: {legacy_per_user:.2f}s/user, estimated {row["legacy_estimated_s"]:.0f}s for {len(users)} users '
+          f'({row["legacy_estimated_s"] / total:.0f}x slower)')
+    return [row]
+
+
+def bench_analytics(provider, options, write):
+    """Cold and cached /api/analytics/ for a multi-year account, and invalidation on a trade."""
+    days = 365 * options['years']
+    stocks = seed_stocks(20)
+    sync_bars([stock.ticker for stock in stocks], since=timezone.localdate() - timedelta(days=days + 7))
+    user = seed_traders(1, stocks, days, trades_per_user=20, prefix='bench_analytics')[0]
+    rebuild_history([user], replace=True)
+    Profile.objects.filter(user=user).update(cash=Decimal('100000000.00'))
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user.pk))
+
+    def fetch():
+        response = client.get('/api/analytics/')
+        assert response.status_code == 200, response.content
+
+    rows = []
+    history = PortfolioHistory.objects.filter(user=user).count()
+    def clear():
+        analytics_cache.clear()
+        analytics_cache.shared.clear()
+
+    stats = measure(fetch, options['iterations'], before=clear)
+    rows.append({'name': f'cold history={history}', **stats})
+    write(f'cold   history={history:<5} {describe(stats)}')
+    stats = measure(fetch, options['iterations'])
+    rows.append({'name': f'cached history={history}', **stats})
+    write(f'cached history={history:<5} {describe(stats)}')
+
+    before = client.get('/api/analytics/').data['positions']
+    client.post(f'/api/buy-stock/{stocks[0].ticker}/', {'quantity': '1'}, format='json')
+    after = client.get('/api/analytics/').data['positions']
+    write(f'after a trade: {"recomputed" if after != before else "STALE"}')
+    return rows
+
+
+def bench_transactions(provider, options, write):
+    """/api/transactions/ page latency at increasing depth, keyset cursors against OFFSET."""
+    count = options['transactions']
+    stocks = seed_stocks(50)
+    user = User.objects.create(username='bench_ledger')
+    start = timezone.now() - timedelta(days=365 * options['years'])
+    step = timedelta(days=365 * options['years']) / count
+    with explicit_timestamps():
+        for lo in range(0, count, 10000):
+            Transaction.objects.bulk_create([
+                Transaction(user=user, stock=stocks[i % len(stocks)], transaction_type='BUY' if i % 3 else 'SELL',
+                            quantity=Decimal('1.0000'), price_per_share=Decimal('100.00'), total_amount=Decimal('100.00'),
+                            timestamp=start + step * i)
+                for i in range(lo, min(lo + 10000, count))
+            ], batch_size=5000)
+
+    client = APIClient()
+    client.force_authenticate(user)
+    paginator = KeysetPagination()
+    newest_first = Transaction.objects.filter(user=user).order_by('-timestamp', '-pk')
+    rows = []
+    # Small --transactions runs still read full pages from the data that was seeded
+    page = min(50, count)
+    for depth in (0, 0.5, 0.99):
+        offset = min(int(count * depth), count - page)
+        last = newest_first[offset - 1] if offset else None
+        cursor = f'&cursor={paginator.encode_cursor(last)}' if last else ''
+
+        def endpoint():
+            response = client.get(f'/api/transactions/?limit={page}{cursor}')
+            assert response.status_code == 200 and len(response.data['results']) == page, response.content
+
+        def keyset_page():
+            rows_after = newest_first.select_related('stock')
+            if last:
+                rows_after = rows_after.filter(Q(timestamp__lt=last.timestamp) | Q(timestamp=last.timestamp, pk__lt=last.pk),
+                                               timestamp__lte=last.timestamp)
+            TransactionSerializer(rows_after[:page], many=True).data
+
+        def offset_page():
+            TransactionSerializer(newest_first.select_related('stock')[offset:offset + page], many=True).data
+
+        for method, fn in (('endpoint', endpoint), ('keyset', keyset_page), ('offset', offset_page)):
+            stats = measure(fn, options['iterations'])
+            rows.append({'name': f'{method} row={offset}', **stats})
+            write(f'{method:<8} row={offset:<8} {describe(stats)}')
+    return rows
+
+
+def bench_leaderboard(provider, options, write):
+    """Incremental leaderboard updates and /api/leaderboard/ reads against revaluing everyone."""
+    stocks = seed_stocks(50)
+    sync_bars([stock.ticker for stock in stocks], since=timezone.localdate() - timedelta(days=37))
+    users = seed_traders(options['users'], stocks, 30, prefix='bench_board')
+    user_ids = [user.pk for user in users]
+    rows = []
+
+    stats = measure(lambda: update_scores(user_ids), 1)
+    rows.append({'name': 'revalue everyone', 'elapsed_s': stats['mean_ms'] / 1000, 'queries': stats['queries']})
+    write(f'revalue everyone   {rows[-1]["elapsed_s"]:7.3f}s {stats["queries"]:.0f} queries ({len(users)} users)')
+
+    moved = stocks[0].ticker
+    affected = holders([moved])
+    stats = measure(lambda: update_scores(holders([moved])), options['iterations'])
+    rows.append({'name': 'one ticker moves', **stats})
+    write(f'one ticker moves   {describe(stats)} ({len(affected)} holders rescored)')
+
+    client = APIClient()
+    client.force_authenticate(users[len(users) // 2])
+    get_leaderboard()
+    deep = max(len(users) - 50, 0)
+    for name, url in (('top page', '/api/leaderboard/'), ('deep page', f'/api/leaderboard/?by=return&offset={deep}')):
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+        stats = measure(lambda: client.get(url), options['iterations'])
+        rows.append({'name': name, **stats})
+        write(f'{name:<18} {describe(stats)}')
+
+    board = get_leaderboard()
+    stats = measure(lambda: board.rank('value', user_ids[-1]), options['iterations'] * 100)
+    rows.append({'name': 'rank lookup', **stats})
+    write(f'rank lookup        {describe(stats)}')
+    return rows
+
+
+def bench_backtest(provider, options, write):
+    """A single backtest and a parameter sweep run in-process and across the process pool."""
+    days = 365 * options['years']
+    stocks = seed_stocks(20)
+    tickers = [stock.ticker for stock in stocks]
+    end = timezone.localdate()
+    start = end - timedelta(days=days)
+    sync_bars(tickers, since=start - timedelta(days=120))
+    dates, closes, offset = load_closes(tickers, start, end, lookback=60)
+
+    rows = []
+    for strategy, params in (('sma_cross', {'fast': 20, 'slow': 50}), ('rsi', {'period': 14})):
+        stats = measure(lambda: run_backtest(dates, closes, tickers, strategy, params, offset=offset), options['iterations'])
+        rows.append({'name': f'{strategy} single run', **stats})
+        write(f'{strategy:<9} single run {describe(stats)} ({len(tickers)} tickers x {len(dates) - offset} days)')
+
+    grid = {'fast': [5, 10, 15, 20, 25, 30, 35, 40], 'slow': [50, 60, 70, 80, 90, 100, 110, 120]}
+    workers = max(settings.BACKTEST_WORKERS, 2)
+    # The first pooled sweep pays for spawning the workers; later requests reuse them
+    with override_settings(BACKTEST_WORKERS=workers):
+        for label, count in (('in process', 1), (f'pool of {workers} cold', workers), (f'pool of {workers} warm', workers)):
+            stats = measure(lambda: sweep(tickers, start, end, 'sma_cross', grid, workers=count), 1)
+            rows.append({'name': f'sweep 64 runs {label}', 'elapsed_s': stats['mean_ms'] / 1000})
+            write(f'sweep 64 runs {label:<16} {rows[-1]["elapsed_s"]:7.2f}s')
+        close_backtest_pool()
+    return rows
+
+
+def bench_price_matrix(provider, options, write):
+    """Close lookups from the memory-mapped price matrix against the bar store."""
+    days = 365 * options['years']
+    stocks = seed_stocks(200)
+    tickers = [stock.ticker for stock in stocks]
+    sync_bars(tickers, since=timezone.localdate() - timedelta(days=days + 7), rebuild_matrix=False)
+    end = timezone.localdate() + timedelta(days=1)
+    start = end - timedelta(days=days)
+
+    rows = []
+    build = measure(build_price_matrix, 1)
+    rows.append({'name': 'build', 'elapsed_s': build['mean_ms'] / 1000, 'queries': build['queries']})
+    write(f'build              {rows[-1]["elapsed_s"]:7.2f}s {build["queries"]:.0f} queries')
+
+    with tempfile.TemporaryDirectory() as empty, override_settings(PRICE_MATRIX_PATH=empty):
+        stats = measure(lambda: close_matrix(tickers, start, end), options['iterations'])
+    rows.append({'name': 'range bar store', **stats})
+    write(f'range bar store    {describe(stats)}')
+    stats = measure(lambda: close_matrix(tickers, start, end), options['iterations'])
+    rows.append({'name': 'range matrix', **stats})
+    write(f'range matrix       {describe(stats)}')
+
+    matrix = get_price_matrix()
+    day = start + timedelta(days=days // 2)
+    stats = measure(lambda: [matrix.close(ticker, day) for ticker in tickers], options['iterations'])
+    stats['lookups_per_s'] = stats.pop('ops_per_s') * len(tickers)
+    rows.append({'name': 'point lookups', **stats})
+    write(f'point lookups      {describe(stats)} ({stats["lookups_per_s"]:,.0f} lookups/s)')
+    return rows
+
+
+def bench_history_commands(provider, options, write):
+    """Wall time and query count of each portfolio history management command."""
+    days = 365 * options['years']
+    stocks = seed_stocks(50)
+    sync_bars([stock.ticker for stock in stocks], since=timezone.localdate() - timedelta(days=days + 7))
+    seed_traders(options['users'], stocks, days, prefix='history_cmd')
+    rows = []
+    # Ordered so each command starts from the state the previous one left
+    for command in ('reset_portfolio_history', 'update_portfolio_history', 'backfill_portfolio_history', 'add_history'):
+        args = ['--restart'] if command != 'add_history' else []
+        stats = measure(lambda: call_command(command, *args, stdout=io.StringIO()), 1)
+        rows.append({'name': command, 'elapsed_s': stats['mean_ms'] / 1000, 'queries': stats['queries'],
+                     'history_rows': PortfolioHistory.objects.count()})
+        write(f'{command:<27} {rows[-1]["elapsed_s"]:7.2f}s {stats["queries"]:.0f} queries '
+              f'({rows[-1]["history_rows"]} history rows)')
+    return rows
+
+
+def bench_ticker_search(provider, options, write):
+    """TickerSuggestionsAPIView, plus the in-memory index against the old icontains scan."""
+    client = APIClient()
+    count = seed_ticker_universe()
+    start = time.perf_counter()
+    index = TickerSearchIndex(Stock.objects.values_list('ticker', 'company_name'))
+    write(f'indexed {count} stocks in {(time.perf_counter() - start) * 1000:.0f}ms')
+    client.get('/api/tickers/', {'query': 'A'})
+
+    rows = []
+    for query in ('A', 'AAPL', 'APPL', 'MICRO', 'TESLA', 'BANK OF', 'XYZQ'):
+        orm = measure(lambda: legacy_ticker_suggestions(query), options['iterations'])
+        lookup = measure(lambda: index.search(query), options['iterations'])
+        view = measure(lambda: client.get('/api/tickers/', {'query': query}), options['iterations'])
+        rows.append({'name': f'query={query}', **view, 'orm_ms': orm['mean_ms'], 'index_ms': lookup['mean_ms']})
+        write(f'{query!r:10} view {describe(view)} | old orm={orm["mean_ms"]:7.3f}ms index={lookup["mean_ms"]:7.3f}ms')
+    return rows
+
+
+def bench_stock_summary(provider, options, write):
+    """StockSummary latency and payload size per period, cold and cached, with and without downsampling."""
+    client = Client(headers={'Authorization': bearer(seed_user('bench_summary', seed_stocks(1)))})
+    stock = Stock.objects.get(ticker='T0000')
+    url = f'/api/search/{stock.ticker}/'
+    rows = []
+    for period in ('1mo', '1y', '5y', 'max'):
+        for points in (None, 500):
+            params = {'period': period} if points is None else {'period': period, 'points': points}
+            cold = measure(lambda: client.get(url, params), options['iterations'], before=clear_market_data_caches)
+            warm = measure(lambda: client.get(url, params), options['iterations'])
+            response = client.get(url, params)
+            rows.append({
+                'name': f'period={period} points={points}',
+                **warm,
+                'cold_p50_ms': cold['p50_ms'],
+                'cold_p95_ms': cold['p95_ms'],
+                'payload_bytes': len(response.content),
+                'rows': len(response.json()['historicalData']['dates']),
+            })
+            write(f'period={period:<4} points={str(points):<5} cold p50={cold["p50_ms"]:8.2f}ms cached {describe(warm)} '
+                  f'rows={rows[-1]["rows"]:<5} payload={rows[-1]["payload_bytes"] / 1024:.0f}KiB')
+    return rows
+
+
+def bench_stock_summary_load(provider, options, write):
+    """
+    Throughput of cold StockSummary requests, each for a different ticker, under
+    injected upstream latency: a threaded WSGI-style worker against one ASGI
+    event loop with every request in flight at once.
+    """
+    concurrency = options['concurrency']
+    stocks = seed_stocks(concurrency)
+    auth = bearer(seed_user('bench_summary_load', stocks[:1]))
+    urls = [f'/api/search/{stock.ticker}/' for stock in stocks]
+
+    def threaded(threads):
+        client = Client(headers={'Authorization': auth})
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            statuses = list(pool.map(lambda url: client.get(url).status_code, urls))
+        assert statuses == [200] * len(urls), statuses
+
+    def event_loop():
+        async def run():
+            client = AsyncClient()
+            return await asyncio.gather(*(client.get(url, headers={'Authorization': auth}) for url in urls))
+        responses = asyncio.run(run())
+        assert [response.status_code for response in responses] == [200] * len(urls)
+
+    # Untimed pass so the fake provider has generated every price series
+    event_loop()
+    rows = []
+    for label, fn in ((f'wsgi threads={options["threads"]}', lambda: threaded(options['threads'])), ('asgi event loop', event_loop)):
+        samples = timed(fn, options['iterations'], before=clear_market_data_caches)
+        elapsed = statistics.mean(samples) / 1000
+        rows.append({'name': label, 'requests': len(urls), 'elapsed_s': elapsed, 'requests_per_s': len(urls) / elapsed})
+        write(f'{label:<18} {len(urls)} requests in {elapsed:.2f}s -> {len(urls) / elapsed:7.1f} req/s')
+    # Throughput is bounded by per-request CPU time (GIL) once upstream latency is hidden, so the gain grows with --latency
+    write(f'asgi/wsgi throughput: {rows[1]["requests_per_s"] / rows[0]["requests_per_s"]:.2f}x at {options["latency"] * 1000:.0f}ms upstream latency')
+    return rows
+
+
+def bench_price_refresh(provider, options, write):
+    """One refresh_prices cycle over held tickers, then dashboard reads served from the database."""
+    client = APIClient()
+    stocks = seed_stocks(500)
+    user = seed_user('bench_price_refresh', stocks[:200])
+    for stock in stocks[200:]:
+        seed_user(f'bench_price_refresh_{stock.ticker}', [stock])
+    provider.get_quotes(held_tickers())
+    rows = []
+    for batch_size in (1, 50, 100, 500):
+        clear_market_data_caches()
+        calls = provider.calls
+        start = time.perf_counter()
+        updated = refresh_prices(held_tickers(), batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        rows.append({'name': f'batch_size={batch_size}', 'updated': updated, 'elapsed_s': elapsed,
+                     'upstream_calls': provider.calls - calls})
+        write(f'batch_size={batch_size:<4} refreshed {updated} prices in {elapsed:6.2f}s ({provider.calls - calls} upstream calls)')
+
+    client.force_authenticate(user)
+    calls = provider.calls
+    stats = measure(lambda: client.get('/api/dashboard/'), options['iterations'], before=clear_market_data_caches)
+    rows.append({'name': 'dashboard stored prices', **stats, 'upstream_calls': (provider.calls - calls) / options['iterations']})
+    write(f'dashboard with 200 holdings and stored prices: {describe(stats)} '
+          f'upstream calls/request={rows[-1]["upstream_calls"]:.1f}')
+    return rows
+
+
+def bench_import_stocks(provider, options, write):
+    """import_stocks over the shipped CSVs, first into an empty table and then as a re-import."""
+    rows = []
+    for label in ('initial', 'reimport'):
+        stats = measure(seed_ticker_universe, 1)
+        rows.append({'name': label, 'stocks': Stock.objects.count(), 'elapsed_s': stats['mean_ms'] / 1000, 'queries': stats['queries']})
+        write(f'{label:<8} {rows[-1]["stocks"]} stocks in {rows[-1]["elapsed_s"]:.2f}s ({stats["queries"]:.0f} queries)')
+    return rows
+
+
+def bench_email_outbox(provider, options, write):
+    """
+    Registration latency with queued delivery, and outbox throughput sending
+    one email per connection (the old inline path) against pooled batches.
+    """
+    client = APIClient()
+    count = options['emails']
+    with override_settings(
+        EMAIL_BACKEND='api.benchmarks.SlowEmailBackend',
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    ):
+        signups = iter(range(count))
+
+        def register():
+            i = next(signups)
+            payload = {'username': f'bench_signup_{i}', 'email': f'signup{i}@example.com',
+                       'password': 'Bench-pass-123', 'password2': 'Bench-pass-123'}
+            response = client.post('/api/register/', payload, format='json')
+            assert response.status_code == 201, response.content
+
+        stats = measure(register, count)
+        write(f'register {describe(stats)} (inline delivery added at least {SlowEmailBackend.handshake * 1000:.0f}ms per signup)')
+        rows = [{'name': 'register', **stats}]
+
+        for label, batch_size in (('connection per email', 1), ('pooled batches', 100)):
+            OutboundEmail.objects.update(status='PENDING', attempts=0, next_attempt_at=timezone.now())
+            mail.outbox = []
+            start = time.perf_counter()
+            while send_pending(batch_size=batch_size) != (0, 0):
+                pass
+            elapsed = time.perf_counter() - start
+            assert len(mail.outbox) == count
+            rows.append({'name': label, 'emails': count, 'elapsed_s': elapsed, 'emails_per_s': count / elapsed})
+            write(f'{label:<21} {count} emails in {elapsed:6.2f}s -> {count / elapsed:7.1f} emails/s')
+    return rows
+
+
+def bench_instrumentation(provider, options, write):
+    """Per-request cost of InstrumentationMiddleware on cheap, database-only requests."""
+    stocks = seed_stocks(50)
+    user = seed_user('bench_instrumentation', stocks)
+    refresh_prices([stock.ticker for stock in stocks])
+    bare = [name for name in settings.MIDDLEWARE if name != 'api.instrumentation.InstrumentationMiddleware']
+    rows = []
+    for label, middleware in (('without', bare), ('with', settings.MIDDLEWARE)):
+        with override_settings(MIDDLEWARE=middleware):
+            client = APIClient()
+            client.force_authenticate(user)
+            client.get('/api/dashboard/')
+            stats = measure(lambda: client.get('/api/dashboard/'), options['iterations'] * 10)
+        rows.append({'name': f'dashboard {label} instrumentation', **stats})
+        write(f'{label:<7} instrumentation: dashboard {describe(stats)}')
+    overhead = rows[1]['mean_ms'] - rows[0]['mean_ms']
+    write(f'overhead: {overhead * 1000:.0f}us per request ({overhead / rows[0]["mean_ms"]:+.1%})')
+    return rows
+
+
+# Preset sizes; any option given explicitly on the command line wins
+SCALES = {
+    'small': {'users': 100, 'years': 1, 'iterations': 5, 'concurrency': 50, 'emails': 50, 'transactions': 10000, 'orders': 10000},
+    'medium': {'users': 1000, 'years': 3, 'iterations': 20, 'concurrency': 200, 'emails': 200, 'transactions': 100000, 'orders': 100000},
+    'large': {'users': 10000, 'years': 5, 'iterations': 50, 'concurrency': 500, 'emails': 1000, 'transactions': 1000000, 'orders': 1000000},
+}
+
+SCENARIOS = {
+    'dashboard': bench_dashboard,
+    'dashboard_history': bench_dashboard_history,
+    'intraday': bench_intraday,
+    'analytics': bench_analytics,
+    'trade': bench_trade,
+    'basket': bench_basket,
+    'trade_contention': bench_trade_contention,
+    'order_book': bench_order_book,
+    'stock_summary': bench_stock_summary,
+    'stock_summary_load': bench_stock_summary_load,
+    'import_stocks': bench_import_stocks,
+    'ticker_search': bench_ticker_search,
+    'price_refresh': bench_price_refresh,
+    'email_outbox': bench_email_outbox,
+    'history_rebuild': bench_history_rebuild,
+    'history_commands': bench_history_commands,
+    'price_matrix': bench_price_matrix,
+    'leaderboard': bench_leaderboard,
+    'backtest': bench_backtest,
+    'transactions': bench_transactions,
+    'instrumentation': bench_instrumentation,
+}
+
+# Row fields that are compared against a baseline, and which direction is worse
+LOWER_IS_BETTER = ('_ms', '_s', 'queries', 'upstream_calls')
+HIGHER_IS_BETTER = ('_per_s',)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of ``results`` against ``baseline`` (both {scenario: rows}),
+    matching rows by name. A metric regresses when it is worse by more than
+    ``tolerance`` as a fraction of the baseline value. Returns messages.
+    """
+    regressions = []
+    for scenario, rows in results.items():
+        previous = {row['name']: row for row in baseline.get(scenario, [])}
+        for row in rows:
+            old = previous.get(row['name'])
+            if old is None:
+                continue
+            for key, value in row.items():
+                before = old.get(key)
+                if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                    continue
+                if key.endswith(HIGHER_IS_BETTER):
+                    change = (before - value) / before
+                elif key.endswith(LOWER_IS_BETTER):
+                    change = (value - before) / before
+                else:
+                    continue
+                if change > tolerance:
+                    regressions.append(f'{scenario} [{row["name"]}] {key}: {before:.4g} -> {value:.4g} ({change:+.0%})')
+    return regressions
@@ -0,0 +1,44 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+# Rows committed slightly out of timestamp order are still picked up by the next delta sync
+SYNC_OVERLAP = timedelta(seconds=5)
+# A periodic full rebuild drops rows deleted or closed since the last one
+FULL_SYNC_SECONDS = 600
+
+
+class DeltaSync:
+    """
+    A process-local structure loaded from the database and kept current by
+    reading only the rows stamped since the last sync. ``build()`` returns a
+    fresh structure from every row; ``refresh(structure, since)`` applies the
+    rows stamped at or after ``since``. Every FULL_SYNC_SECONDS the structure
+    is rebuilt from scratch instead.
+    """
+
+    def __init__(self, build, refresh, overlap=SYNC_OVERLAP, full_sync_seconds=FULL_SYNC_SECONDS):
+        self.build = build
+        self.refresh = refresh
+        self.overlap = overlap
+        self.full_sync_seconds = full_sync_seconds
+        self.lock = threading.Lock()
+        self._value = None
+        self._synced_at = None
+        self._full_sync_at = 0.0
+
+    def sync(self):
+        """Bring the structure up to date and return it. Callers hold ``lock``."""
+        now = timezone.now()
+        if self._value is None or time.monotonic() - self._full_sync_at > self.full_sync_seconds:
+            self._value, self._full_sync_at = self.build(), time.monotonic()
+        else:
+            self.refresh(self._value, self._synced_at - self.overlap)
+        self._synced_at = now
+        return self._value
+
+    def get(self):
+        with self.lock:
+            return self.sync()
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def lttb(y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: pick ``threshold`` indices of the evenly
+    spaced series ``y`` that keep its visual shape. Always keeps the first and
+    last point. Returns every index when the series is already short enough.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Gaps would poison the triangle areas, so carry the last known value through them
+    filled = y.copy()
+    valid = ~np.isnan(filled)
+    if not valid.all():
+        index = np.where(valid, np.arange(n), 0)
+        np.maximum.accumulate(index, out=index)
+        filled = filled[index]
+        filled[np.isnan(filled)] = 0.0
+
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    # Each bucket is scored against the average point of the bucket after it
+    starts = edges[1:]
+    sizes = np.diff(np.append(starts, n))
+    avg_x = np.add.reduceat(x, starts) / sizes
+    avg_y = np.add.reduceat(filled, starts) / sizes
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[previous] - avg_x[i]) * (filled[lo:hi] - filled[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y[i] - filled[previous])
+        )
+        previous = lo + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample_series(series, points, key='close'):
+    """Reduce every list in ``series`` to the ``points`` LTTB picks on ``series[key]``."""
+    indices = lttb([np.nan if value is None else value for value in series[key]], points).tolist()
+    return {name: [values[i] for i in indices] for name, values in series.items()}
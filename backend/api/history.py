@@ -0,0 +1,198 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+from django.db.models import FloatField, Max
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .analytics import invalidate_analytics
+from .bars import close_matrix
+from .models import Holding, PortfolioHistory, Profile, Stock, Transaction
+
+
+def _day_offsets(timestamps, start):
+    """Local calendar day of each timestamp as an offset from ``start``."""
+    if not timestamps:
+        return np.zeros(0, dtype=np.int64)
+    local = pd.DatetimeIndex(timestamps).tz_convert(timezone.get_current_timezone()).tz_localize(None)
+    return np.asarray((local.normalize() - pd.Timestamp(start)).days, dtype=np.int64)
+
+
+def portfolio_values(user_ids, start, end, chunk_size=4096):
+    """
+    Value each user's portfolio at every day's close for calendar days in
+    [start, end] by replaying the Transaction ledger.
+
+    Cash and positions are rebuilt as users × days arrays from cumulative
+    sums of the ledger, then valued against a forward-filled close matrix.
+    Opening cash and positions are reconciled so the last day matches the
+    user's current Profile.cash and Holding rows. Returns a float array of
+    shape (len(user_ids), days).
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    n_users = len(user_ids)
+    n_days = (end - start).days + 1
+    values = np.zeros((n_users, max(n_days, 0)))
+    if not n_users or n_days <= 0:
+        return values
+
+    order = np.argsort(user_ids)
+    sorted_ids = user_ids[order]
+
+    def user_index(ids):
+        return order[np.searchsorted(sorted_ids, np.asarray(ids, dtype=np.int64))]
+
+    # Cast in SQL so a large ledger is not converted to Decimal row by row
+    ledger = list(Transaction.objects.filter(user_id__in=user_ids.tolist()).values_list(
+        'user_id', 'stock__ticker', 'transaction_type',
+        Cast('quantity', FloatField()), Cast('total_amount', FloatField()), 'timestamp'
+    ))
+    holdings = list(Holding.objects.filter(user_id__in=user_ids.tolist()).values_list(
+        'user_id', 'ticker__ticker', 'shares_owned'
+    ))
+    tx_users, tx_tickers, tx_types, tx_quantity, tx_amount, tx_time = zip(*ledger) if ledger else ((),) * 6
+    h_users, h_tickers, h_shares = zip(*holdings) if holdings else ((),) * 3
+
+    tx_u = user_index(tx_users)
+    sign = np.where(np.array(tx_types) == 'BUY', 1.0, -1.0) if ledger else np.zeros(0)
+    tx_qty = sign * np.array(tx_quantity, dtype=float)
+    tx_cash = -sign * np.array(tx_amount, dtype=float)
+    tx_day = _day_offsets(tx_time, start)
+    # Trades before the range count from day 0; trades after it are not replayed
+    in_range = tx_day < n_days
+    tx_day = np.clip(tx_day, 0, None)
+
+    # Cash: opening balance plus the cumulative sum of daily cash flows
+    cash_now = np.zeros(n_users)
+    profiles = list(Profile.objects.filter(user_id__in=user_ids.tolist()).values_list('user_id', 'cash'))
+    if profiles:
+        profile_users, profile_cash = zip(*profiles)
+        cash_now[user_index(profile_users)] = np.array(profile_cash, dtype=float)
+    opening_cash = cash_now - np.bincount(tx_u, weights=tx_cash, minlength=n_users)
+    np.add.at(values, (tx_u[in_range], tx_day[in_range]), tx_cash[in_range])
+    np.cumsum(values, axis=1, out=values)
+    values += opening_cash[:, None]
+
+    # Positions: one row per (user, ticker) pair, keyed so pairs sort by user
+    tickers = sorted(set(tx_tickers) | set(h_tickers))
+    if not tickers:
+        return values
+    ticker_index = {ticker: i for i, ticker in enumerate(tickers)}
+    n_tickers = len(tickers)
+    tx_key = tx_u * n_tickers + np.array([ticker_index[t] for t in tx_tickers], dtype=np.int64)
+    h_u = user_index(h_users)
+    h_key = h_u * n_tickers + np.array([ticker_index[t] for t in h_tickers], dtype=np.int64)
+    pairs = np.unique(np.concatenate([tx_key, h_key]))
+    pair_user = pairs // n_tickers
+    pair_ticker = pairs % n_tickers
+    tx_pair = np.searchsorted(pairs, tx_key)
+
+    opening = np.zeros(len(pairs))
+    opening[np.searchsorted(pairs, h_key)] = np.array(h_shares, dtype=float)
+    np.add.at(opening, tx_pair, -tx_qty)
+
+    closes = close_matrix(tickers, start, end + timedelta(days=1))
+    # Tickers with no stored bars fall back to their last known price
+    missing = np.isnan(closes).all(axis=0)
+    if missing.any():
+        fallback = dict(Stock.objects.filter(ticker__in=[t for t, m in zip(tickers, missing) if m]).values_list('ticker', 'current_price'))
+        for i in np.flatnonzero(missing):
+            closes[:, i] = float(fallback.get(tickers[i], 0))
+    closes = np.nan_to_num(closes)
+
+    tx_order = np.argsort(tx_pair, kind='stable')
+    tx_pair_sorted = tx_pair[tx_order]
+    for lo in range(0, len(pairs), chunk_size):
+        hi = min(lo + chunk_size, len(pairs))
+        a, b = np.searchsorted(tx_pair_sorted, [lo, hi])
+        sel = tx_order[a:b]
+        sel = sel[in_range[sel]]
+        positions = np.zeros((hi - lo, n_days))
+        positions[:, 0] = opening[lo:hi]
+        np.add.at(positions, (tx_pair[sel] - lo, tx_day[sel]), tx_qty[sel])
+        np.cumsum(positions, axis=1, out=positions)
+        positions *= closes[:, pair_ticker[lo:hi]].T
+        chunk_users, firsts = np.unique(pair_user[lo:hi], return_index=True)
+        values[chunk_users] += np.add.reduceat(positions, firsts, axis=0)
+    return values
+
+
+def rebuild_history(users, end=None, start_dates=None, replace=False, existing=None, batch_size=5000):
+    """
+    Write PortfolioHistory rows for ``users`` from each user's start date
+    (``start_dates[user.pk]``, default and never earlier than their join
+    date) through ``end``.
+
+    With ``replace`` each user's whole history is swapped for the rebuilt
+    rows in one transaction. Otherwise existing rows are kept: ``existing``
+    is an optional prefetched set of (user_id, date) pairs to skip, and any
+    other conflict is ignored. Returns the number of rows sent to the database.
+    """
+    users = list(users)
+    end = end or timezone.localdate()
+    start_dates = start_dates or {}
+    existing = existing or set()
+    users = [(user, timezone.localdate(user.date_joined)) for user in users]
+    users = [(user, max(start_dates.get(user.pk, joined), joined)) for user, joined in users]
+    users = [(user, first) for user, first in users if first <= end]
+    if not users:
+        return 0
+
+    start = min(first for _, first in users)
+    values = portfolio_values([user.pk for user, _ in users], start, end)
+    dates = [start + timedelta(days=offset) for offset in range(values.shape[1])]
+
+    def rows():
+        for (user, first), user_values in zip(users, values.round(2).tolist()):
+            offset = (first - start).days
+            for day, value in zip(dates[offset:], user_values[offset:]):
+                if (user.pk, day) not in existing:
+                    yield PortfolioHistory(user_id=user.pk, date=day, total_value=value)
+
+    written = 0
+    with db_transaction.atomic():
+        if replace:
+            PortfolioHistory.objects.filter(user_id__in=[user.pk for user, _ in users]).delete()
+        for batch in _batches(rows(), batch_size):
+            PortfolioHistory.objects.bulk_create(batch, ignore_conflicts=not replace)
+            written += len(batch)
+    # bulk_create sends no post_save, so cached analytics are dropped here
+    invalidate_analytics([user.pk for user, _ in users])
+    return written
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Units of work for api.jobs.run_history_job. Each takes a list of user ids and
+# returns the number of rows written, and is safe to run again for the same users.
+
+def update_history_chunk(user_ids):
+    users = User.objects.filter(pk__in=user_ids)
+    last_dates = PortfolioHistory.objects.filter(user_id__in=user_ids).values('user').annotate(last=Max('date'))
+    start_dates = {row['user']: row['last'] + timedelta(days=1) for row in last_dates}
+    return rebuild_history(users, start_dates=start_dates)
+
+
+def reset_history_chunk(user_ids):
+    return rebuild_history(User.objects.filter(pk__in=user_ids), replace=True)
+
+
+def backfill_history_chunk(user_ids):
+    users = User.objects.filter(pk__in=user_ids)
+    existing = set(PortfolioHistory.objects.filter(user_id__in=user_ids).values_list('user_id', 'date'))
+    first_dates = {}
+    for user_id, day in existing:
+        first_dates[user_id] = min(day, first_dates.get(user_id, day))
+    return rebuild_history(users, start_dates=first_dates, existing=existing)
@@ -0,0 +1,250 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.renderers import JSONRenderer
+
+_current = ContextVar('request_metrics', default=None)
+# Set while a timed serializer is running, so nested ones are not counted twice
+_serializing = ContextVar('serializing', default=False)
+
+
+class RequestMetrics:
+    """Time spent per category while serving one request. Safe to update from worker threads."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.render_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting_since = 0.0
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.db_queries += 1
+            self.db_seconds += seconds
+
+    # Concurrent upstream calls overlap, so time is counted only while at least one is in flight
+    def start_upstream(self):
+        with self._lock:
+            if not self._in_flight:
+                self._waiting_since = time.perf_counter()
+            self._in_flight += 1
+
+    def end_upstream(self):
+        with self._lock:
+            self._in_flight -= 1
+            self.upstream_calls += 1
+            if not self._in_flight:
+                self.upstream_seconds += time.perf_counter() - self._waiting_since
+
+    def add_render(self, seconds):
+        with self._lock:
+            self.render_seconds += seconds
+
+    def add_serialize(self, seconds):
+        with self._lock:
+            self.serialize_seconds += seconds
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+def install_query_hook(sender, connection, **kwargs):
+    # Receiver for connection_created; execute_wrappers outlives reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentedProvider:
+    """Wraps a market data provider so every upstream call is timed against the current request."""
+
+    METHODS = ('get_quotes', 'get_info', 'get_history', 'get_bars')
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def __getattr__(self, name):
+        attribute = getattr(self.provider, name)
+        if name not in self.METHODS:
+            return attribute
+
+        def timed(*args, **kwargs):
+            metrics = _current.get()
+            if metrics is None:
+                return attribute(*args, **kwargs)
+            metrics.start_upstream()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                metrics.end_upstream()
+        return timed
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.add_render(time.perf_counter() - start)
+
+
+class TimedSerializerMixin:
+    """
+    Counts the time a serializer spends building its representation against
+    the current request. Queries and upstream calls it triggers (lazy
+    relations, price lookups) stay in their own categories.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or _serializing.get():
+            return super().to_representation(instance)
+        token = _serializing.set(True)
+        db, upstream = metrics.db_seconds, metrics.upstream_seconds
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            elapsed = time.perf_counter() - start
+            _serializing.reset(token)
+            metrics.add_serialize(max(elapsed - (metrics.db_seconds - db) - (metrics.upstream_seconds - upstream), 0.0))
+
+
+class Histogram:
+    """A labelled Prometheus histogram kept in process memory."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: ([*counts], total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            base = ','.join(f'{name}="{value}"' for name, value in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{self.name}_bucket{{{base},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+LABELS = ('view', 'method', 'status')
+
+request_seconds = Histogram('titan_request_duration_seconds', 'Time to serve a request.', SECONDS)
+db_seconds = Histogram('titan_request_db_seconds', 'Time spent in database queries per request.', SECONDS)
+db_queries = Histogram('titan_request_db_queries', 'Database queries per request.', COUNTS)
+upstream_seconds = Histogram('titan_request_upstream_seconds', 'Time spent waiting on market data per request.', SECONDS)
+upstream_calls = Histogram('titan_request_upstream_calls', 'Market data calls per request.', COUNTS)
+render_seconds = Histogram('titan_request_render_seconds', 'Time spent rendering API responses per request.', SECONDS)
+serialize_seconds = Histogram('titan_request_serialize_seconds', 'Time spent in DRF serializers per request.', SECONDS)
+HISTOGRAMS = (request_seconds, db_seconds, db_queries, upstream_seconds, upstream_calls, render_seconds, serialize_seconds)
+
+
+class InstrumentationMiddleware:
+    """
+    Records database, market data, serialization and rendering time for every request,
+    reports it in a Server-Timing header and aggregates it for /metrics.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        match = request.resolver_match
+        labels = (match.view_name if match else 'unmatched', request.method, str(response.status_code))
+        request_seconds.observe(labels, total)
+        db_seconds.observe(labels, metrics.db_seconds)
+        db_queries.observe(labels, metrics.db_queries)
+        upstream_seconds.observe(labels, metrics.upstream_seconds)
+        upstream_calls.observe(labels, metrics.upstream_calls)
+        render_seconds.observe(labels, metrics.render_seconds)
+        serialize_seconds.observe(labels, metrics.serialize_seconds)
+
+        app = total - metrics.db_seconds - metrics.upstream_seconds - metrics.serialize_seconds - metrics.render_seconds
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_seconds * 1000:.2f};desc="{metrics.db_queries} queries"',
+            f'upstream;dur={metrics.upstream_seconds * 1000:.2f};desc="{metrics.upstream_calls} calls"',
+            f'serialize;dur={metrics.serialize_seconds * 1000:.2f}',
+            f'render;dur={metrics.render_seconds * 1000:.2f}',
+            f'app;dur={max(app, 0) * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's request histograms."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render(LABELS))
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,194 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import invalidate_analytics
+from .market_hours import CLOSE, OPEN, last_session_day, session_open
+from .models import PortfolioHistory, PortfolioSnapshot
+
+# Users per cache entry; a user's series is one row of their block
+BLOCK_SIZE = 256
+# Buffers outlive a long weekend so the last session stays readable
+RETENTION = 4 * 24 * 3600
+_HEADER = 3
+
+
+def capacity(interval=None):
+    """Samples in one session at ``interval`` seconds, counting both the open and the close."""
+    session = (datetime.combine(datetime.min, CLOSE) - datetime.combine(datetime.min, OPEN)).total_seconds()
+    return math.ceil(session / (interval or settings.INTRADAY_INTERVAL)) + 1
+
+
+class RingBuffer:
+    """
+    Fixed-size ring buffers for a block of users sampled together: one
+    timestamp array and a users × capacity value array, preallocated, with
+    a shared cursor. Appending past capacity overwrites the oldest sample.
+    Users not sampled at a timestamp hold NaN there.
+    """
+
+    def __init__(self, rows, size):
+        self.times = np.zeros(size, dtype=np.int64)
+        self.values = np.full((rows, size), np.nan)
+        self.start = 0
+        self.count = 0
+
+    @property
+    def size(self):
+        return len(self.times)
+
+    def append(self, timestamp, values):
+        slot = (self.start + self.count) % self.size
+        self.times[slot] = timestamp
+        self.values[:, slot] = values
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.size
+
+    def _order(self):
+        return (self.start + np.arange(self.count)) % self.size
+
+    def series(self, row):
+        """(timestamps, values) of one row oldest first, skipping samples the row missed."""
+        order = self._order()
+        values = self.values[row, order]
+        sampled = ~np.isnan(values)
+        return self.times[order][sampled], values[sampled]
+
+    def latest(self):
+        """The newest sample of every row, NaN where a row has none."""
+        if not self.count:
+            return np.full(len(self.values), np.nan)
+        values = self.values[:, self._order()]
+        # Each row's last sampled column; rows never sampled land on a NaN
+        last = self.count - 1 - np.argmax(~np.isnan(values[:, ::-1]), axis=1)
+        return values[np.arange(len(values)), last]
+
+    def to_bytes(self):
+        header = np.array([self.values.shape[0], self.start, self.count], dtype=np.int64)
+        return header.tobytes() + self.times.tobytes() + self.values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        rows, start, count = np.frombuffer(data, dtype=np.int64, count=_HEADER)
+        size = (len(data) // 8 - _HEADER) // (rows + 1)
+        buffer = cls(int(rows), int(size))
+        offset = _HEADER * 8
+        buffer.times[:] = np.frombuffer(data, dtype=np.int64, count=size, offset=offset)
+        buffer.values[:] = np.frombuffer(data, dtype=np.float64, count=rows * size, offset=offset + size * 8).reshape(rows, size)
+        buffer.start, buffer.count = int(start), int(count)
+        return buffer
+
+
+def _cache():
+    return caches[settings.INTRADAY_CACHE_ALIAS]
+
+
+def _block_key(day, block):
+    return f'intraday:{day.isoformat()}:{block}'
+
+
+def _marker_key(day, name):
+    return f'intraday:{day.isoformat()}:{name}'
+
+
+def active_users(day):
+    """
+    Users whose value can move during ``day``'s session: those holding
+    positions and those whose portfolio changed since it opened. Returns
+    (user_id, cash, market_value) rows from their PortfolioSnapshot.
+    """
+    snapshots = PortfolioSnapshot.objects.filter(Q(market_value__gt=0) | Q(updated_at__gte=session_open(day)))
+    return snapshots.values_list('user_id', 'cash', 'market_value')
+
+
+def sample(now=None, interval=None):
+    """
+    Append every active user's current value, read from PortfolioSnapshot
+    (which trades and refresh_prices keep current), to their ring buffer for
+    the session. Nothing here calls the market data provider. Returns the
+    number of users sampled.
+    """
+    now = now or timezone.now()
+    day = last_session_day(now)
+    blocks = {}
+    for user_id, cash, market_value in active_users(day).iterator(chunk_size=5000):
+        block, row = divmod(user_id, BLOCK_SIZE)
+        blocks.setdefault(block, {})[row] = float(cash + market_value)
+
+    cache = _cache()
+    keys = {_block_key(day, block): block for block in blocks}
+    stored = cache.get_many(list(keys))
+    size = capacity(interval)
+    updates = {}
+    for key, block in keys.items():
+        buffer = RingBuffer.from_bytes(stored[key]) if key in stored else RingBuffer(BLOCK_SIZE, size)
+        values = np.full(BLOCK_SIZE, np.nan)
+        rows = blocks[block]
+        values[list(rows)] = list(rows.values())
+        buffer.append(int(now.timestamp()), values)
+        updates[key] = buffer.to_bytes()
+    updates[_marker_key(day, 'sampled')] = True
+    cache.set_many(updates, RETENTION)
+    return sum(len(rows) for rows in blocks.values())
+
+
+def read_series(user_id, day=None):
+    """[(datetime, value)] sampled for ``user_id`` during ``day``'s session, oldest first."""
+    day = day or last_session_day()
+    block, row = divmod(user_id, BLOCK_SIZE)
+    data = _cache().get(_block_key(day, block))
+    if data is None:
+        return []
+    times, values = RingBuffer.from_bytes(data).series(row)
+    return [(datetime.fromtimestamp(int(ts), tz=dt_timezone.utc), round(float(value), 2)) for ts, value in zip(times, values)]
+
+
+def rollup(day):
+    """
+    Write each user's last sample of ``day`` into their PortfolioHistory row
+    for that date, replacing any value already there. Returns the number of
+    rows written.
+    """
+    cache = _cache()
+    blocks = {}
+    for user_id in active_users(day).values_list('user_id', flat=True).iterator(chunk_size=5000):
+        blocks.setdefault(user_id // BLOCK_SIZE, []).append(user_id)
+    keys = {_block_key(day, block): block for block in blocks}
+    stored = cache.get_many(list(keys))
+
+    rows = []
+    for key, data in stored.items():
+        latest = RingBuffer.from_bytes(data).latest()
+        for user_id in blocks[keys[key]]:
+            value = latest[user_id % BLOCK_SIZE]
+            if not np.isnan(value):
+                rows.append(PortfolioHistory(user_id=user_id, date=day, total_value=Decimal(str(round(float(value), 2)))))
+    PortfolioHistory.objects.bulk_create(rows, batch_size=5000, update_conflicts=True,
+                                         unique_fields=['user', 'date'], update_fields=['total_value'])
+    # bulk_create sends no post_save, so cached analytics are dropped here
+    invalidate_analytics([row.user_id for row in rows])
+    return len(rows)
+
+
+def close_session(day, interval=None):
+    """
+    Take a closing sample and roll ``day`` up into PortfolioHistory, once.
+    Sessions that were never sampled are left to update_portfolio_history.
+    Returns the number of history rows written, or None if there was
+    nothing to do.
+    """
+    cache = _cache()
+    if not cache.get(_marker_key(day, 'sampled')) or cache.get(_marker_key(day, 'rolled')):
+        return None
+    sample(interval=interval)
+    written = rollup(day)
+    cache.set(_marker_key(day, 'rolled'), True, RETENTION)
+    return written
@@ -0,0 +1,111 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models.functions import Mod
+
+from .bars import sync_bars, tracked_tickers
+from .models import JobCheckpoint
+
+
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise CommandError(f'Invalid shard "{value}", expected i/n such as 0/4.')
+    if count < 1 or not 0 <= index < count:
+        raise CommandError(f'Invalid shard "{value}", need 0 <= i < n.')
+    return index, count
+
+
+def shard_user_ids(index, count, after=0):
+    return list(
+        User.objects.annotate(shard=Mod('id', count))
+        .filter(shard=index, id__gt=after)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+def run_history_job(name, process_chunk, shard=(0, 1), workers=1, chunk_size=500, restart=False, log=None):
+    """
+    Run ``process_chunk(user_ids)`` over every user in ``shard`` (users whose
+    id % n == i), in chunks of ``chunk_size`` users spread across ``workers``
+    processes.
+
+    Progress is checkpointed per job and shard as the highest user id below
+    which every chunk has finished, so an interrupted run resumes where it
+    stopped. Chunks past that point may run again, which is safe because
+    chunk functions are idempotent. Returns the number of rows written.
+    """
+    index, count = shard
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=f'{name}:{index}/{count}')
+    if checkpoint.finished or restart:
+        checkpoint.last_user_id = 0
+        checkpoint.finished = False
+        checkpoint.save()
+    elif checkpoint.last_user_id and log:
+        log(f'Resuming {checkpoint.name} after user {checkpoint.last_user_id}.')
+
+    user_ids = shard_user_ids(index, count, after=checkpoint.last_user_id)
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+    # Sync once up front so workers only read from the bar store
+    sync_bars(tracked_tickers())
+
+    written = 0
+    done = set()
+    next_chunk = 0
+
+    def finish(chunk_index, rows):
+        nonlocal written, next_chunk
+        written += rows
+        done.add(chunk_index)
+        while next_chunk in done:
+            next_chunk += 1
+        if next_chunk:
+            checkpoint.last_user_id = chunks[next_chunk - 1][-1]
+            checkpoint.save(update_fields=['last_user_id', 'updated_at'])
+        if log:
+            log(f'{checkpoint.name}: {len(done)}/{len(chunks)} chunks done, {written} rows written.')
+
+    if workers <= 1:
+        for chunk_index, chunk in enumerate(chunks):
+            finish(chunk_index, process_chunk(chunk))
+    else:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = {pool.submit(process_chunk, chunk): chunk_index for chunk_index, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+    checkpoint.finished = True
+    checkpoint.save(update_fields=['finished', 'updated_at'])
+    return written
+
+
+class HistoryJobCommand(BaseCommand):
+    """Base for history commands that run sharded across a process pool."""
+
+    job_name = None
+    process_chunk = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes to spread users across.')
+        parser.add_argument('--shard', type=str, default='0/1', help='Only process users with id %% n == i, given as i/n.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users per unit of work and checkpoint step.')
+        parser.add_argument('--restart', action='store_true', help='Ignore an unfinished checkpoint and start over.')
+
+    def run_job(self, **kwargs):
+        return run_history_job(
+            self.job_name,
+            type(self).process_chunk,
+            shard=parse_shard(kwargs['shard']),
+            workers=kwargs['workers'],
+            chunk_size=kwargs['chunk_size'],
+            restart=kwargs['restart'],
+            log=self.stdout.write,
+        )
@@ -0,0 +1,117 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+from sortedcontainers import SortedList
+
+from .delta_sync import DeltaSync
+from .models import Holding, LeaderboardEntry, Profile
+
+METRICS = ('value', 'return')
+STARTING_CASH = Profile._meta.get_field('cash').default
+
+
+def holders(tickers):
+    """Users holding any of ``tickers``, found through the Holding ticker index."""
+    return list(Holding.objects.filter(ticker__ticker__in=list(tickers)).values_list('user_id', flat=True).distinct())
+
+
+def update_scores(user_ids, chunk_size=2000):
+    """
+    Revalue ``user_ids`` (cash plus shares at Stock.current_price) and upsert
+    their leaderboard entries. Returns the number of entries written.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    written = 0
+    for i in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[i:i + chunk_size]
+        cash = dict(Profile.objects.filter(user_id__in=chunk).values_list('user_id', 'cash'))
+        holdings = dict(Holding.objects.filter(user_id__in=chunk).values('user').annotate(
+            value=Sum(F('shares_owned') * F('ticker__current_price'), output_field=DecimalField(max_digits=30, decimal_places=6))
+        ).values_list('user', 'value'))
+        now = timezone.now()
+        entries = []
+        for user_id, balance in cash.items():
+            value = (balance + (holdings.get(user_id) or 0)).quantize(Decimal('0.01'))
+            entries.append(LeaderboardEntry(
+                user_id=user_id,
+                portfolio_value=value,
+                return_pct=float(value / STARTING_CASH - 1),
+                updated_at=now,
+            ))
+        LeaderboardEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['portfolio_value', 'return_pct', 'updated_at'],
+        )
+        written += len(entries)
+    return written
+
+
+class Leaderboard:
+    """
+    Every user's scores kept sorted per metric as (-score, user_id) keys in a
+    SortedList, so moving a user is O(log n), a page is a slice and a rank
+    is one binary search.
+    """
+
+    def __init__(self):
+        self.scores = {}
+        self.ranked = {metric: SortedList() for metric in METRICS}
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _remove(self, user_id):
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            for keys, score in zip(self.ranked.values(), old):
+                keys.remove((-score, user_id))
+
+    def apply(self, rows):
+        """Insert or move users given as (user_id, value, return) rows."""
+        for user_id, value, return_pct in rows:
+            scores = (float(value), return_pct)
+            if self.scores.get(user_id) == scores:
+                continue
+            self._remove(user_id)
+            self.scores[user_id] = scores
+            for keys, score in zip(self.ranked.values(), scores):
+                keys.add((-score, user_id))
+
+    def rank(self, metric, user_id):
+        """1-based rank of ``user_id``; tied users share the best rank. None if unranked."""
+        scores = self.scores.get(user_id)
+        if scores is None:
+            return None
+        return self.ranked[metric].bisect_left((-scores[METRICS.index(metric)],)) + 1
+
+    def page(self, metric, offset, limit):
+        """[(rank, user_id, value, return)] for the ``limit`` users from ``offset``."""
+        keys = self.ranked[metric]
+        return [
+            (keys.bisect_left((score,)) + 1, user_id, *self.scores[user_id])
+            for score, user_id in keys[offset:offset + limit]
+        ]
+
+
+def _entries():
+    return LeaderboardEntry.objects.values_list('user_id', 'portfolio_value', 'return_pct')
+
+
+def _build_board():
+    board = Leaderboard()
+    board.apply(_entries().iterator(chunk_size=5000))
+    return board
+
+
+_board = DeltaSync(_build_board, lambda board, since: board.apply(_entries().filter(updated_at__gte=since)))
+
+
+def get_leaderboard():
+    """
+    This process's Leaderboard, brought up to date with the entries written
+    since the last call.
+    """
+    return _board.get()
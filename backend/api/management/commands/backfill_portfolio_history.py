@@ -1,34 +1,14 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from api.models import Holding, PortfolioHistory
-from django.utils import timezone
-from datetime import timedelta
+from api.history import backfill_history_chunk
+from api.jobs import HistoryJobCommand
 
-class Command(BaseCommand):
+class Command(HistoryJobCommand):
     help = 'Backfill PortfolioHistory for all users'
 
-    def handle(self, *args, **kwargs):
-        today = timezone.now().date()
-        users = User.objects.all()
-
-        for user in users:
-            first_history = PortfolioHistory.objects.filter(user=user).order_by('date').first()
-            start_date = first_history.date if first_history else today
+    job_name = 'backfill_portfolio_history'
+    process_chunk = backfill_history_chunk
 
-            current_date = start_date
-            while current_date <= today:
-                if not PortfolioHistory.objects.filter(user=user, date=current_date).exists():
-                    total_value = float(user.profile.cash)
-                    holdings = Holding.objects.filter(user=user)
-                    for holding in holdings:
-                        current_price = holding.current_price()
-                        holding_total = float(holding.shares_owned) * current_price
-                        total_value += holding_total
+    def handle(self, *args, **kwargs):
+        # Fill every missing day from each user's first recorded date until today
+        written = self.run_job(**kwargs)
 
-                    PortfolioHistory.objects.create(
-                        user=user,
-                        date=current_date,
-                        total_value=total_value
-                    )
-                    self.stdout.write(self.style.SUCCESS(f'Backfilled portfolio for {user.username} on {current_date}'))
-                current_date += timedelta(days=1)
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Backfilled PortfolioHistory. {written} entries created.'))
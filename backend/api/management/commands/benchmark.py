@@ -0,0 +1,74 @@
+import json
+import platform
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api.benchmarks import SCALES, SCENARIOS, benchmark_environment, compare
+
+class Command(BaseCommand):
+    help = 'Runs performance benchmarks against a throwaway database and the fake market data provider.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f'Scenarios to run (default: all). Available: {", ".join(SCENARIOS)}')
+        parser.add_argument('--scale', choices=list(SCALES), default='medium', help='Preset for the sizing options below.')
+        parser.add_argument('--latency', type=float, default=0.05, help='Simulated upstream latency in seconds.')
+        parser.add_argument('--iterations', type=int, help='Timed iterations per measurement.')
+        parser.add_argument('--users', type=int, help='Synthetic users for the data-heavy scenarios.')
+        parser.add_argument('--years', type=int, help='Years of history for the data-heavy scenarios.')
+        parser.add_argument('--concurrency', type=int, help='In-flight requests for the load scenarios.')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads for the synchronous load baseline.')
+        parser.add_argument('--emails', type=int, help='Signups and queued emails for the outbox scenario.')
+        parser.add_argument('--transactions', type=int, help='Ledger size of the account in the transactions scenario.')
+        parser.add_argument('--orders', type=int, help='Open orders in the order_book scenario.')
+        parser.add_argument('--output', type=str, help='Write results as JSON to this path.')
+        parser.add_argument('--baseline', type=str, help='JSON results from an earlier run to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(unknown)}')
+        for key, value in SCALES[options['scale']].items():
+            if options[key] is None:
+                options[key] = value
+        too_small = [f'--{key}' for key in SCALES[options['scale']] if options[key] < 1]
+        if too_small:
+            raise CommandError(f'{", ".join(too_small)} must be at least 1.')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Could not read baseline "{options["baseline"]}": {e}')
+
+        results = {}
+        with benchmark_environment(latency=options['latency']) as provider:
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {name}'))
+                results[name] = SCENARIOS[name](provider, options, self.stdout.write)
+
+        if options['output']:
+            settings_used = ['scale', 'latency', 'iterations', 'users', 'years', 'concurrency', 'threads', 'emails', 'transactions', 'orders']
+            report = {
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'options': {key: options[key] for key in settings_used},
+                'results': results,
+            }
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, default=lambda value: value.item())
+            self.stdout.write(f'Results written to {options["output"]}.')
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f'Regression: {regression}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} metric(s) regressed beyond {options["tolerance"]:.0%} of the baseline.')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}.'))
+
+        self.stdout.write(self.style.SUCCESS('Benchmarks completed.'))
@@ -1,14 +1,17 @@
 import csv
 import os
-from decimal import Decimal, InvalidOperation
+from itertools import islice
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from api.models import Stock
+from api.search import invalidate_ticker_index
 
 class Command(BaseCommand):
     help = 'Imports stock tickers and company names from a CSV file.'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', type=str, help='The path to the CSV file containing stock data.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows read and written per batch.')
 
     def handle(self, *args, **kwargs):
         csv_file_path = kwargs['csv_file']
@@ -16,28 +19,46 @@ class Command(BaseCommand):
         if not os.path.exists(csv_file_path):
             raise CommandError(f'File "{csv_file_path}" does not exist.')
 
-        with open(csv_file_path, newline='', encoding='utf-8') as csvfile:
+        max_ticker = Stock._meta.get_field('ticker').max_length
+        max_name = Stock._meta.get_field('company_name').max_length
+        added = updated = unchanged = 0
+
+        with open(csv_file_path, newline='', encoding='utf-8') as csvfile, transaction.atomic():
             reader = csv.DictReader(csvfile)
-            count = 0
-            for row in reader:
-                ticker = row.get('ticker', '').strip().upper()
-                company_name = row.get('name', '').strip()
-
-                if not ticker or not company_name:
-                    self.stdout.write(self.style.WARNING(f'Skipping incomplete row: {row}'))
-                    continue
-
-                try:
-                    stock, created = Stock.objects.update_or_create(
-                        ticker=ticker,
-                        defaults={'company_name': company_name, 'current_price': 0}
-                    )
-                    if created:
-                        count += 1
-                        self.stdout.write(self.style.SUCCESS(f'Added new stock: {stock.ticker} - {stock.company_name}'))
-                    else:
-                        self.stdout.write(self.style.NOTICE(f'Updated stock: {ticker} - {company_name}'))
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error saving stock {ticker}: {e}'))
-
-            self.stdout.write(self.style.SUCCESS(f'Import completed. {count} new stocks added.'))
\ No newline at end of file
+            while True:
+                chunk = list(islice(reader, kwargs['chunk_size']))
+                if not chunk:
+                    break
+
+                names = {}
+                for row in chunk:
+                    ticker = (row.get('ticker') or '').strip().upper()
+                    company_name = (row.get('name') or '').strip()
+                    if not ticker or not company_name:
+                        self.stdout.write(self.style.WARNING(f'Skipping incomplete row: {row}'))
+                        continue
+                    if len(ticker) > max_ticker:
+                        self.stdout.write(self.style.WARNING(f'Skipping ticker longer than {max_ticker} characters: {ticker}'))
+                        continue
+                    names[ticker] = company_name[:max_name]
+
+                existing = dict(Stock.objects.filter(ticker__in=list(names)).values_list('ticker', 'company_name'))
+                changed = [ticker for ticker, name in names.items() if existing.get(ticker) != name]
+                added += sum(1 for ticker in changed if ticker not in existing)
+                updated += sum(1 for ticker in changed if ticker in existing)
+                unchanged += len(names) - len(changed)
+
+                # current_price only applies to new rows; existing prices are left alone
+                Stock.objects.bulk_create(
+                    [Stock(ticker=ticker, company_name=names[ticker], current_price=0) for ticker in changed],
+                    update_conflicts=True,
+                    unique_fields=['ticker'],
+                    update_fields=['company_name'],
+                )
+
+        if added or updated:
+            # Make every process rebuild its ticker search index on next use
+            invalidate_ticker_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Import completed. {added} stocks added, {updated} updated, {unchanged} unchanged.'
+        ))
@@ -0,0 +1,14 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from api.leaderboard import update_scores
+
+class Command(BaseCommand):
+    help = 'Recomputes every user\'s leaderboard entry from their cash and holdings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Users valued per batch of queries.')
+
+    def handle(self, *args, **kwargs):
+        user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        written = update_scores(user_ids, chunk_size=kwargs['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Leaderboard rebuilt. {written} entries written.'))
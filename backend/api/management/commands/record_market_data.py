@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from api.bars import tracked_tickers
+from api.market_data import RecordingProvider
+
+PERIODS = ['5d', '1mo', '3mo', '1y', '5y', '10y', 'ytd', 'max']
+
+class Command(BaseCommand):
+    help = 'Records quotes, info, history and daily bars to local files for ReplayProvider.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers to record (default: every held or traded ticker).')
+        parser.add_argument('--source', type=str, default='api.market_data.YFinanceProvider', help='Provider to record from.')
+        parser.add_argument('--path', type=str, help='Recording directory (default: settings.MARKET_DATA_RECORDINGS).')
+        parser.add_argument('--periods', type=str, default=','.join(PERIODS), help='Comma-separated history periods to record.')
+        parser.add_argument('--days', type=int, default=3 * 365, help='Days of daily bars to record.')
+
+    def handle(self, *args, **kwargs):
+        tickers = sorted(ticker.upper() for ticker in (kwargs['tickers'] or tracked_tickers()))
+        periods = [period for period in kwargs['periods'].split(',') if period]
+        unknown = [period for period in periods if period not in PERIODS]
+        if unknown:
+            raise CommandError(f'Unknown period(s): {", ".join(unknown)}')
+
+        provider = RecordingProvider(kwargs['source'], path=kwargs['path'])
+        quotes = provider.get_quotes(tickers)
+        bars = provider.get_bars(tickers, date.today() - timedelta(days=kwargs['days']), date.today() + timedelta(days=1))
+        for ticker in tickers:
+            provider.get_info(ticker)
+            for period in periods:
+                provider.get_history(ticker, period)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recorded {len(quotes)} quotes, {len(bars)} bar series and {len(tickers) * len(periods)} histories '
+            f'to {provider.recordings.path}.'
+        ))
@@ -0,0 +1,36 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.prices import refresh_prices, watched_tickers
+
+class Command(BaseCommand):
+    help = 'Keeps Stock.current_price fresh for every held ticker and open order, polling until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.PRICE_REFRESH_INTERVAL, help='Seconds between the start of each cycle.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Tickers per upstream request.')
+        parser.add_argument('--once', action='store_true', help='Run a single cycle and exit.')
+
+    def handle(self, *args, **kwargs):
+        interval = kwargs['interval']
+        self.stdout.write(f'Refreshing prices every {interval:g}s in batches of {kwargs["batch_size"]}.')
+        try:
+            while True:
+                started = time.monotonic()
+                close_old_connections()
+                try:
+                    tickers = watched_tickers()
+                    updated = refresh_prices(tickers, batch_size=kwargs['batch_size'])
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'Refreshed {updated}/{len(tickers)} prices in {elapsed:.2f}s.')
+                    if elapsed > interval:
+                        self.stdout.write(self.style.WARNING(f'Cycle took longer than the {interval:g}s interval.'))
+                except Exception as e:
+                    self.stderr.write(f"Price refresh cycle failed: {e}")
+                if kwargs['once']:
+                    break
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Price refresher stopped.'))
@@ -0,0 +1,38 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.intraday import close_session, sample
+from api.market_hours import is_market_open, last_session_day
+
+class Command(BaseCommand):
+    help = 'Samples active users\' portfolio values during market hours and rolls them into PortfolioHistory at the close.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.INTRADAY_INTERVAL, help='Seconds between samples.')
+        parser.add_argument('--once', action='store_true', help='Run a single cycle and exit.')
+
+    def handle(self, *args, **kwargs):
+        interval = kwargs['interval']
+        self.stdout.write(f'Sampling portfolio values every {interval:g}s during market hours.')
+        try:
+            while True:
+                started = time.monotonic()
+                close_old_connections()
+                try:
+                    if is_market_open():
+                        sampled = sample(interval=interval)
+                        self.stdout.write(f'Sampled {sampled} portfolios in {time.monotonic() - started:.2f}s.')
+                    else:
+                        day = last_session_day()
+                        written = close_session(day, interval=interval)
+                        if written is not None:
+                            self.stdout.write(f'Rolled {written} portfolios into history for {day}.')
+                except Exception as e:
+                    self.stderr.write(f"Intraday sampling cycle failed: {e}")
+                if kwargs['once']:
+                    break
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Intraday sampler stopped.'))
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.outbox import send_pending
+
+class Command(BaseCommand):
+    help = 'Delivers queued outbound emails in batches over a reused mail connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Emails sent per connection.')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before an email is marked failed.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+
+    def handle(self, *args, **kwargs):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                close_old_connections()
+                started = time.monotonic()
+                try:
+                    sent, failed = send_pending(batch_size=kwargs['batch_size'], max_attempts=kwargs['max_attempts'])
+                except Exception as e:
+                    self.stderr.write(f"Email batch failed: {e}")
+                    sent = failed = 0
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} emails, {failed} failed in {time.monotonic() - started:.2f}s.')
+                    continue
+                if kwargs['once']:
+                    break
+                time.sleep(kwargs['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Email worker stopped. {total_sent} sent, {total_failed} failed.'))
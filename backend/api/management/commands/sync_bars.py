@@ -0,0 +1,23 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from api.bars import sync_bars, tracked_tickers
+
+class Command(BaseCommand):
+    help = 'Fetches missing daily OHLCV bars into the local PriceBar store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers to sync (default: every held or traded ticker).')
+        parser.add_argument('--since', type=str, help='First date (YYYY-MM-DD) to fetch for tickers with no stored bars.')
+        parser.add_argument('--batch-size', type=int, default=50, help='Tickers per upstream request.')
+
+    def handle(self, *args, **kwargs):
+        tickers = kwargs['tickers'] or tracked_tickers()
+        since = None
+        if kwargs['since']:
+            try:
+                since = date.fromisoformat(kwargs['since'])
+            except ValueError:
+                raise CommandError(f'Invalid --since date "{kwargs["since"]}".')
+
+        written = sync_bars(tickers, since=since, batch_size=kwargs['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Bar sync completed. {written} bars written for {len(tickers)} tickers.'))
@@ -0,0 +1,603 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+import yfinance as yf
+
+from .instrumentation import InstrumentedProvider
+from .market_hours import is_market_open, seconds_until_next_open
+
+
+def price_from_info(info):
+    # Same fallback chain the views have always used for a ticker's price
+    price = info.get('currentPrice') or info.get('ask') or info.get('regularMarketPreviousClose')
+    return float(price) if price is not None else None
+
+
+class MarketDataProvider:
+    """
+    Interface for upstream market data. Tickers are upper-case symbols and
+    every bulk method should cost a single upstream round-trip.
+    """
+
+    def get_quotes(self, tickers):
+        """Return {ticker: latest price} for the tickers upstream knows about."""
+        raise NotImplementedError
+
+    def get_info(self, ticker):
+        """Return the metadata dict for one ticker, shaped like ``yf.Ticker.info``."""
+        raise NotImplementedError
+
+    def get_history(self, ticker, period):
+        """Return a daily OHLCV DataFrame for one ticker over a yfinance period."""
+        raise NotImplementedError
+
+    def get_bars(self, tickers, start, end):
+        """Return {ticker: daily OHLCV DataFrame} for dates in [start, end)."""
+        raise NotImplementedError
+
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class YFinanceProvider(MarketDataProvider):
+    def _download(self, tickers, **kwargs):
+        return yf.download(
+            list(tickers),
+            interval='1d',
+            group_by='column',
+            auto_adjust=True,
+            multi_level_index=True,
+            progress=False,
+            threads=True,
+            **kwargs
+        )
+
+    def get_quotes(self, tickers):
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        data = self._download(tickers, period='5d')
+        if data is None or data.empty:
+            return {}
+        last = data['Close'].ffill().iloc[-1]
+        return {ticker: float(price) for ticker, price in last.items() if pd.notna(price)}
+
+    def get_info(self, ticker):
+        return yf.Ticker(ticker).info
+
+    def get_history(self, ticker, period):
+        return yf.Ticker(ticker).history(period=period)
+
+    def get_bars(self, tickers, start, end):
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        data = self._download(tickers, start=start, end=end)
+        if data is None or data.empty:
+            return {}
+        bars = {}
+        for ticker in tickers:
+            frame = pd.DataFrame({column: data[column][ticker] for column in BAR_COLUMNS}).dropna(subset=['Close'])
+            frame.index = frame.index.date
+            bars[ticker] = frame
+        return bars
+
+
+class FakeMarketDataProvider(MarketDataProvider):
+    """
+    Deterministic, offline provider for tests and benchmarks. Prices follow a
+    seeded random walk per ticker so every call returns the same data. Each
+    call sleeps ``latency`` seconds to stand in for the network.
+    """
+
+    EPOCH = date(2000, 1, 3)
+    PERIOD_DAYS = {'5d': 7, '1mo': 31, '3mo': 92, '1y': 366, '5y': 5 * 366, '10y': 10 * 366}
+
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.seed = seed
+        self.calls = 0
+        self._walks = {}
+        self._prices = {}
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _walk(self, ticker):
+        walk = self._walks.get(ticker)
+        if walk is None:
+            days = pd.bdate_range(self.EPOCH, date.today() + timedelta(days=7))
+            rng = np.random.default_rng(zlib.crc32(ticker.encode()) + self.seed)
+            base = 20 + zlib.crc32(ticker.encode()) % 480
+            close = base * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(days))))
+            spread = close * rng.uniform(0.001, 0.02, len(days))
+            walk = pd.DataFrame({
+                'Open': close - spread / 2,
+                'High': close + spread,
+                'Low': close - spread,
+                'Close': close,
+                'Volume': rng.integers(100_000, 10_000_000, len(days)).astype(float),
+            }, index=days)
+            self._walks[ticker] = walk
+        return walk
+
+    def _slice(self, ticker, start, end):
+        walk = self._walk(ticker)
+        return walk.loc[pd.Timestamp(start):pd.Timestamp(end) - pd.Timedelta(days=1)]
+
+    def _price(self, ticker):
+        price = self._prices.get(ticker)
+        if price is None:
+            price = self._prices[ticker] = round(float(self._walk(ticker)['Close'].loc[:pd.Timestamp(date.today())].iloc[-1]), 2)
+        return price
+
+    def get_quotes(self, tickers):
+        self._call()
+        return {ticker: self._price(ticker) for ticker in tickers}
+
+    def get_info(self, ticker):
+        self._call()
+        return {
+            'shortName': f'{ticker} Inc.',
+            'currentPrice': self._price(ticker),
+            'marketCap': 1_000_000 * (zlib.crc32(ticker.encode()) % 100_000),
+            'volume': 1_000_000,
+            'sector': 'Technology',
+            'industry': 'Software',
+            'exchange': 'NMS',
+        }
+
+    def get_history(self, ticker, period):
+        self._call()
+        end = date.today() + timedelta(days=1)
+        if period == 'max':
+            start = self.EPOCH
+        elif period == 'ytd':
+            start = date(end.year, 1, 1)
+        else:
+            start = end - timedelta(days=self.PERIOD_DAYS[period])
+        return self._slice(ticker, start, end)
+
+    def get_bars(self, tickers, start, end):
+        self._call()
+        bars = {}
+        for ticker in tickers:
+            frame = self._slice(ticker, start, end).copy()
+            frame.index = frame.index.date
+            bars[ticker] = frame
+        return bars
+
+
+class _Recordings:
+    """
+    One directory of recorded responses: quotes.json ({ticker: price}),
+    info/<TICKER>.json, history/<TICKER>/<period>.csv and bars/<TICKER>.csv.
+    Writes go through a temporary file and a rename so readers never see a
+    partial file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _write(self, path, write):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        write(tmp)
+        os.replace(tmp, path)
+
+    def _write_json(self, path, data):
+        self._write(path, lambda tmp: tmp.write_text(json.dumps(data, default=str, sort_keys=True)))
+
+    def _write_frame(self, path, frame):
+        frame = frame[BAR_COLUMNS].copy()
+        # Only the trading day matters; dropping the exchange timezone keeps the files simple
+        frame.index = pd.DatetimeIndex(frame.index).tz_localize(None).normalize()
+        frame.index.name = 'Date'
+        self._write(path, lambda tmp: frame.to_csv(tmp))
+
+    def _read_frame(self, path):
+        if not path.exists():
+            return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+        # Parse prices back to exactly the floats that were recorded
+        return pd.read_csv(path, index_col='Date', parse_dates=['Date'], float_precision='round_trip')
+
+    def quotes(self):
+        path = self.path / 'quotes.json'
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def save_quotes(self, quotes):
+        with self._lock:
+            self._write_json(self.path / 'quotes.json', {**self.quotes(), **quotes})
+
+    def info(self, ticker):
+        path = self.path / 'info' / f'{ticker}.json'
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def save_info(self, ticker, info):
+        self._write_json(self.path / 'info' / f'{ticker}.json', info)
+
+    def history(self, ticker, period):
+        return self._read_frame(self.path / 'history' / ticker / f'{period}.csv')
+
+    def save_history(self, ticker, period, frame):
+        self._write_frame(self.path / 'history' / ticker / f'{period}.csv', frame)
+
+    def bars(self, ticker):
+        return self._read_frame(self.path / 'bars' / f'{ticker}.csv')
+
+    def save_bars(self, ticker, frame):
+        frame = frame[BAR_COLUMNS].copy()
+        frame.index = pd.DatetimeIndex(frame.index)
+        with self._lock:
+            existing = self.bars(ticker)
+            if not existing.empty:
+                frame = pd.concat([existing, frame])
+                frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+            self._write_frame(self.path / 'bars' / f'{ticker}.csv', frame)
+
+
+class RecordingProvider(MarketDataProvider):
+    """
+    Passes every call through to another provider and records the responses
+    under ``path`` so ReplayProvider can serve them later.
+    """
+
+    def __init__(self, provider='api.market_data.YFinanceProvider', path=None, **options):
+        self.provider = import_string(provider)(**options)
+        self.recordings = _Recordings(path or settings.MARKET_DATA_RECORDINGS)
+
+    def get_quotes(self, tickers):
+        quotes = self.provider.get_quotes(tickers)
+        if quotes:
+            self.recordings.save_quotes(quotes)
+        return quotes
+
+    def get_info(self, ticker):
+        info = self.provider.get_info(ticker)
+        self.recordings.save_info(ticker, info)
+        return info
+
+    def get_history(self, ticker, period):
+        frame = self.provider.get_history(ticker, period)
+        self.recordings.save_history(ticker, period, frame)
+        return frame
+
+    def get_bars(self, tickers, start, end):
+        bars = self.provider.get_bars(tickers, start, end)
+        for ticker, frame in bars.items():
+            self.recordings.save_bars(ticker, frame)
+        return bars
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves responses recorded by RecordingProvider without touching the
+    network. Anything never recorded looks like a ticker upstream does not
+    know: no quote, empty info and empty history.
+    """
+
+    def __init__(self, path=None):
+        self.recordings = _Recordings(path or settings.MARKET_DATA_RECORDINGS)
+
+    def get_quotes(self, tickers):
+        quotes = self.recordings.quotes()
+        return {ticker: quotes[ticker] for ticker in tickers if ticker in quotes}
+
+    def get_info(self, ticker):
+        return self.recordings.info(ticker)
+
+    def get_history(self, ticker, period):
+        return self.recordings.history(ticker, period)
+
+    def get_bars(self, tickers, start, end):
+        bars = {}
+        for ticker in tickers:
+            frame = self.recordings.bars(ticker)
+            frame = frame.loc[pd.Timestamp(start):pd.Timestamp(end) - pd.Timedelta(days=1)].copy()
+            if not frame.empty:
+                frame.index = frame.index.date
+                bars[ticker] = frame
+        return bars
+
+
+_provider = None
+_provider_key = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Return the provider selected by ``settings.MARKET_DATA_PROVIDER``,
+    constructed with ``settings.MARKET_DATA_PROVIDER_OPTIONS``.
+    """
+    global _provider, _provider_key
+    key = (settings.MARKET_DATA_PROVIDER, repr(settings.MARKET_DATA_PROVIDER_OPTIONS))
+    with _provider_lock:
+        if _provider is None or _provider_key != key:
+            provider_class = import_string(settings.MARKET_DATA_PROVIDER)
+            _provider = InstrumentedProvider(provider_class(**settings.MARKET_DATA_PROVIDER_OPTIONS))
+            _provider_key = key
+        return _provider
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Two-tier cache: an in-process LRU in front of a Django cache backend.
+
+    Concurrent misses for the same key are coalesced so that only one caller
+    runs the loader while the others wait for its result.
+    """
+
+    def __init__(self, prefix, ttl, local_size=1024, alias='default'):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local_size = local_size
+        self.alias = alias
+        self._local = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def reset_stats(self):
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.coalesced = 0
+
+    def stats(self):
+        return {
+            'hits_local': self.hits_local,
+            'hits_shared': self.hits_shared,
+            'misses': self.misses,
+            'bypasses': self.bypasses,
+            'coalesced': self.coalesced,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def _get_local(self, key):
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _set_local(self, key, value, ttl):
+        self._local[key] = (time.monotonic() + ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    def set_many(self, values, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            for key, value in values.items():
+                self._set_local(key, value, ttl)
+        self.shared.set_many({self._key(key): value for key, value in values.items()}, ttl)
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def get_many_or_fetch(self, keys, loader, fresh=False, ttl=None):
+        """
+        Return {key: value} for ``keys``, calling ``loader(missing_keys)`` once
+        for every key found in neither tier. ``fresh=True`` skips both tiers
+        and always goes upstream, but the fetched values still refresh the
+        cache for everyone else. Fresh callers only wait on other fresh
+        lookups, never on one that may be answered from the cache. Keys with
+        no value are left out.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        result = {}
+        leading = {}
+        waiting = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if fresh:
+                    self.bypasses += 1
+                else:
+                    entry = self._get_local(key)
+                    if entry is not None:
+                        self.hits_local += 1
+                        result[key] = entry[1]
+                        continue
+                # Flights are keyed by (key, fresh); a cached caller may take a fresh answer but not the reverse
+                flight = self._flights.get((key, True))
+                if flight is None and not fresh:
+                    flight = self._flights.get((key, False))
+                if flight is None:
+                    leading[key] = self._flights[(key, fresh)] = _Flight()
+                else:
+                    self.coalesced += 1
+                    waiting[key] = flight
+
+        if leading:
+            try:
+                if not fresh:
+                    found = self.shared.get_many([self._key(key) for key in leading])
+                    with self._lock:
+                        for key in leading:
+                            value = found.get(self._key(key))
+                            if value is not None:
+                                self.hits_shared += 1
+                                self._set_local(key, value, ttl)
+                                result[key] = value
+                missing = [key for key in leading if key not in result]
+                if missing:
+                    with self._lock:
+                        self.misses += len(missing)
+                    loaded = loader(missing)
+                    # Failed lookups are not cached so the next caller retries
+                    loaded = {key: loaded[key] for key in missing if loaded.get(key) is not None}
+                    if loaded:
+                        self.set_many(loaded, ttl)
+                    result.update(loaded)
+            except Exception as e:
+                for flight in leading.values():
+                    flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key, flight in leading.items():
+                        del self._flights[(key, fresh)]
+                        flight.value = result.get(key)
+                        flight.event.set()
+
+        for key, flight in waiting.items():
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.value is not None:
+                result[key] = flight.value
+        return result
+
+    def get_or_fetch(self, key, loader, fresh=False, ttl=None):
+        return self.get_many_or_fetch([key], lambda keys: {key: loader()}, fresh=fresh, ttl=ttl).get(key)
+
+
+quote_cache = TTLCache(
+    'quote',
+    ttl=settings.QUOTE_CACHE_TTL,
+    local_size=settings.QUOTE_CACHE_LOCAL_SIZE,
+    alias=settings.QUOTE_CACHE_ALIAS,
+)
+info_cache = TTLCache(
+    'info',
+    ttl=settings.QUOTE_CACHE_TTL,
+    local_size=settings.QUOTE_CACHE_LOCAL_SIZE,
+    alias=settings.QUOTE_CACHE_ALIAS,
+)
+history_cache = TTLCache(
+    'history',
+    ttl=settings.HISTORY_CACHE_TTL,
+    local_size=256,
+    alias=settings.QUOTE_CACHE_ALIAS,
+)
+
+
+def get_quotes(tickers, fresh=False):
+    """
+    Latest prices for ``tickers`` as {TICKER: float}, resolved with at most
+    one upstream call. Pass ``fresh=True`` when the prices execute trades.
+    """
+    tickers = [ticker.upper() for ticker in tickers]
+    return quote_cache.get_many_or_fetch(tickers, lambda missing: get_provider().get_quotes(missing), fresh=fresh)
+
+
+def get_quote(ticker, fresh=False):
+    """Latest price for ``ticker`` or None if upstream has none."""
+    return get_quotes([ticker], fresh=fresh).get(ticker.upper())
+
+
+def get_info(ticker, fresh=False):
+    ticker = ticker.upper()
+    return info_cache.get_or_fetch(ticker, lambda: get_provider().get_info(ticker), fresh=fresh)
+
+
+def history_ttl(now=None):
+    """
+    Seconds to cache daily history: HISTORY_CACHE_TTL while the market is
+    open, otherwise until the next session opens since nothing can change.
+    """
+    if is_market_open(now):
+        return settings.HISTORY_CACHE_TTL
+    return max(settings.HISTORY_CACHE_TTL, int(seconds_until_next_open(now)))
+
+
+def history_series(frame):
+    """JSON-ready {'dates', 'open', 'high', 'low', 'close', 'volume'} lists with gaps as None."""
+    series = {'dates': frame.index.strftime('%Y-%m-%d').tolist()}
+    for column in BAR_COLUMNS:
+        values = frame[column]
+        series[column.lower()] = values.astype(object).where(values.notna(), None).tolist()
+    return series
+
+
+def get_history(ticker, period, fresh=False):
+    """Daily OHLCV series for ``ticker`` over a yfinance period, shaped by ``history_series``."""
+    ticker = ticker.upper()
+    return history_cache.get_or_fetch(
+        f'{ticker}:{period}',
+        lambda: history_series(get_provider().get_history(ticker, period)),
+        fresh=fresh,
+        ttl=history_ttl(),
+    )
+
+
+# Blocking provider calls made from async views run here, sized for many
+# concurrent upstream waits rather than CPU work
+_io_executor = ThreadPoolExecutor(max_workers=settings.MARKET_DATA_THREADS, thread_name_prefix='market-data')
+
+
+async def _run_blocking(fn, *args, **kwargs):
+    # Carry context variables (request instrumentation) into the worker thread
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_io_executor, context.run, partial(fn, *args, **kwargs))
+
+
+async def aget_info(ticker, fresh=False):
+    return await _run_blocking(get_info, ticker, fresh=fresh)
+
+
+async def aget_history(ticker, period, fresh=False):
+    return await _run_blocking(get_history, ticker, period, fresh=fresh)
+
+
+def prefetch_prices(holdings):
+    """
+    Resolve the current price of every holding so ``Holding.current_price``
+    and ``Holding.total_value`` stay off the network. Prices refresh_prices
+    kept fresh in the database are used as is, the rest come from one
+    batched quote lookup. Tickers upstream has no quote for fall back to
+    their last daily close.
+    """
+    holdings = list(holdings)
+    stored = {holding.ticker.ticker: holding.ticker.stored_price() for holding in holdings}
+    prices = get_quotes([ticker for ticker, price in stored.items() if price is None])
+    for holding in holdings:
+        price = stored[holding.ticker.ticker]
+        if price is None:
+            price = prices.get(holding.ticker.ticker)
+        holding._prefetched_price = price if price is not None else holding.last_close()
+    return holdings
@@ -0,0 +1,52 @@
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+
+OPEN = dt_time(9, 30)
+CLOSE = dt_time(16, 0)
+
+
+def _exchange_now(now=None):
+    return (now or timezone.now()).astimezone(ZoneInfo(settings.MARKET_TIME_ZONE))
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day.isoformat() not in settings.MARKET_HOLIDAYS
+
+
+def is_market_open(now=None):
+    now = _exchange_now(now)
+    return is_trading_day(now.date()) and OPEN <= now.time() < CLOSE
+
+
+def next_market_open(now=None):
+    """The start of the next regular session strictly after ``now``."""
+    now = _exchange_now(now)
+    day = now.date()
+    if now.time() >= OPEN:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return datetime.combine(day, OPEN, tzinfo=now.tzinfo)
+
+
+def seconds_until_next_open(now=None):
+    now = _exchange_now(now)
+    return (next_market_open(now) - now).total_seconds()
+
+
+def last_session_day(now=None):
+    """The exchange date of the session under way, or of the latest one that has opened before ``now``."""
+    now = _exchange_now(now)
+    day = now.date()
+    if now.time() < OPEN:
+        day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def session_open(day):
+    return datetime.combine(day, OPEN, tzinfo=ZoneInfo(settings.MARKET_TIME_ZONE))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('open', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('high', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('low', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('close', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('volume', models.BigIntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bars', to='api.stock')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('stock', 'date')},
+            },
+        ),
+    ]
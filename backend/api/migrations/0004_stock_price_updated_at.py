@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_jobcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='price_updated_at',
+            field=models.DateTimeField(blank=True, help_text='When current_price was last refreshed from market data.', null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='api_transac_user_id_11cc9a_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:17
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_leaderboardentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('side', models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], max_length=4)),
+                ('order_type', models.CharField(choices=[('LIMIT', 'Limit'), ('STOP', 'Stop'), ('STOP_LIMIT', 'Stop limit')], max_length=10)),
+                ('quantity', models.DecimalField(decimal_places=4, help_text='Number of shares to buy or sell.', max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.0001'))])),
+                ('limit_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('stop_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('FILLED', 'Filled'), ('CANCELLED', 'Cancelled'), ('REJECTED', 'Rejected')], default='OPEN', max_length=9)),
+                ('triggered_at', models.DateTimeField(blank=True, help_text="When a stop-limit order's stop was reached.", null=True)),
+                ('fill_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('filled_at', models.DateTimeField(blank=True, null=True)),
+                ('message', models.CharField(blank=True, help_text='Why the order was rejected.', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='api.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='api_order_status_1d49fe_idx'), models.Index(fields=['user', 'created_at'], name='api_order_user_id_d6ac48_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cash', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('market_value', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('cost_basis', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('day_change', models.DecimalField(decimal_places=2, help_text='Change in market value since the previous daily close.', max_digits=20)),
+                ('positions', models.JSONField(default=list, help_text='Holdings as the dashboard lists them.')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_snapshot', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
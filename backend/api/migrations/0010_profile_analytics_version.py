@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_portfoliosnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='analytics_version',
+            field=models.PositiveBigIntegerField(default=0, help_text="Incremented whenever the user's cached analytics go stale."),
+        ),
+    ]
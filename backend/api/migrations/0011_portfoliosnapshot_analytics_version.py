@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_profile_analytics_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='analytics_version',
+            field=models.PositiveBigIntegerField(default=0, help_text='The Profile.analytics_version the snapshot was built from.'),
+        ),
+    ]
@@ -1,8 +1,12 @@
+from datetime import timedelta
 from decimal import Decimal
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
-import yfinance as yf
+from .market_data import get_quote
+from .price_matrix import get_price_matrix
 
 class Stock(models.Model):
     ticker = models.CharField(max_length=10, unique=True)
@@ -13,17 +17,27 @@ class Stock(models.Model):
         validators=[MinValueValidator(Decimal('0.00'))],
         help_text="Current price of the stock."
     )
+    price_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When current_price was last refreshed from market data."
+    )
 
-    def update_current_price(self):
-        import yfinance as yf
-        ticker_data = yf.Ticker(self.ticker)
-        latest_price = ticker_data.info.get('currentPrice') or ticker_data.info.get('ask') or ticker_data.info.get('regularMarketPreviousClose')
+    def update_current_price(self, fresh=False):
+        latest_price = get_quote(self.ticker, fresh=fresh)
         if latest_price is not None:
             self.current_price = Decimal(str(latest_price))
+            self.price_updated_at = timezone.now()
             self.save()
         else:
             raise ValueError(f"Could not fetch latest price for ticker {self.ticker}")
 
+    def stored_price(self):
+        # current_price is only trusted while refresh_prices keeps it within PRICE_MAX_AGE
+        if self.price_updated_at and timezone.now() - self.price_updated_at <= timedelta(seconds=settings.PRICE_MAX_AGE):
+            return float(self.current_price)
+        return None
+
     def __str__(self):
         return f"{self.ticker} - {self.company_name}"
 
@@ -37,6 +51,10 @@ class Profile(models.Model):
         max_digits=12, 
         validators=[MinValueValidator(Decimal('0.00'))]
         )
+    analytics_version = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Incremented whenever the user's cached analytics go stale."
+    )
 
     def __str__(self):
         return f"{self.user.username}'s profile"
@@ -74,6 +92,10 @@ class Transaction(models.Model):
         self.total_amount = self.quantity * self.price_per_share
         super().save(*args, **kwargs)
 
+    class Meta:
+        # Keyset pagination of a user's ledger walks this index newest first
+        indexes = [models.Index(fields=['user', 'timestamp', 'id'])]
+
     def __str__(self):
         return f"{self.transaction_type} {self.quantity} shares of {self.stock.ticker} by {self.user.username} on {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
 
@@ -91,13 +113,22 @@ class Holding(models.Model):
     average_price = models.DecimalField(max_digits=20, decimal_places=2)
 
     def current_price(self):
+        # Set by market_data.prefetch_prices when a whole list of holdings is priced at once
+        if hasattr(self, '_prefetched_price'):
+            return float(self._prefetched_price or 0.0)
+        stored = self.ticker.stored_price()
+        if stored is not None:
+            return stored
         try:
-            ticker_data = yf.Ticker(self.ticker.ticker)
-            latest_price = ticker_data.info.get('currentPrice') or ticker_data.info.get('ask') or ticker_data.info.get('regularMarketPreviousClose')
-            return float(latest_price)
+            return float(get_quote(self.ticker.ticker))
         except Exception as e:
             print(f"Could not fetch latest price for ticker {self.ticker}: {e}")
-            return 0.0
+            return self.last_close() or 0.0
+
+    def last_close(self):
+        # Latest daily close from the shared price matrix, without a query or upstream call
+        matrix = get_price_matrix()
+        return matrix.latest(self.ticker.ticker) if matrix is not None else None
 
     def total_value(self):
         return float(self.shares_owned) * self.current_price()
@@ -115,4 +146,122 @@ class PortfolioHistory(models.Model):
 
     class Meta:
         ordering = ['date']
-        unique_together = ('user', 'date')
\ No newline at end of file
+        unique_together = ('user', 'date')
+
+class PriceBar(models.Model):
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='bars')
+    date = models.DateField()
+    open = models.DecimalField(max_digits=14, decimal_places=4)
+    high = models.DecimalField(max_digits=14, decimal_places=4)
+    low = models.DecimalField(max_digits=14, decimal_places=4)
+    close = models.DecimalField(max_digits=14, decimal_places=4)
+    volume = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ('stock', 'date')
+
+    def __str__(self):
+        return f"{self.stock.ticker} {self.date} close {self.close}"
+
+class JobCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    last_user_id = models.BigIntegerField(default=0, help_text="Every user up to this id has been processed.")
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        state = 'finished' if self.finished else f'at user {self.last_user_id}'
+        return f"{self.name} {state}"
+
+class OutboundEmail(models.Model):
+    STATUSES = (
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    from_email = models.CharField(max_length=255)
+    to_email = models.EmailField()
+    html_body = models.TextField()
+    status = models.CharField(max_length=7, choices=STATUSES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
+
+class LeaderboardEntry(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='leaderboard_entry')
+    portfolio_value = models.DecimalField(max_digits=20, decimal_places=2)
+    return_pct = models.FloatField(help_text="Return since the user joined, as a fraction of starting cash.")
+    updated_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.portfolio_value}"
+
+class Order(models.Model):
+    SIDES = (
+        ('BUY', 'Buy'),
+        ('SELL', 'Sell'),
+    )
+    ORDER_TYPES = (
+        ('LIMIT', 'Limit'),
+        ('STOP', 'Stop'),
+        ('STOP_LIMIT', 'Stop limit'),
+    )
+    STATUSES = (
+        ('OPEN', 'Open'),
+        ('FILLED', 'Filled'),
+        ('CANCELLED', 'Cancelled'),
+        ('REJECTED', 'Rejected'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='orders')
+    side = models.CharField(max_length=4, choices=SIDES)
+    order_type = models.CharField(max_length=10, choices=ORDER_TYPES)
+    quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        validators=[MinValueValidator(Decimal('0.0001'))],
+        help_text="Number of shares to buy or sell."
+    )
+    limit_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    stop_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    status = models.CharField(max_length=9, choices=STATUSES, default='OPEN')
+    triggered_at = models.DateTimeField(null=True, blank=True, help_text="When a stop-limit order's stop was reached.")
+    fill_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    filled_at = models.DateTimeField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True, help_text="Why the order was rejected.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Order books load open orders, then only those created since the last sync
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.order_type} {self.side} {self.quantity} {self.stock.ticker} for {self.user.username} ({self.status})"
+
+class PortfolioSnapshot(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='portfolio_snapshot')
+    cash = models.DecimalField(max_digits=12, decimal_places=2)
+    market_value = models.DecimalField(max_digits=20, decimal_places=2)
+    cost_basis = models.DecimalField(max_digits=20, decimal_places=2)
+    day_change = models.DecimalField(max_digits=20, decimal_places=2, help_text="Change in market value since the previous daily close.")
+    positions = models.JSONField(default=list, help_text="Holdings as the dashboard lists them.")
+    analytics_version = models.PositiveBigIntegerField(default=0, help_text="The Profile.analytics_version the snapshot was built from.")
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user.username}'s portfolio at {self.updated_at:%Y-%m-%d %H:%M:%S}"
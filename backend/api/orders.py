@@ -0,0 +1,209 @@
+from decimal import Decimal, InvalidOperation
+from heapq import heappop, heappush
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .delta_sync import DeltaSync
+from .leaderboard import update_scores
+from .market_data import get_quote
+from .models import Order, Stock
+from .trading import CENT, SIDES, OrderError, parse_quantity, settle
+
+ORDER_TYPES = ('LIMIT', 'STOP', 'STOP_LIMIT')
+
+
+class OrderBook:
+    """
+    Open orders for one ticker. Limits sit in heaps with the most generous
+    price on top and stops in trigger ladders with the nearest stop on top,
+    older orders first on ties, so a price update only touches the orders it
+    crosses: O(k log n) for k of n open orders. Orders cancelled elsewhere
+    stay until popped; fill_order skips them.
+    """
+
+    def __init__(self):
+        self.orders = {}
+        self.buy_limits = []
+        self.sell_limits = []
+        self.buy_stops = []
+        self.sell_stops = []
+
+    def __len__(self):
+        return len(self.orders)
+
+    def _rest(self, order_id, side, limit_price):
+        if side == 'BUY':
+            heappush(self.buy_limits, (-limit_price, order_id))
+        else:
+            heappush(self.sell_limits, (limit_price, order_id))
+
+    def add(self, order_id, side, order_type, limit_price, stop_price, triggered=False):
+        if order_id in self.orders:
+            return
+        self.orders[order_id] = (side, order_type, limit_price)
+        if order_type == 'LIMIT' or triggered:
+            self._rest(order_id, side, limit_price)
+        elif side == 'BUY':
+            heappush(self.buy_stops, (stop_price, order_id))
+        else:
+            heappush(self.sell_stops, (-stop_price, order_id))
+
+    def _trigger(self, order_id, fills, triggered):
+        side, order_type, limit_price = self.orders[order_id]
+        if order_type == 'STOP':
+            del self.orders[order_id]
+            fills.append(order_id)
+        else:
+            triggered.append(order_id)
+            self._rest(order_id, side, limit_price)
+
+    def cross(self, price):
+        """
+        Take the orders ``price`` crosses off the book. Returns (fills,
+        triggered): ids to fill at ``price``, and ids of stop-limit orders
+        whose stop was reached; those rest as limits from then on.
+        """
+        fills, triggered = [], []
+        # Buy stops trigger at or above the stop, sell stops at or below it
+        while self.buy_stops and self.buy_stops[0][0] <= price:
+            self._trigger(heappop(self.buy_stops)[1], fills, triggered)
+        while self.sell_stops and -self.sell_stops[0][0] >= price:
+            self._trigger(heappop(self.sell_stops)[1], fills, triggered)
+        # Buy limits fill at or below the limit, sell limits at or above it
+        while self.buy_limits and -self.buy_limits[0][0] >= price:
+            fills.append(heappop(self.buy_limits)[1])
+            del self.orders[fills[-1]]
+        while self.sell_limits and self.sell_limits[0][0] <= price:
+            fills.append(heappop(self.sell_limits)[1])
+            del self.orders[fills[-1]]
+        return fills, triggered
+
+
+def parse_price(value):
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    if not price.is_finite() or price < CENT or price != price.quantize(CENT):
+        return None
+    return price
+
+
+def fill_order(order_id, stock, price):
+    """
+    Fill one open order at ``price`` through the same settle path as market
+    orders, or reject it if cash or shares fall short. Returns the owner's
+    id, or None if the order was no longer open or was rejected.
+    """
+    with db_transaction.atomic():
+        order = Order.objects.select_for_update().filter(pk=order_id, status='OPEN').first()
+        if order is None:
+            return None
+        try:
+            with db_transaction.atomic():
+                settle(order.user_id, stock, order.side, order.quantity, price)
+        except OrderError as e:
+            Order.objects.filter(pk=order_id).update(status='REJECTED', message=str(e))
+            return None
+        Order.objects.filter(pk=order_id).update(status='FILLED', fill_price=price, filled_at=timezone.now())
+    return order.user_id
+
+
+def _fill_crossed(stock, price, fills, triggered):
+    if triggered:
+        Order.objects.filter(pk__in=triggered, triggered_at__isnull=True).update(triggered_at=timezone.now())
+    users = []
+    for order_id in fills:
+        user_id = fill_order(order_id, stock, price)
+        if user_id is not None:
+            users.append(user_id)
+    return users
+
+
+_OPEN_ORDER_FIELDS = ('id', 'stock_id', 'side', 'order_type', 'limit_price', 'stop_price', 'triggered_at')
+
+
+def _load(books, rows):
+    for order_id, stock_id, side, order_type, limit_price, stop_price, triggered_at in rows:
+        if stock_id not in books:
+            books[stock_id] = OrderBook()
+        books[stock_id].add(order_id, side, order_type, limit_price, stop_price, triggered_at is not None)
+
+
+def load_order_books():
+    """An OrderBook per stock id holding every open order."""
+    books = {}
+    _load(books, Order.objects.filter(status='OPEN').values_list(*_OPEN_ORDER_FIELDS).iterator(chunk_size=5000))
+    return books
+
+
+def _load_placed(books, since):
+    _load(books, Order.objects.filter(status='OPEN', created_at__gte=since).values_list(*_OPEN_ORDER_FIELDS))
+
+
+_books = DeltaSync(load_order_books, _load_placed)
+
+
+def get_order_books():
+    """This process's order books by stock id, brought up to date with orders placed since the last call."""
+    return _books.get()
+
+
+def match_orders(stocks):
+    """
+    Fill the open orders each stock's current_price crosses. Returns the
+    number of orders filled.
+    """
+    with _books.lock:
+        books = _books.sync()
+        # Only taking orders off the books needs the lock; fill_order rechecks each order row
+        crossed = [(stock, books[stock.pk].cross(stock.current_price)) for stock in stocks if stock.pk in books]
+
+    users = []
+    for stock, (fills, triggered) in crossed:
+        users += _fill_crossed(stock, stock.current_price, fills, triggered)
+    if users:
+        update_scores(users)
+    return len(users)
+
+
+def place_order(user, stock, side, order_type, quantity, limit_price=None, stop_price=None):
+    """
+    Validate and store a resting order. It is checked once against a fresh
+    quote, so an order that is already marketable fills straight away;
+    otherwise refresh_prices fills it when a price update crosses it.
+    """
+    side = str(side or '').upper()
+    order_type = str(order_type or '').upper()
+    if side not in SIDES:
+        raise OrderError('side must be BUY or SELL.')
+    if order_type not in ORDER_TYPES:
+        raise OrderError(f'order_type must be one of {", ".join(ORDER_TYPES)}.')
+    quantity = parse_quantity(quantity)
+    if quantity is None:
+        raise OrderError('quantity must be a positive number with at most 4 decimal places.')
+    prices = {}
+    for name, value, needed in (('limit_price', limit_price, order_type != 'STOP'),
+                                ('stop_price', stop_price, order_type != 'LIMIT')):
+        prices[name] = parse_price(value) if needed else None
+        if needed and prices[name] is None:
+            raise OrderError(f'{name} must be a positive price with at most 2 decimal places for {order_type} orders.')
+
+    order = Order.objects.create(user=user, stock=stock, side=side, order_type=order_type, quantity=quantity, **prices)
+
+    latest = get_quote(stock.ticker, fresh=True)
+    if latest is not None:
+        price = Decimal(str(latest)).quantize(CENT)
+        Stock.objects.filter(pk=stock.pk).update(current_price=price, price_updated_at=timezone.now())
+        book = OrderBook()
+        book.add(order.pk, side, order_type, prices['limit_price'], prices['stop_price'])
+        if _fill_crossed(stock, price, *book.cross(price)):
+            update_scores([user.pk])
+        order.refresh_from_db()
+    return order
+
+
+def cancel_order(user, order_id):
+    """Cancel one of ``user``'s open orders. Returns False if it was not open."""
+    return bool(Order.objects.filter(pk=order_id, user=user, status='OPEN').update(status='CANCELLED'))
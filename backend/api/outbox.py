@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+# How long a worker owns the emails it claimed before another may retry them
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+def queue_email(subject, html_body, from_email, to_email):
+    return OutboundEmail.objects.create(subject=subject, html_body=html_body, from_email=from_email, to_email=to_email)
+
+
+def retry_delay(attempts, base=30, cap=3600):
+    """Exponential backoff after the ``attempts``-th failure: 30s, 60s, 120s, ... up to an hour."""
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def claim_pending(batch_size=100, lease=CLAIM_LEASE):
+    """
+    Take up to ``batch_size`` due emails for this worker by pushing their
+    next_attempt_at ``lease`` into the future, so other workers pass over
+    them. Rows are locked (and skipped by other workers where the database
+    supports it) only while they are claimed; a worker that dies mid-batch
+    leaves its emails to be retried once the lease runs out.
+    """
+    with db_transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if emails:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=timezone.now() + lease)
+    return emails
+
+
+def send_pending(batch_size=100, max_attempts=5):
+    """
+    Send up to ``batch_size`` due emails over a single mail connection.
+
+    Emails are claimed and committed before anything is sent, so no
+    transaction or row lock is held across SMTP. A failed send is retried
+    with exponential backoff until ``max_attempts``, after which it is
+    marked FAILED. Returns (sent, failed) counts for the batch.
+    """
+    emails = claim_pending(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        for email in emails:
+            message = EmailMultiAlternatives(email.subject, '', email.from_email, [email.to_email], connection=connection)
+            message.attach_alternative(email.html_body, 'text/html')
+            email.attempts += 1
+            try:
+                # Opening up front keeps the backend from closing the connection after each message
+                connection.open()
+                message.send()
+            except Exception as e:
+                failed += 1
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = 'FAILED'
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                # The connection may be broken; the next send reopens it
+                connection.close()
+            else:
+                sent += 1
+                email.status = 'SENT'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+    finally:
+        connection.close()
+
+    OutboundEmail.objects.bulk_update(emails, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
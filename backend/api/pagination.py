@@ -0,0 +1,64 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pages over (timestamp, id). The cursor is the key of the last
+    row on the previous page, so every page is one index range scan no matter
+    how deep it is, and rows inserted meanwhile never shift a page.
+    """
+
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    page_size = 50
+    max_page_size = 200
+
+    def encode_cursor(self, row):
+        key = f'{row.timestamp.isoformat()}|{row.pk}'
+        return base64.urlsafe_b64encode(key.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(timestamp), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise ValidationError({'error': 'Invalid cursor.'})
+
+    def get_limit(self, request):
+        limit = request.query_params.get(self.limit_query_param)
+        if limit is None:
+            return self.page_size
+        if not limit.isdigit() or not 1 <= int(limit) <= self.max_page_size:
+            raise ValidationError({'error': f'limit must be an integer from 1 to {self.max_page_size}.'})
+        return int(limit)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = self.get_limit(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        queryset = queryset.order_by('-timestamp', '-pk')
+        if cursor:
+            timestamp, pk = self.decode_cursor(cursor)
+            # The redundant timestamp__lte bound lets the database seek into the index instead of scanning to the cursor
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk), timestamp__lte=timestamp)
+
+        # One extra row tells whether there is a next page
+        rows = list(queryset[:limit + 1])
+        self.next_cursor = self.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        self.request = request
+        return rows[:limit]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
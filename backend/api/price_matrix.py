@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+INDEX_FILE = 'index.json'
+
+logger = logging.getLogger(__name__)
+
+
+def forward_fill(matrix):
+    """Forward-fill NaNs down each column of a dates×tickers array, in place."""
+    rows = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    matrix[:] = matrix[rows, np.arange(matrix.shape[1])]
+    return matrix
+
+
+class PriceMatrix:
+    """
+    A read-only calendar days × tickers array of daily closes, memory-mapped
+    from disk so every worker process shares the same pages. Each column is
+    forward-filled from the ticker's first bar; days before it are NaN.
+    """
+
+    def __init__(self, path, index):
+        self.path = Path(path)
+        self.file = index['file']
+        self.start = date.fromisoformat(index['start'])
+        self.tickers = index['tickers']
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.closes = np.load(self.path / self.file, mmap_mode='r')
+        self.end = self.start + timedelta(days=self.closes.shape[0])
+
+    def close(self, ticker, day):
+        """Close of ``ticker`` on ``day`` (the last close before it on non-trading days), or None."""
+        column = self.columns.get(ticker)
+        row = (day - self.start).days
+        if column is None or not 0 <= row < self.closes.shape[0]:
+            return None
+        value = float(self.closes[row, column])
+        return None if value != value else value
+
+    def latest(self, ticker):
+        return self.close(ticker, self.end - timedelta(days=1))
+
+    def range(self, tickers, start, end):
+        """
+        Same result as ``bars.close_matrix(tickers, start, end)``, or None when
+        the matrix does not cover the request and the bar store has to be read.
+        """
+        tickers = [ticker.upper() for ticker in tickers]
+        columns = [self.columns.get(ticker) for ticker in tickers]
+        if end > self.end or None in columns:
+            return None
+        n_days = max((end - start).days, 0)
+        matrix = np.full((n_days, len(tickers)), np.nan)
+        if not n_days or not tickers:
+            return matrix
+
+        # Days before the matrix starts have no bars for any ticker
+        skip = min(max((self.start - start).days, 0), n_days)
+        first = max((start - self.start).days, 0)
+        matrix[skip:] = self.closes[first:first + n_days - skip, columns]
+        # Back-fill the leading gap of tickers whose history starts inside the range
+        forward_fill(matrix[::-1])
+        return matrix
+
+
+def write_price_matrix(closes, start, tickers, path=None):
+    """
+    Publish a new matrix under ``path`` (default ``settings.PRICE_MATRIX_PATH``).
+    The array is written to a new file and the index is swapped in with a
+    rename, so readers move over on their next lookup without a restart.
+    Files older than both this matrix and the one it replaces are removed;
+    processes still mapping one keep their pages until they reload. Files a
+    concurrent builder wrote after either of them are left alone, since its
+    index may be published next or may already be live.
+    """
+    path = Path(path or settings.PRICE_MATRIX_PATH)
+    path.mkdir(parents=True, exist_ok=True)
+    name = f'closes-{time.time_ns()}-{os.getpid()}.npy'
+    np.save(path / name, np.ascontiguousarray(closes, dtype=np.float64))
+
+    try:
+        previous = json.loads((path / INDEX_FILE).read_text())['file']
+    except (OSError, ValueError, KeyError):
+        previous = None
+    index = {'file': name, 'start': start.isoformat(), 'tickers': list(tickers)}
+    tmp = path / f'.{INDEX_FILE}.{os.getpid()}.tmp'
+    tmp.write_text(json.dumps(index))
+    os.replace(tmp, path / INDEX_FILE)
+
+    keep_from = min(_written_at(file) for file in (name, previous) if file)
+    for old in path.glob('closes-*.npy'):
+        if old.name not in (name, previous) and _written_at(old.name) < keep_from:
+            old.unlink(missing_ok=True)
+    return path / name
+
+
+def _written_at(file):
+    # closes-<time_ns>-<pid>.npy; anything else sorts as newest so it is never removed
+    try:
+        return int(file.split('-')[1])
+    except (IndexError, ValueError):
+        return float('inf')
+
+
+_matrix = None
+_matrix_key = None
+_matrix_lock = threading.Lock()
+
+
+def get_price_matrix():
+    """
+    Return the current PriceMatrix, or None if none has been built. The index
+    file is checked on every call and the matrix remapped when it changes.
+    """
+    global _matrix, _matrix_key
+    path = Path(settings.PRICE_MATRIX_PATH)
+    try:
+        stat = (path / INDEX_FILE).stat()
+    except FileNotFoundError:
+        return None
+    key = (str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if key == _matrix_key:
+        return _matrix
+    with _matrix_lock:
+        if key != _matrix_key:
+            try:
+                _matrix = PriceMatrix(path, json.loads((path / INDEX_FILE).read_text()))
+                _matrix_key = key
+            except (OSError, ValueError) as e:
+                # Keep serving the previous matrix; a new index is picked up as soon as one is published
+                logger.warning('Could not load price matrix from %s: %s', path, e)
+                _matrix_key = key
+        return _matrix
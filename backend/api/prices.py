@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .leaderboard import holders, update_scores
+from .market_data import get_quotes
+from .models import Holding, Order, Stock
+from .orders import match_orders
+from .snapshots import refresh_snapshots
+
+
+def held_tickers():
+    return sorted(set(Holding.objects.values_list('ticker__ticker', flat=True)))
+
+
+def watched_tickers():
+    """Held tickers plus those with open orders waiting on a price."""
+    ordered = Order.objects.filter(status='OPEN').values_list('stock__ticker', flat=True).distinct()
+    return sorted(set(held_tickers()) | set(ordered))
+
+
+def refresh_prices(tickers, batch_size=100):
+    """
+    Fetch fresh quotes for ``tickers`` in batched upstream requests and write
+    them to Stock.current_price with one bulk_update per batch, filling the
+    open orders each new price crosses. Leaderboard scores and portfolio
+    snapshots are recomputed for holders of the tickers whose price moved.
+    Returns the number of stocks updated.
+    """
+    tickers = list(tickers)
+    refreshed = []
+    moved = []
+    for i in range(0, len(tickers), batch_size):
+        batch = tickers[i:i + batch_size]
+        quotes = get_quotes(batch, fresh=True)
+        now = timezone.now()
+        stocks = list(Stock.objects.filter(ticker__in=list(quotes)))
+        for stock in stocks:
+            price = Decimal(str(quotes[stock.ticker])).quantize(Decimal('0.01'))
+            if price != stock.current_price:
+                moved.append(stock.ticker)
+            stock.current_price = price
+            stock.price_updated_at = now
+        Stock.objects.bulk_update(stocks, ['current_price', 'price_updated_at'])
+        refreshed += stocks
+    match_orders(refreshed)
+    if moved:
+        users = holders(moved)
+        update_scores(users)
+        refresh_snapshots(users)
+    return len(refreshed)
@@ -0,0 +1,203 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+
+from .models import Stock
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'ticker_index:version'
+
+# Match tiers, best first. Within a tier results are ordered by ticker.
+EXACT, TICKER_PREFIX, NAME_PREFIX, SUBSTRING, FUZZY = range(5)
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one_edit(a, b):
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+    return a[i:] == b[i + 1:]
+
+
+class TickerSearchIndex:
+    """
+    In-memory autocomplete index over (ticker, company name) pairs.
+
+    Tickers live in a prefix trie whose nodes keep the sorted tickers below
+    them, company names are split into a sorted token list for word-prefix
+    lookups, and a trigram index narrows substring matches. Single-edit typos
+    are matched through a symmetric-delete index over tickers and name tokens.
+    """
+
+    def __init__(self, stocks):
+        self.names = {}
+        self.words = {}
+        self.trie = {}
+        token_ids = {}
+        self.trigrams = {}
+        self.typos = {}
+        for ticker, company_name in sorted(stocks):
+            ticker = ticker.upper()
+            name = company_name.upper()
+            self.names[ticker] = name
+
+            node = self.trie
+            for char in ticker:
+                node = node.setdefault(char, {'': []})
+                node[''].append(ticker)
+
+            tokens = set(re.findall(r'[A-Z0-9]+', name))
+            self.words[ticker] = [ticker] + sorted(tokens)
+            for token in tokens:
+                token_ids.setdefault(token, []).append(ticker)
+
+            text = f'{ticker}\0{name}'
+            for i in range(len(text) - 2):
+                self.trigrams.setdefault(text[i:i + 3], set()).add(ticker)
+
+            for word in {ticker} | {token for token in tokens if len(token) >= 4}:
+                for key in _deletes(word) | {word}:
+                    self.typos.setdefault(key, set()).add(ticker)
+
+        self.tokens = sorted(token_ids)
+        self.token_tickers = [token_ids[token] for token in self.tokens]
+
+    def __len__(self):
+        return len(self.names)
+
+    def _ticker_prefix(self, query):
+        node = self.trie
+        for char in query:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node['']
+
+    def _name_prefix(self, query):
+        found = set()
+        i = bisect_left(self.tokens, query)
+        while i < len(self.tokens) and self.tokens[i].startswith(query):
+            found.update(self.token_tickers[i])
+            i += 1
+        return found
+
+    def _substring(self, query):
+        if len(query) < 3:
+            return {ticker for ticker, name in self.names.items() if query in ticker or query in name}
+        candidates = None
+        for i in range(len(query) - 2):
+            ids = self.trigrams.get(query[i:i + 3])
+            if not ids:
+                return set()
+            candidates = set(ids) if candidates is None else candidates & ids
+        return {ticker for ticker in candidates if query in ticker or query in self.names[ticker]}
+
+    def _fuzzy(self, query):
+        if len(query) < 2:
+            return set()
+        found = set()
+        for key in _deletes(query) | {query}:
+            for ticker in self.typos.get(key, ()):
+                if any(_within_one_edit(query, word) for word in self.words[ticker]):
+                    found.add(ticker)
+        return found
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` tickers ranked exact, prefix, substring, then typo matches."""
+        query = query.strip().upper()
+        if not query:
+            return []
+        ranked = {}
+
+        def add(tier, tickers):
+            for ticker in tickers:
+                if ticker not in ranked:
+                    ranked[ticker] = tier
+
+        if query in self.names:
+            add(EXACT, [query])
+        add(TICKER_PREFIX, self._ticker_prefix(query)[:limit])
+        if len(ranked) < limit:
+            add(NAME_PREFIX, self._name_prefix(query))
+        if len(ranked) < limit:
+            add(SUBSTRING, self._substring(query))
+        if len(ranked) < limit:
+            add(FUZZY, self._fuzzy(query))
+        return sorted(ranked, key=lambda ticker: (ranked[ticker], ticker))[:limit]
+
+
+_index = None
+_index_version = None
+_index_built_at = 0.0
+_next_check = 0.0
+_index_lock = threading.Lock()
+
+
+def _version_cache():
+    return caches[settings.QUOTE_CACHE_ALIAS]
+
+
+def _version():
+    stocks = Stock.objects.aggregate(count=Count('pk'), last=Max('pk'))
+    return stocks['count'], stocks['last'], _version_cache().get(VERSION_KEY, 0)
+
+
+def get_ticker_index():
+    """
+    Return the process-wide index. At most every TICKER_INDEX_CHECK_SECONDS
+    it is rebuilt from the Stock table if the row count, the highest id or
+    the generation ``invalidate_ticker_index`` bumps has moved, or if it is
+    older than TICKER_INDEX_MAX_AGE. Lookups in between touch no database.
+    """
+    global _index, _index_version, _index_built_at, _next_check
+    if _index is not None and time.monotonic() < _next_check:
+        return _index
+    with _index_lock:
+        now = time.monotonic()
+        if _index is None or now >= _next_check:
+            version = _version()
+            if _index is None or version != _index_version or now - _index_built_at > settings.TICKER_INDEX_MAX_AGE:
+                _index = TickerSearchIndex(Stock.objects.values_list('ticker', 'company_name'))
+                _index_version, _index_built_at = version, now
+            _next_check = now + settings.TICKER_INDEX_CHECK_SECONDS
+    return _index
+
+
+def invalidate_ticker_index():
+    """
+    Bump the index generation for changes the row count and highest id miss,
+    such as a rename. This process rebuilds on next use, others at their next
+    check if they share the cache, or else once their index reaches
+    TICKER_INDEX_MAX_AGE.
+    """
+    global _next_check
+    cache = _version_cache()
+    cache.add(VERSION_KEY, 0, None)
+    cache.incr(VERSION_KEY)
+    _next_check = 0.0
+
+
+def warm_ticker_index():
+    # Build the index in the background at startup so the first keystroke is fast
+    def build():
+        try:
+            get_ticker_index()
+        except Exception:
+            logger.exception('Could not build ticker search index')
+    threading.Thread(target=build, daemon=True).start()
@@ -2,7 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
-from .models import Stock, Profile, Holding, Transaction, PortfolioHistory
+from django.db import models
+from .models import Stock, Profile, Holding, Transaction, PortfolioHistory, Order
+from .market_data import prefetch_prices
+from .instrumentation import TimedSerializerMixin
 
 class RegisterSerializer(serializers.ModelSerializer):
     username = serializers.CharField(
@@ -43,12 +46,22 @@ class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Stock
         fields = ['ticker', 'company_name', 'current_price']
 
-class HoldingSerializer(serializers.ModelSerializer):
+class HoldingListSerializer(serializers.ListSerializer):
+    # Price every holding in the list with one batched quote lookup instead of
+    # two upstream calls per holding (current_price and total_value).
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        if items and isinstance(items[0], Holding):
+            prefetch_prices(items)
+        return super().to_representation(items)
+
+class HoldingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     ticker = StockSerializer()
     current_price = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
     total_value = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
@@ -56,31 +69,40 @@ class HoldingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Holding
         fields = ['ticker', 'company_name', 'shares_owned', 'average_price', 'current_price', 'total_value']
+        list_serializer_class = HoldingListSerializer
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     stock = StockSerializer()
 
     class Meta:
         model = Transaction
         fields = ['stock', 'transaction_type', 'quantity', 'price_per_share', 'total_amount', 'timestamp']
 
-class ProfileSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    ticker = serializers.CharField(source='stock.ticker')
+
+    class Meta:
+        model = Order
+        fields = ['id', 'ticker', 'side', 'order_type', 'quantity', 'limit_price', 'stop_price', 'status',
+                  'triggered_at', 'fill_price', 'filled_at', 'message', 'created_at']
+
+class ProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ['cash']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     profile = ProfileSerializer()
 
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'profile']
 
-class PortfolioHistorySerializer(serializers.ModelSerializer):
+class PortfolioHistorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = PortfolioHistory
         fields = ['date', 'total_value']
 
-class DashboardSerializer(serializers.Serializer):
+class DashboardSerializer(TimedSerializerMixin, serializers.Serializer):
     portfolio_history = PortfolioHistorySerializer(many=True)
     current_holdings = HoldingSerializer(many=True)
\ No newline at end of file
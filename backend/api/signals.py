@@ -2,7 +2,10 @@ from django.db.models.signals import post_save
 from django.contrib.auth.models import User
 from datetime import date
 from decimal import Decimal
+from django.db import transaction
 from django.dispatch import receiver
+from .analytics import invalidate_analytics
+from .leaderboard import update_scores
 from .models import Profile, PortfolioHistory
 
 @receiver(post_save, sender=User)
@@ -15,7 +18,14 @@ def create_user_profile(sender, instance, created, **kwargs):
             date=date.today(),
             total_value=Decimal('10000.00')
         )
+        transaction.on_commit(lambda: update_scores([instance.pk]), robust=True)
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+
+@receiver(post_save, sender=PortfolioHistory)
+def invalidate_user_analytics(sender, instance, **kwargs):
+    # The write that fired this has committed; a failed bump must not be reported as its failure
+    transaction.on_commit(lambda: invalidate_analytics([instance.user_id]), robust=True)
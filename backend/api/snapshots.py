@@ -0,0 +1,142 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .market_data import prefetch_prices
+from .models import Holding, PortfolioSnapshot, Profile, Stock
+from .price_matrix import get_price_matrix
+
+CENT = Decimal('0.01')
+
+
+def previous_closes(tickers):
+    """Each ticker's last daily close before today from the shared price matrix, without a query."""
+    matrix = get_price_matrix()
+    if matrix is None:
+        return {}
+    yesterday = timezone.localdate() - timedelta(days=1)
+    closes = {ticker: matrix.close(ticker, yesterday) for ticker in tickers}
+    return {ticker: Decimal(str(close)).quantize(CENT) for ticker, close in closes.items() if close is not None}
+
+
+def _position(holding, price, previous):
+    value = (holding.shares_owned * price).quantize(CENT)
+    # Same fields and formatting as HoldingSerializer, so the dashboard can return them as stored
+    return {
+        'ticker': {'ticker': holding.ticker.ticker, 'company_name': holding.ticker.company_name, 'current_price': f'{price:.2f}'},
+        'company_name': holding.company_name,
+        'shares_owned': f'{holding.shares_owned:.4f}',
+        'average_price': f'{holding.average_price:.2f}',
+        'current_price': f'{price:.2f}',
+        'total_value': f'{value:.2f}',
+        'cost_basis': f'{(holding.shares_owned * holding.average_price).quantize(CENT):.2f}',
+        'day_change': f'{(holding.shares_owned * (price - previous)).quantize(CENT):.2f}' if previous is not None else None,
+    }
+
+
+def _valuation(holdings, prices, closes):
+    """Snapshot fields for one user's ``holdings``, priced from ``prices`` by stock id or else at Stock.current_price."""
+    market_value = cost_basis = day_change = Decimal(0)
+    positions = []
+    for holding in holdings:
+        price = prices.get(holding.ticker_id, holding.ticker.current_price)
+        previous = closes.get(holding.ticker.ticker)
+        market_value += holding.shares_owned * price
+        cost_basis += holding.shares_owned * holding.average_price
+        day_change += holding.shares_owned * (price - previous) if previous is not None else 0
+        positions.append(_position(holding, price, previous))
+    return {
+        'market_value': market_value.quantize(CENT),
+        'cost_basis': cost_basis.quantize(CENT),
+        'day_change': day_change.quantize(CENT),
+        'positions': positions,
+    }
+
+
+def _live_prices(holdings):
+    priced = prefetch_prices(holdings)
+    return {holding.ticker_id: Decimal(str(holding.current_price())).quantize(CENT) for holding in priced}
+
+
+def refresh_snapshots(user_ids, live=False, chunk_size=2000):
+    """
+    Rebuild the PortfolioSnapshot of ``user_ids`` from their cash and
+    holdings. Positions are valued at Stock.current_price, or with ``live``
+    through prefetch_prices, which quotes tickers whose stored price is
+    stale before any lock is taken. Each chunk locks its Profile rows for
+    the few queries the rebuild takes, as trades do, so a snapshot is never
+    written from holdings a concurrent trade has already changed, and each
+    snapshot records the analytics version it was built from. Trades call
+    this once they have committed rather than while holding their own
+    locks; if that call fails, the version left behind tells load_snapshot's
+    callers to rebuild. Returns the number of snapshots written.
+    """
+    user_ids = sorted(set(user_ids))
+    written = 0
+    for i in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[i:i + chunk_size]
+        prices = _live_prices(Holding.objects.filter(user_id__in=chunk).select_related('ticker')) if live else {}
+        with db_transaction.atomic(savepoint=False):
+            profiles = {user_id: (cash, version) for user_id, cash, version in Profile.objects.select_for_update().filter(
+                user_id__in=chunk).order_by('user_id').values_list('user_id', 'cash', 'analytics_version')}
+            holdings = {user_id: [] for user_id in profiles}
+            for holding in Holding.objects.filter(user_id__in=chunk).select_related('ticker').order_by('user_id', 'pk'):
+                holdings[holding.user_id].append(holding)
+            closes = previous_closes({holding.ticker.ticker for rows in holdings.values() for holding in rows})
+
+            now = timezone.now()
+            snapshots = [
+                PortfolioSnapshot(user_id=user_id, cash=profiles[user_id][0], analytics_version=profiles[user_id][1],
+                                  updated_at=now, **_valuation(rows, prices, closes))
+                for user_id, rows in holdings.items()
+            ]
+            PortfolioSnapshot.objects.bulk_create(
+                snapshots,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['cash', 'market_value', 'cost_basis', 'day_change', 'positions', 'analytics_version', 'updated_at'],
+            )
+        written += len(snapshots)
+    return written
+
+
+def load_snapshot(user_id):
+    """
+    The user's PortfolioSnapshot, or None, with ``profile_version`` set to
+    their Profile's current analytics version. A snapshot whose own version
+    differs missed a trade and must be rebuilt with refresh_snapshots.
+    """
+    return PortfolioSnapshot.objects.filter(user_id=user_id).annotate(
+        profile_version=F('user__profile__analytics_version')).first()
+
+
+def revalue_snapshot(snapshot):
+    """
+    Reprice the positions stored in ``snapshot`` at live prices, for reads
+    that find it older than PRICE_MAX_AGE. Nothing is locked and holdings
+    are not read: the new values are written only if the row is unchanged
+    since ``snapshot`` was loaded by load_snapshot, and otherwise the newer
+    row a trade wrote meanwhile is returned instead.
+    """
+    stocks = Stock.objects.in_bulk([position['ticker']['ticker'] for position in snapshot.positions], field_name='ticker')
+    holdings = [
+        Holding(
+            user_id=snapshot.user_id,
+            ticker=stocks[position['ticker']['ticker']],
+            company_name=position['company_name'],
+            shares_owned=Decimal(position['shares_owned']),
+            average_price=Decimal(position['average_price']),
+        )
+        for position in snapshot.positions if position['ticker']['ticker'] in stocks
+    ]
+    values = _valuation(holdings, _live_prices(holdings), previous_closes(stocks))
+    now = timezone.now()
+    if not PortfolioSnapshot.objects.filter(pk=snapshot.pk, updated_at=snapshot.updated_at).update(updated_at=now, **values):
+        return load_snapshot(snapshot.user_id)
+    for field, value in values.items():
+        setattr(snapshot, field, value)
+    snapshot.updated_at = now
+    return snapshot
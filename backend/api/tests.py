@@ -1,3 +1,1475 @@
-from django.test import TestCase
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, transaction as db_transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import leaderboard, orders
+from .analytics import analytics_cache, analytics_version, get_analytics, performance, position_pnl
+from .backtest import close_backtest_pool, parameter_grid, rsi, simulate, sma, sweep
+from .bars import close_matrix, sync_bars
+from .delta_sync import DeltaSync
+from .downsample import downsample_series, lttb
+from .history import rebuild_history
+from .instrumentation import Histogram
+from .intraday import RingBuffer, capacity, close_session, read_series, sample
+from .jobs import parse_shard, run_history_job, shard_user_ids
+from .leaderboard import Leaderboard, holders, update_scores
+from .market_data import FakeMarketDataProvider, RecordingProvider, ReplayProvider, TTLCache, get_history, get_provider, get_quotes, history_cache, history_series, history_ttl, info_cache, prefetch_prices, quote_cache
+from .market_hours import is_market_open, last_session_day, next_market_open, session_open
+from .models import Holding, JobCheckpoint, LeaderboardEntry, Order, OutboundEmail, PortfolioHistory, PortfolioSnapshot, PriceBar, Profile, Stock, Transaction
+from .orders import OrderBook, match_orders
+from .outbox import queue_email, send_pending
+from .price_matrix import forward_fill, get_price_matrix, write_price_matrix
+from .prices import refresh_prices, watched_tickers
+from .search import TickerSearchIndex, get_ticker_index, invalidate_ticker_index
+from .snapshots import load_snapshot, refresh_snapshots, revalue_snapshot
+from .trading import OrderError, execute_basket, execute_order, settle
+
+# Tests price from the bars they create, never from a matrix built by a local run
+NO_PRICE_MATRIX = override_settings(PRICE_MATRIX_PATH=str(Path(tempfile.gettempdir()) / 'titan-tests-no-matrix'))
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP unavailable')
+
+
+class ReentrantEmailBackend(EmailBackend):
+    # Another worker polling mid-batch must find nothing left to claim
+    polled = []
+
+    def send_messages(self, messages):
+        ReentrantEmailBackend.polled.append(send_pending())
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def queue(self, count):
+        return [queue_email(f'Subject {i}', f'<p>Body {i}</p>', 'noreply@example.com', f'user{i}@example.com') for i in range(count)]
+
+    def test_send_pending_delivers_queued_emails(self):
+        self.queue(3)
+
+        self.assertEqual(send_pending(batch_size=10), (3, 0))
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['user0@example.com', 'user1@example.com', 'user2@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutboundEmail.objects.exclude(status='SENT').exists())
+        self.assertEqual(send_pending(), (0, 0))
+
+    def test_send_pending_respects_batch_size(self):
+        self.queue(3)
+
+        self.assertEqual(send_pending(batch_size=2), (2, 0))
+        self.assertEqual(send_pending(batch_size=2), (1, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_BACKEND='api.tests.FailingEmailBackend')
+    def test_failed_send_backs_off_then_fails(self):
+        email, = self.queue(1)
+
+        self.assertEqual(send_pending(max_attempts=2), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('PENDING', 1))
+        self.assertIn('SMTP unavailable', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(send_pending(max_attempts=2), (0, 0))
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_pending(max_attempts=2), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('FAILED', 2))
+
+    @override_settings(EMAIL_BACKEND='api.tests.ReentrantEmailBackend')
+    def test_claimed_emails_are_not_sent_twice(self):
+        ReentrantEmailBackend.polled = []
+        self.queue(2)
+
+        self.assertEqual(send_pending(), (2, 0))
+
+        self.assertEqual(ReentrantEmailBackend.polled, [(0, 0), (0, 0)])
+        self.assertEqual(len(mail.outbox), 2)
+
+
+def at_noon(day):
+    return timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+
+
+@NO_PRICE_MATRIX
+class HistoryTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.start = self.today - timedelta(days=9)
+        self.user = User.objects.create_user('history', password='pw')
+        User.objects.filter(pk=self.user.pk).update(date_joined=at_noon(self.start))
+        self.user.refresh_from_db()
+        self.stocks = {ticker: Stock.objects.create(ticker=ticker, company_name=ticker, current_price=price)
+                       for ticker, price in (('HSTA', Decimal('100')), ('HSTB', Decimal('50')), ('HSTC', Decimal('31')))}
+        # HSTA has a gap to carry over, HSTB starts late, HSTC has no bars at all
+        self.bars = {'HSTA': {}, 'HSTB': {}}
+        for offset in range(10):
+            day = self.start + timedelta(days=offset)
+            if offset not in (3, 4):
+                self.bars['HSTA'][day] = Decimal(100 + offset)
+            if offset >= 2:
+                self.bars['HSTB'][day] = Decimal('50') - Decimal('0.75') * offset
+        for ticker, closes in self.bars.items():
+            PriceBar.objects.bulk_create([PriceBar(stock=self.stocks[ticker], date=day, open=close, high=close, low=close, close=close)
+                                          for day, close in closes.items()])
+
+    def trade(self, offset, ticker, side, quantity, price):
+        quantity, price = Decimal(quantity), Decimal(price)
+        tx = Transaction.objects.create(user=self.user, stock=self.stocks[ticker], transaction_type=side, quantity=quantity,
+                                        price_per_share=price, total_amount=quantity * price)
+        Transaction.objects.filter(pk=tx.pk).update(timestamp=at_noon(self.start + timedelta(days=offset)))
+
+    def close(self, ticker, day):
+        closes = self.bars.get(ticker)
+        if not closes:
+            return self.stocks[ticker].current_price
+        known = [close for bar_day, close in sorted(closes.items()) if bar_day <= day]
+        return known[-1] if known else closes[min(closes)]
+
+    def replay(self):
+        """Value every day by walking the ledger forward from the opening cash."""
+        ledger = list(Transaction.objects.filter(user=self.user).select_related('stock'))
+        values = {}
+        for offset in range(10):
+            day = self.start + timedelta(days=offset)
+            cash, shares = Decimal('10000'), {}
+            for tx in ledger:
+                if timezone.localdate(tx.timestamp) <= day:
+                    sign = 1 if tx.transaction_type == 'BUY' else -1
+                    cash -= sign * tx.total_amount
+                    shares[tx.stock.ticker] = shares.get(tx.stock.ticker, 0) + sign * tx.quantity
+            values[day] = (cash + sum(quantity * self.close(ticker, day) for ticker, quantity in shares.items())).quantize(Decimal('0.01'))
+        return values
+
+    def test_rebuild_matches_brute_force_replay(self):
+        self.trade(1, 'HSTA', 'BUY', '10', '101')
+        self.trade(2, 'HSTB', 'BUY', '4', '48')
+        self.trade(5, 'HSTA', 'SELL', '3', '105')
+        self.trade(5, 'HSTC', 'BUY', '2.5', '30')
+        self.trade(8, 'HSTB', 'SELL', '4', '47.5')
+        Profile.objects.filter(user=self.user).update(cash=Decimal('9228'))
+        Holding.objects.create(user=self.user, ticker=self.stocks['HSTA'], company_name='HSTA', shares_owned=Decimal('7'), average_price=Decimal('101'))
+        Holding.objects.create(user=self.user, ticker=self.stocks['HSTC'], company_name='HSTC', shares_owned=Decimal('2.5'), average_price=Decimal('30'))
+
+        self.assertEqual(rebuild_history([self.user], replace=True), 10)
+
+        history = dict(PortfolioHistory.objects.filter(user=self.user).values_list('date', 'total_value'))
+        self.assertEqual(history, self.replay())
+
+    def test_replace_rewrites_existing_rows(self):
+        PortfolioHistory.objects.create(user=self.user, date=self.start, total_value=Decimal('1'))
+
+        rebuild_history([self.user])
+        self.assertEqual(PortfolioHistory.objects.get(user=self.user, date=self.start).total_value, Decimal('1'))
+        rebuild_history([self.user], replace=True)
+        self.assertEqual(PortfolioHistory.objects.get(user=self.user, date=self.start).total_value, Decimal('10000'))
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = TTLCache('test', ttl=60)
+        self.calls = []
+
+    def loader(self, values):
+        def load(keys):
+            self.calls.append(sorted(keys))
+            return {key: values.get(key) for key in keys}
+        return load
+
+    def test_misses_load_once_then_hit_each_tier(self):
+        load = self.loader({'A': 1, 'B': 2})
+
+        self.assertEqual(self.cache.get_many_or_fetch(['A', 'B', 'A'], load), {'A': 1, 'B': 2})
+        self.assertEqual(self.cache.get_many_or_fetch(['A', 'B'], load), {'A': 1, 'B': 2})
+        # Another process sees the values through the shared backend
+        other = TTLCache('test', ttl=60)
+        self.assertEqual(other.get_many_or_fetch(['A'], load), {'A': 1})
+
+        self.assertEqual(self.calls, [['A', 'B']])
+        self.assertEqual((self.cache.hits_local, self.cache.misses), (2, 2))
+        self.assertEqual(other.hits_shared, 1)
+
+    def test_missing_values_are_not_cached(self):
+        load = self.loader({'A': 1})
+
+        self.assertEqual(self.cache.get_many_or_fetch(['A', 'NONE'], load), {'A': 1})
+        self.assertEqual(self.cache.get_many_or_fetch(['A', 'NONE'], load), {'A': 1})
+
+        self.assertEqual(self.calls, [['A', 'NONE'], ['NONE']])
+
+    def test_fresh_bypasses_the_cache_and_refreshes_it(self):
+        self.cache.set('A', 1)
+
+        self.assertEqual(self.cache.get_or_fetch('A', lambda: 2, fresh=True), 2)
+        self.assertEqual(self.cache.get_or_fetch('A', lambda: 3), 2)
+        self.assertEqual(self.cache.bypasses, 1)
+
+    def test_concurrent_misses_share_one_load(self):
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            release.wait(5)
+            return 42
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(self.cache.get_or_fetch, 'A', load) for _ in range(8)]
+            while self.cache.coalesced < 7:
+                time.sleep(0.001)
+            release.set()
+            self.assertEqual([future.result() for future in futures], [42] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_fresh_callers_do_not_wait_on_cached_lookups(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return 'cached'
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            cached = pool.submit(self.cache.get_or_fetch, 'A', slow)
+            while not self.cache.misses:
+                time.sleep(0.001)
+            # The fresh lookup goes upstream itself while the cached one is still loading
+            self.assertEqual(self.cache.get_or_fetch('A', lambda: 'fresh', fresh=True), 'fresh')
+            release.set()
+            self.assertEqual(cached.result(), 'cached')
+
+    def test_loader_errors_reach_every_waiter(self):
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ConnectionError('upstream down')
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(self.cache.get_or_fetch, 'A', fail) for _ in range(3)]
+            while self.cache.coalesced < 2:
+                time.sleep(0.001)
+            release.set()
+            for future in futures:
+                with self.assertRaises(ConnectionError):
+                    future.result()
+        self.assertEqual(self.cache.get_or_fetch('A', lambda: 1), 1)
+
+
+def clear_market_data_caches():
+    for cache in (quote_cache, info_cache, history_cache):
+        cache.clear()
+        cache.shared.clear()
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class QuoteBatchingTests(TestCase):
+    def setUp(self):
+        clear_market_data_caches()
+        self.provider = get_provider()
+
+    def test_fake_provider_is_deterministic(self):
+        other = FakeMarketDataProvider()
+
+        self.assertEqual(self.provider.get_quotes(['FAKEA', 'FAKEB']), other.get_quotes(['FAKEA', 'FAKEB']))
+        self.assertTrue(self.provider.get_history('FAKEA', '1mo').equals(other.get_history('FAKEA', '1mo')))
+
+    def test_quotes_for_many_tickers_take_one_upstream_call(self):
+        calls = self.provider.calls
+
+        quotes = get_quotes(['qa', 'QB', 'QC', 'QB'])
+
+        self.assertEqual(sorted(quotes), ['QA', 'QB', 'QC'])
+        self.assertEqual(self.provider.calls - calls, 1)
+        self.assertEqual(get_quotes(['QA', 'QC']), {'QA': quotes['QA'], 'QC': quotes['QC']})
+        self.assertEqual(self.provider.calls - calls, 1)
+
+    def test_dashboard_prices_every_holding_with_one_upstream_call(self):
+        user = User.objects.create_user('batched', password='pw')
+        for i in range(5):
+            stock = Stock.objects.create(ticker=f'DSH{i}', company_name=f'Dash {i}', current_price=Decimal('1'))
+            Holding.objects.create(user=user, ticker=stock, company_name=stock.company_name, shares_owned=Decimal('2'), average_price=Decimal('1'))
+        client = APIClient()
+        client.force_authenticate(user)
+        calls = self.provider.calls
+
+        response = client.get('/api/dashboard/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.provider.calls - calls, 1)
+        quotes = get_quotes([f'DSH{i}' for i in range(5)])
+        self.assertEqual({row['ticker']['ticker']: Decimal(row['current_price']) for row in response.data['current_holdings']},
+                         {ticker: Decimal(str(price)).quantize(Decimal('0.01')) for ticker, price in quotes.items()})
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class BarStoreTests(TestCase):
+    def setUp(self):
+        self.since = timezone.localdate() - timedelta(days=20)
+        self.stocks = [Stock.objects.create(ticker=ticker, company_name=ticker, current_price=Decimal('1')) for ticker in ('BARA', 'BARB')]
+        self.provider = get_provider()
+
+    def sync(self):
+        return sync_bars(['bara', 'BARB'], since=self.since, rebuild_matrix=False)
+
+    def test_sync_stores_upstream_bars(self):
+        expected = self.provider.get_bars(['BARA', 'BARB'], self.since, date.today() + timedelta(days=1))
+
+        written = self.sync()
+
+        self.assertEqual(written, sum(len(frame) for frame in expected.values()))
+        stored = dict(PriceBar.objects.filter(stock=self.stocks[0]).values_list('date', 'close'))
+        self.assertEqual(sorted(stored), list(expected['BARA'].index))
+        self.assertEqual(stored[max(stored)], Decimal(str(round(expected['BARA']['Close'].iloc[-1], 4))))
+
+    def test_resync_writes_only_new_or_changed_bars(self):
+        self.sync()
+        calls = self.provider.calls
+        self.assertEqual(self.sync(), 0)
+        # Both tickers start from the same last bar, so they share one request
+        self.assertEqual(self.provider.calls - calls, 1)
+
+        # A moved last bar of one ticker and three missing bars of the other
+        last = PriceBar.objects.filter(stock=self.stocks[0]).order_by('-date').first()
+        PriceBar.objects.filter(pk=last.pk).update(close=Decimal('0.0001'))
+        dropped = PriceBar.objects.filter(stock=self.stocks[1]).order_by('-date').values_list('pk', flat=True)[:3]
+        PriceBar.objects.filter(pk__in=list(dropped)).delete()
+
+        self.assertEqual(self.sync(), 4)
+        self.assertEqual(PriceBar.objects.get(pk=last.pk).close, last.close)
+
+    def test_close_matrix_fills_gaps(self):
+        start = date(2024, 1, 1)
+        for offset, close in ((1, '10'), (4, '12')):
+            PriceBar.objects.create(stock=self.stocks[0], date=start + timedelta(days=offset), open=1, high=1, low=1, close=Decimal(close))
+
+        matrix = close_matrix(['bara', 'BARB'], start, start + timedelta(days=6))
+
+        self.assertEqual(matrix[:, 0].tolist(), [10, 10, 10, 10, 12, 12])
+        self.assertTrue(np.isnan(matrix[:, 1]).all())
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class HistoryJobTests(TestCase):
+    def setUp(self):
+        self.user_ids = [User.objects.create_user(f'job{i}', password='pw').pk for i in range(7)]
+        self.seen = []
+
+    def record(self, user_ids):
+        self.seen.append(list(user_ids))
+        return len(user_ids)
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        for value in ('4/4', '-1/2', '1', 'a/b', '0/0'):
+            with self.assertRaises(CommandError):
+                parse_shard(value)
+
+    def test_shards_split_users_without_overlap(self):
+        shards = [shard_user_ids(index, 3) for index in range(3)]
+
+        self.assertEqual(sorted(sum(shards, [])), self.user_ids)
+        for index, user_ids in enumerate(shards):
+            self.assertTrue(all(user_id % 3 == index for user_id in user_ids))
+
+    def test_job_runs_every_user_in_chunks_and_finishes(self):
+        written = run_history_job('test', self.record, chunk_size=3)
+
+        self.assertEqual(written, 7)
+        self.assertEqual(self.seen, [self.user_ids[:3], self.user_ids[3:6], self.user_ids[6:]])
+        checkpoint = JobCheckpoint.objects.get(name='test:0/1')
+        self.assertEqual((checkpoint.finished, checkpoint.last_user_id), (True, self.user_ids[-1]))
+
+    def test_interrupted_job_resumes_after_the_last_finished_chunk(self):
+        def fail_second_chunk(user_ids):
+            if self.seen:
+                raise RuntimeError('worker died')
+            return self.record(user_ids)
+
+        with self.assertRaises(RuntimeError):
+            run_history_job('test', fail_second_chunk, chunk_size=3)
+        checkpoint = JobCheckpoint.objects.get(name='test:0/1')
+        self.assertEqual((checkpoint.finished, checkpoint.last_user_id), (False, self.user_ids[2]))
+
+        self.seen = []
+        self.assertEqual(run_history_job('test', self.record, chunk_size=3), 4)
+        self.assertEqual(sum(self.seen, []), self.user_ids[3:])
+
+        # A finished job starts over on its next run
+        self.seen = []
+        self.assertEqual(run_history_job('test', self.record, chunk_size=3), 7)
+
+
+class TickerSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.index = TickerSearchIndex([
+            ('AAPL', 'Apple Inc.'),
+            ('AA', 'Alcoa Corp'),
+            ('AAL', 'American Airlines Group'),
+            ('PAA', 'Plains All American Pipeline'),
+            ('MSFT', 'Microsoft Corp'),
+            ('APLE', 'Apple Hospitality REIT'),
+        ])
+
+    def test_exact_then_ticker_prefix_then_substring(self):
+        self.assertEqual(self.index.search('aa'), ['AA', 'AAL', 'AAPL', 'PAA'])
+
+    def test_ticker_prefix_ranks_above_name_prefix_and_typos(self):
+        self.assertEqual(self.index.search('AP'), ['APLE', 'AAPL', 'AA'])
+        self.assertEqual(self.index.search('apple'), ['AAPL', 'APLE'])
+
+    def test_substring_and_typo_matches(self):
+        self.assertEqual(self.index.search('ERICAN'), ['AAL', 'PAA'])
+        self.assertEqual(self.index.search('micrsoft'), ['MSFT'])
+        self.assertEqual(self.index.search('zzzz'), [])
+
+    def test_limit(self):
+        self.assertEqual(self.index.search('a', limit=2), ['AA', 'AAL'])
+
+
+class TickerIndexTests(TestCase):
+    def setUp(self):
+        Stock.objects.create(ticker='AAPL', company_name='Apple Inc.', current_price=Decimal('1'))
+        invalidate_ticker_index()
+
+    def test_lookups_between_checks_touch_no_database(self):
+        index = get_ticker_index()
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_ticker_index(), index)
+
+    def test_invalidate_rebuilds_on_next_use(self):
+        get_ticker_index()
+        Stock.objects.filter(ticker='AAPL').update(company_name='Pear Inc.')
+
+        invalidate_ticker_index()
+
+        self.assertEqual(get_ticker_index().search('pear'), ['AAPL'])
+
+    @override_settings(TICKER_INDEX_CHECK_SECONDS=0)
+    def test_new_stocks_are_picked_up_at_the_next_check(self):
+        get_ticker_index()
+        Stock.objects.create(ticker='MSFT', company_name='Microsoft Corp', current_price=Decimal('1'))
+
+        self.assertEqual(get_ticker_index().search('MSFT'), ['MSFT'])
+
+    def test_suggestions_view(self):
+        client = APIClient()
+
+        response = client.get('/api/tickers/', {'query': 'apple'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([stock['ticker'] for stock in response.data], ['AAPL'])
+        self.assertEqual(client.get('/api/tickers/').status_code, 400)
+
+
+class DownsampleTests(SimpleTestCase):
+    def test_lttb_keeps_endpoints_and_length(self):
+        y = [float(i % 17) for i in range(1000)]
+        y[500] = 1000.0
+
+        indices = lttb(y, 100)
+
+        self.assertEqual(len(indices), 100)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertTrue((indices[1:] > indices[:-1]).all())
+        self.assertIn(500, indices)
+
+    def test_short_series_is_returned_whole(self):
+        self.assertEqual(lttb([1.0, 2.0, 3.0], 10).tolist(), [0, 1, 2])
+
+    def test_downsample_series_keeps_columns_aligned(self):
+        series = {'date': [f'd{i}' for i in range(300)], 'close': [None if i % 50 == 7 else float(i) for i in range(300)]}
+
+        reduced = downsample_series(series, 30)
+
+        self.assertEqual(len(reduced['date']), 30)
+        self.assertEqual((reduced['date'][0], reduced['date'][-1]), ('d0', 'd299'))
+        self.assertEqual([series['close'][int(day[1:])] for day in reduced['date']], reduced['close'])
+
+
+@override_settings(MARKET_TIME_ZONE='America/New_York', MARKET_HOLIDAYS=['2026-10-19'], HISTORY_CACHE_TTL=60)
+class MarketHoursTests(SimpleTestCase):
+    def at(self, *args):
+        return datetime(*args, tzinfo=ZoneInfo('America/New_York'))
+
+    def test_history_is_short_lived_only_while_the_market_is_open(self):
+        self.assertTrue(is_market_open(self.at(2026, 10, 16, 10)))
+        self.assertEqual(history_ttl(self.at(2026, 10, 16, 10)), 60)
+
+        # Friday's close is cached through the weekend and Monday's holiday
+        self.assertFalse(is_market_open(self.at(2026, 10, 16, 16)))
+        self.assertEqual(history_ttl(self.at(2026, 10, 16, 16)), (3 * 24 + 17.5) * 3600)
+
+    def test_sessions_skip_weekends_and_holidays(self):
+        self.assertEqual(next_market_open(self.at(2026, 10, 16, 9)), self.at(2026, 10, 16, 9, 30))
+        self.assertEqual(next_market_open(self.at(2026, 10, 16, 9, 30)), self.at(2026, 10, 20, 9, 30))
+        self.assertEqual(last_session_day(self.at(2026, 10, 20, 9)), date(2026, 10, 16))
+        self.assertEqual(last_session_day(self.at(2026, 10, 20, 9, 30)), date(2026, 10, 20))
+
+
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class HistoryCacheTests(SimpleTestCase):
+    def setUp(self):
+        clear_market_data_caches()
+
+    def test_history_is_fetched_once_per_ticker_and_period(self):
+        provider = get_provider()
+        calls = provider.calls
+
+        series = get_history('aapl', '1y')
+
+        self.assertIs(get_history('AAPL', '1y'), series)
+        self.assertEqual(provider.calls - calls, 1)
+        self.assertEqual(set(series), {'dates', 'open', 'high', 'low', 'close', 'volume'})
+        self.assertEqual(len(series['dates']), len(series['close']))
+        get_history('AAPL', '5y')
+        self.assertEqual(provider.calls - calls, 2)
+
+
+# The summary queries from an executor thread, which only sees committed rows
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class StockSummaryTests(TransactionTestCase):
+    def setUp(self):
+        clear_market_data_caches()
+        self.user = User.objects.create_user('summary', password='pw')
+        stock = Stock.objects.create(ticker='AAPL', company_name='Apple Inc.', current_price=Decimal('1'))
+        Holding.objects.create(user=self.user, ticker=stock, company_name=stock.company_name, shares_owned=Decimal('3'), average_price=Decimal('1'))
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_summary_prices_from_the_latest_bar_without_a_quote(self):
+        provider = get_provider()
+        calls = provider.calls
+
+        response = self.client.get('/api/search/aapl/', {'period': '1y'}, **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['stockDetails']['currentPrice'], data['historicalData']['close'][-1])
+        self.assertEqual(Decimal(str(data['currentHoldings'])), Decimal('3'))
+        self.assertEqual(provider.calls - calls, 2)
+
+    def test_points_downsamples_the_history(self):
+        response = self.client.get('/api/search/AAPL/', {'period': '5y', 'points': '50'}, **self.auth)
+
+        history = response.json()['historicalData']
+        self.assertEqual(len(history['dates']), 50)
+        self.assertEqual(len(history['close']), 50)
+        self.assertEqual(self.client.get('/api/search/AAPL/', {'points': '2'}, **self.auth).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/AAPL/', {'period': '2d'}, **self.auth).status_code, 400)
+
+    def test_anonymous_and_bad_tokens(self):
+        self.assertEqual(self.client.get('/api/search/AAPL/').json()['currentHoldings'], 0)
+        self.assertEqual(self.client.get('/api/search/AAPL/', HTTP_AUTHORIZATION='Bearer nope').status_code, 401)
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class RefreshPricesTests(TestCase):
+    def setUp(self):
+        clear_market_data_caches()
+        self.provider = get_provider()
+        self.user = User.objects.create_user('refresher', password='pw')
+        stocks = {ticker: Stock.objects.create(ticker=ticker, company_name=ticker, current_price=Decimal('0')) for ticker in ('AAA', 'BBB', 'CCC', 'DDD', 'EEE')}
+        for ticker in ('AAA', 'BBB', 'CCC'):
+            Holding.objects.create(user=self.user, ticker=stocks[ticker], company_name=ticker, shares_owned=Decimal('1'), average_price=Decimal('1'))
+        Order.objects.create(user=self.user, stock=stocks['DDD'], side='BUY', order_type='LIMIT', quantity=Decimal('1'), limit_price=Decimal('0.01'))
+
+    def test_only_held_and_ordered_tickers_are_watched(self):
+        self.assertEqual(watched_tickers(), ['AAA', 'BBB', 'CCC', 'DDD'])
+
+    def test_prices_are_fetched_in_batches_and_stored(self):
+        calls = self.provider.calls
+
+        self.assertEqual(refresh_prices(watched_tickers(), batch_size=3), 4)
+
+        self.assertEqual(self.provider.calls - calls, 2)
+        quotes = FakeMarketDataProvider().get_quotes(['AAA', 'DDD', 'EEE'])
+        stocks = Stock.objects.in_bulk(field_name='ticker')
+        self.assertEqual(stocks['AAA'].current_price, Decimal(str(quotes['AAA'])))
+        self.assertEqual(stocks['DDD'].current_price, Decimal(str(quotes['DDD'])))
+        self.assertIsNotNone(stocks['AAA'].price_updated_at)
+        self.assertEqual((stocks['EEE'].current_price, stocks['EEE'].price_updated_at), (Decimal('0'), None))
+
+    def test_reads_trust_fresh_stored_prices(self):
+        refresh_prices(watched_tickers())
+        calls = self.provider.calls
+
+        holdings = prefetch_prices(Holding.objects.select_related('ticker'))
+
+        self.assertEqual(self.provider.calls, calls)
+        self.assertEqual([holding.current_price() for holding in holdings], [float(holding.ticker.current_price) for holding in holdings])
+
+    def test_command_runs_one_cycle(self):
+        out = StringIO()
+
+        call_command('refresh_prices', '--once', stdout=out)
+
+        self.assertIn('Refreshed 4/4 prices', out.getvalue())
+        self.assertEqual(Stock.objects.filter(price_updated_at__isnull=False).count(), 4)
+
+
+class ImportStocksTests(TestCase):
+    def import_csv(self, rows, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'tickers.csv'
+            path.write_text('ticker,name\n' + ''.join(f'{ticker},{name}\n' for ticker, name in rows))
+            out = StringIO()
+            call_command('import_stocks', str(path), *args, stdout=out)
+        return out.getvalue()
+
+    def test_reimport_upserts_names_and_keeps_prices(self):
+        self.import_csv([('aapl', 'Apple Inc.'), ('MSFT', 'Microsoft Corp'), ('', 'No ticker')])
+        Stock.objects.filter(ticker='AAPL').update(current_price=Decimal('187.50'))
+
+        with self.assertNumQueries(4):
+            out = self.import_csv([('AAPL', 'Apple'), ('MSFT', 'Microsoft Corp'), ('GOOG', 'Alphabet Inc.')], '--chunk-size', '10')
+
+        self.assertIn('1 stocks added, 1 updated, 1 unchanged', out)
+        apple = Stock.objects.get(ticker='AAPL')
+        self.assertEqual((apple.company_name, apple.current_price), ('Apple', Decimal('187.50')))
+        self.assertEqual(Stock.objects.get(ticker='GOOG').current_price, Decimal('0'))
+
+    def test_changes_rebuild_the_search_index(self):
+        self.import_csv([('AAPL', 'Apple Inc.')])
+        self.assertEqual(get_ticker_index().search('pear'), [])
+
+        self.import_csv([('AAPL', 'Pear Inc.')])
+
+        self.assertEqual(get_ticker_index().search('pear'), ['AAPL'])
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            call_command('import_stocks', '/nonexistent/tickers.csv')
+
+
+class HistogramTests(SimpleTestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram('titan_test', 'Test.', (1, 5))
+        for value in (0.5, 1, 3, 7):
+            histogram.observe(('a',), value)
+
+        self.assertEqual(histogram.render(('view',)), [
+            '# HELP titan_test Test.',
+            '# TYPE titan_test histogram',
+            'titan_test_bucket{view="a",le="1"} 2',
+            'titan_test_bucket{view="a",le="5"} 3',
+            'titan_test_bucket{view="a",le="+Inf"} 4',
+            'titan_test_sum{view="a"} 11.500000',
+            'titan_test_count{view="a"} 4',
+        ])
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        clear_market_data_caches()
+        self.user = User.objects.create_user('timed', password='pw')
+        stock = Stock.objects.create(ticker='TMD', company_name='Timed', current_price=Decimal('1'))
+        Holding.objects.create(user=self.user, ticker=stock, company_name=stock.company_name, shares_owned=Decimal('1'), average_price=Decimal('1'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def timing(self, response):
+        return dict(re.match(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) \w+")?', part.strip()).group(1, 3) for part in response['Server-Timing'].split(','))
+
+    def test_server_timing_counts_queries_and_upstream_calls(self):
+        calls = get_provider().calls
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/dashboard/')
+
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'db', 'upstream', 'serialize', 'render', 'app', 'total'})
+        self.assertEqual(int(timing['db']), len(queries))
+        self.assertEqual(int(timing['upstream']), get_provider().calls - calls)
+
+    def test_metrics_aggregate_requests_by_view(self):
+        self.client.get('/api/dashboard/')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('titan_request_duration_seconds_count{view="dashboard",method="GET",status="200"}', response.content.decode())
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+
+class RecordReplayTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.recorder = RecordingProvider(provider='api.market_data.FakeMarketDataProvider', path=self.path)
+        self.replay = ReplayProvider(path=self.path)
+
+    def test_replay_serves_what_was_recorded(self):
+        quotes = self.recorder.get_quotes(['AAA', 'BBB'])
+        info = self.recorder.get_info('AAA')
+        history = self.recorder.get_history('AAA', '1mo')
+        start, end = date.today() - timedelta(days=20), date.today()
+        bars = self.recorder.get_bars(['AAA'], start, end)
+
+        self.assertEqual(self.replay.get_quotes(['AAA', 'BBB', 'CCC']), quotes)
+        self.assertEqual(self.replay.get_info('AAA'), info)
+        self.assertEqual(history_series(self.replay.get_history('AAA', '1mo')), history_series(history))
+        replayed = self.replay.get_bars(['AAA'], start, end)['AAA']
+        self.assertEqual(list(replayed.index), list(bars['AAA'].index))
+        self.assertEqual(replayed['Close'].tolist(), bars['AAA']['Close'].tolist())
+
+    def test_later_bar_recordings_merge_with_earlier_ones(self):
+        today = date.today()
+        self.recorder.get_bars(['AAA'], today - timedelta(days=20), today - timedelta(days=10))
+        self.recorder.get_bars(['AAA'], today - timedelta(days=12), today)
+
+        replayed = self.replay.get_bars(['AAA'], today - timedelta(days=20), today)['AAA']
+
+        expected = FakeMarketDataProvider().get_bars(['AAA'], today - timedelta(days=20), today)['AAA']
+        self.assertEqual(list(replayed.index), list(expected.index))
+
+    def test_unrecorded_data_looks_unknown(self):
+        self.assertEqual(self.replay.get_quotes(['AAA']), {})
+        self.assertEqual(self.replay.get_info('AAA'), {})
+        self.assertTrue(self.replay.get_history('AAA', '1y').empty)
+        self.assertEqual(self.replay.get_bars(['AAA'], date.today() - timedelta(days=5), date.today()), {})
+
+
+class PriceMatrixTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name)
+        settings_override = override_settings(PRICE_MATRIX_PATH=str(self.path))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.start = date(2024, 1, 1)
+        closes = np.array([[10, np.nan], [np.nan, np.nan], [11, 20], [np.nan, 21]])
+        write_price_matrix(forward_fill(closes), self.start, ['AAA', 'BBB'])
+
+    def test_forward_fill(self):
+        filled = forward_fill(np.array([[np.nan, 1.0], [1.0, np.nan], [np.nan, np.nan], [2.0, 3.0]]))
+
+        self.assertTrue(np.isnan(filled[0, 0]))
+        self.assertEqual(filled[1:].tolist(), [[1, 1], [1, 1], [2, 3]])
+
+    def test_lookups(self):
+        matrix = get_price_matrix()
+
+        self.assertEqual(matrix.close('AAA', date(2024, 1, 2)), 10)
+        self.assertIsNone(matrix.close('BBB', date(2024, 1, 2)))
+        self.assertIsNone(matrix.close('CCC', date(2024, 1, 2)))
+        self.assertIsNone(matrix.close('AAA', date(2024, 1, 5)))
+        self.assertEqual((matrix.latest('AAA'), matrix.latest('BBB')), (11, 21))
+
+    def test_range_back_fills_and_defers_what_it_does_not_cover(self):
+        matrix = get_price_matrix()
+
+        self.assertEqual(matrix.range(['aaa', 'BBB'], date(2023, 12, 30), date(2024, 1, 4)).tolist(), [[10, 20], [10, 20], [10, 20], [10, 20], [11, 20]])
+        self.assertIsNone(matrix.range(['AAA'], self.start, date(2024, 1, 6)))
+        self.assertIsNone(matrix.range(['CCC'], self.start, date(2024, 1, 3)))
+
+    def test_readers_reload_new_matrices_and_old_files_are_removed(self):
+        first = get_price_matrix()
+        for close in (12, 13):
+            write_price_matrix(np.array([[close]]), self.start, ['CCC'])
+
+        matrix = get_price_matrix()
+
+        self.assertIsNot(matrix, first)
+        self.assertEqual(matrix.latest('CCC'), 13)
+        self.assertEqual(len(list(self.path.glob('closes-*.npy'))), 2)
+
+
+class PerformanceTests(SimpleTestCase):
+    def test_returns_and_drawdown(self):
+        dates = ['d0', 'd1', 'd2', 'd3']
+
+        stats = performance(dates, [100, 110, 99, 121], periods_per_year=3)
+
+        self.assertAlmostEqual(stats['total_return'], 0.21)
+        self.assertAlmostEqual(stats['annualized_return'], 0.21)
+        self.assertAlmostEqual(stats['max_drawdown'], -0.1)
+        self.assertEqual((stats['max_drawdown_peak'], stats['max_drawdown_trough']), ('d1', 'd2'))
+        self.assertEqual([row['return'] for row in stats['daily_returns']], [0.1, -0.1, 0.222222])
+
+    def test_too_short_series(self):
+        self.assertIsNone(performance(['d0'], [100])['total_return'])
+
+    def test_position_pnl(self):
+        holding = Holding(ticker=Stock(ticker='AAA'), shares_owned=Decimal('5'), average_price=Decimal('10'))
+        holding._prefetched_price = 20.0
+        ledger = [('AAA', 'BUY', 10.0, 100.0), ('AAA', 'SELL', 5.0, 75.0), ('BBB', 'BUY', 1.0, 30.0), ('BBB', 'SELL', 1.0, 20.0)]
+
+        positions = {position['ticker']: position for position in position_pnl(ledger, [holding])}
+
+        self.assertEqual(
+            {key: positions['AAA'][key] for key in ('market_value', 'cost_basis', 'unrealized_pnl', 'realized_pnl', 'total_pnl')},
+            {'market_value': 100, 'cost_basis': 50, 'unrealized_pnl': 50, 'realized_pnl': 25, 'total_pnl': 75},
+        )
+        self.assertEqual((positions['BBB']['shares_owned'], positions['BBB']['realized_pnl']), (0, -10))
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        analytics_cache.clear()
+        analytics_cache.shared.clear()
+        self.user = User.objects.create_user('analyst', password='pw')
+        self.stock = Stock.objects.create(ticker='ANL', company_name='Analytics', current_price=Decimal('10'), price_updated_at=timezone.now())
+
+    def test_results_are_cached_until_a_trade_bumps_the_version(self):
+        first = get_analytics(self.user)
+
+        with self.assertNumQueries(1):
+            self.assertIs(get_analytics(self.user), first)
+
+        with db_transaction.atomic():
+            settle(self.user.pk, self.stock, 'BUY', Decimal('2'), Decimal('10'))
+
+        self.assertEqual([position['ticker'] for position in get_analytics(self.user)['positions']], ['ANL'])
+
+    def test_history_writes_bump_the_version(self):
+        version = analytics_version(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PortfolioHistory.objects.create(user=self.user, date=date.today() - timedelta(days=1), total_value=Decimal('9000'))
+
+        self.assertEqual(analytics_version(self.user.pk), version + 1)
+
+    def test_endpoint(self):
+        PortfolioHistory.objects.create(user=self.user, date=date.today() - timedelta(days=1), total_value=Decimal('8000'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/analytics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.data['total_return'], 0.25)
+        self.assertEqual(response.data['start_date'], (date.today() - timedelta(days=1)).isoformat())
+        self.assertEqual(APIClient().get('/api/analytics/').status_code, 401)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ledger', password='pw')
+        self.stock = Stock.objects.create(ticker='PAGE', company_name='Page', current_price=Decimal('1'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+
+    def add(self, quantity, timestamp):
+        tx = Transaction.objects.create(user=self.user, stock=self.stock, transaction_type='BUY', quantity=quantity,
+                                        price_per_share=Decimal('1'), total_amount=Decimal(quantity))
+        Transaction.objects.filter(pk=tx.pk).update(timestamp=timestamp)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [Decimal(row['quantity']) for row in response.data['results']], response.data['next']
+
+    def test_pages_stay_stable_across_inserts(self):
+        # Rows 3 to 5 share a timestamp, so ties are broken by id
+        for quantity, minutes in ((1, 50), (2, 40), (3, 30), (4, 30), (5, 30), (6, 20), (7, 10)):
+            self.add(quantity, self.now - timedelta(minutes=minutes))
+
+        seen, url = [], '/api/transactions/?limit=2'
+        while url:
+            rows, url = self.page(url)
+            seen += rows
+            # Newer rows land before the cursor and must not shift later pages
+            self.add(100 + len(seen), timezone.now())
+
+        self.assertEqual(seen, [7, 6, 5, 4, 3, 2, 1])
+
+    def test_invalid_cursor_and_limit_are_rejected(self):
+        self.assertEqual(self.client.get('/api/transactions/?cursor=not-a-cursor').status_code, 400)
+        self.assertEqual(self.client.get('/api/transactions/?limit=0').status_code, 400)
+
+    def test_only_the_users_own_rows_are_listed(self):
+        other = User.objects.create_user('other-ledger', password='pw')
+        Transaction.objects.create(user=other, stock=self.stock, transaction_type='BUY', quantity=Decimal('9'),
+                                   price_per_share=Decimal('1'), total_amount=Decimal('9'))
+        self.add(1, self.now)
+
+        self.assertEqual(self.page('/api/transactions/'), ([1], None))
+
+
+class LeaderboardTests(SimpleTestCase):
+    def setUp(self):
+        self.board = Leaderboard()
+        self.board.apply([(1, Decimal('12000'), 0.2), (2, Decimal('9000'), -0.1), (3, Decimal('12000'), 0.25), (4, Decimal('10000'), 0.0)])
+
+    def test_ranks_share_ties(self):
+        self.assertEqual([self.board.rank('value', user_id) for user_id in (1, 2, 3, 4)], [1, 4, 1, 3])
+        self.assertEqual([self.board.rank('return', user_id) for user_id in (1, 2, 3, 4)], [2, 4, 1, 3])
+        self.assertIsNone(self.board.rank('value', 5))
+
+    def test_pages(self):
+        self.assertEqual(self.board.page('value', 1, 2), [(1, 3, 12000.0, 0.25), (3, 4, 10000.0, 0.0)])
+        self.assertEqual(self.board.page('return', 3, 10), [(4, 2, 9000.0, -0.1)])
+
+    def test_moving_a_user(self):
+        self.board.apply([(2, Decimal('15000'), 0.5)])
+
+        self.assertEqual(len(self.board), 4)
+        self.assertEqual(self.board.page('value', 0, 2), [(1, 2, 15000.0, 0.5), (2, 1, 12000.0, 0.2)])
+        self.assertEqual(self.board.rank('value', 4), 4)
+
+
+class LeaderboardEndpointTests(TestCase):
+    def setUp(self):
+        # A fresh process-local board, so entries from other tests never leak in
+        patcher = mock.patch.object(leaderboard, '_board', DeltaSync(leaderboard._build_board, leaderboard._board.refresh))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stock = Stock.objects.create(ticker='LDR', company_name='Leader', current_price=Decimal('50'))
+        self.users = [User.objects.create_user(f'leader{i}', password='pw') for i in range(3)]
+        for shares, user in zip((0, 20, 10), self.users):
+            if shares:
+                Holding.objects.create(user=user, ticker=self.stock, company_name='Leader', shares_owned=shares, average_price=Decimal('50'))
+        update_scores([user.pk for user in self.users])
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_scores_value_holdings_at_the_stored_price(self):
+        entry = LeaderboardEntry.objects.get(user=self.users[1])
+
+        self.assertEqual(entry.portfolio_value, Decimal('11000'))
+        self.assertAlmostEqual(entry.return_pct, 0.1)
+
+    def test_pages_and_own_rank(self):
+        response = self.client.get('/api/leaderboard/', {'by': 'return', 'offset': 1, 'limit': 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([(row['rank'], row['username']) for row in response.data['results']], [(2, 'leader2')])
+        self.assertEqual(response.data['me']['rank'], 3)
+
+    def test_later_score_changes_reach_the_board(self):
+        self.client.get('/api/leaderboard/')
+        Stock.objects.filter(pk=self.stock.pk).update(current_price=Decimal('1000'))
+        update_scores(holders(['LDR']))
+
+        response = self.client.get('/api/leaderboard/', {'limit': 1})
+
+        self.assertEqual(response.data['results'][0]['username'], 'leader1')
+        self.assertEqual(response.data['results'][0]['portfolio_value'], 30000.0)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/leaderboard/', {'by': 'cash'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/leaderboard/', {'limit': 101}).status_code, 400)
+
+
+class BacktestSimulationTests(SimpleTestCase):
+    def test_sma(self):
+        averages = sma(np.array([[1.0], [2.0], [3.0], [4.0]]), 2)
+
+        self.assertTrue(np.isnan(averages[0, 0]))
+        self.assertEqual(averages[1:, 0].tolist(), [1.5, 2.5, 3.5])
+
+    def test_rsi_is_bounded(self):
+        closes = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, (200, 2)), axis=0)
+
+        values = rsi(closes, 14)[14:]
+
+        self.assertTrue(((values >= 0) & (values <= 100)).all())
+        self.assertEqual(rsi(np.arange(1.0, 40.0)[:, None], 14)[-1, 0], 100)
+
+    def test_simulate_trades_like_the_order_views(self):
+        closes = np.array([[10.0], [20.0], [30.0]])
+
+        cash, shares, trades = simulate(closes, np.array([[True], [True], [False]]), initial_cash=10000, position_size=0.1)
+
+        self.assertEqual(cash.tolist(), [9000, 9000, 12000])
+        self.assertEqual(shares[:, 0].tolist(), [100, 100, 0])
+        self.assertEqual([trade[2:] for trade in trades], [('BUY', 100, 10, 1000), ('SELL', 100, 30, 3000)])
+
+    def test_parameter_grid(self):
+        grid = parameter_grid('sma_cross', {'fast': [5, 10], 'slow': 30})
+
+        self.assertEqual(grid, [
+            {'fast': 5, 'slow': 30, 'position_size': 0.1},
+            {'fast': 10, 'slow': 30, 'position_size': 0.1},
+        ])
+        for params in ({'window': 5}, {'fast': []}, {'fast': 0}, {'fast': 2.5}, {'fast': True}):
+            with self.assertRaises(ValueError):
+                parameter_grid('sma_cross', params)
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class BacktestSweepTests(TestCase):
+    def setUp(self):
+        for ticker in ('BTA', 'BTB'):
+            Stock.objects.create(ticker=ticker, company_name=ticker, current_price=Decimal('1'))
+        sync_bars(['BTA', 'BTB'], since=timezone.localdate() - timedelta(days=300), rebuild_matrix=False)
+        self.start, self.end = timezone.localdate() - timedelta(days=200), timezone.localdate()
+
+    @override_settings(BACKTEST_PARALLEL_MIN_RUNS=2)
+    def test_pooled_sweep_matches_in_process_sweep(self):
+        self.addCleanup(close_backtest_pool)
+        params = {'fast': [5, 10], 'slow': [20, 30]}
+
+        serial = sweep(['BTA', 'BTB'], self.start, self.end, 'sma_cross', params, workers=1)
+        with self.assertNoLogs('api.backtest'):
+            pooled = sweep(['BTA', 'BTB'], self.start, self.end, 'sma_cross', params, workers=2)
+
+        self.assertEqual(pooled, serial)
+        self.assertEqual(len(serial), 4)
+        returns = [result['total_return'] for result in serial]
+        self.assertEqual(returns, sorted(returns, reverse=True))
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('backtester', password='pw'))
+        request = {'tickers': ['bta'], 'start': self.start.isoformat(), 'end': self.end.isoformat(), 'strategy': 'rsi'}
+
+        response = client.post('/api/backtest/', request, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['runs'], 1)
+        result = response.data['results'][0]
+        self.assertEqual(result['trade_count'], len(result['trades']))
+        self.assertEqual(result['equity'][-1]['value'], result['final_value'])
+        self.assertEqual(client.post('/api/backtest/', {**request, 'tickers': ['NOPE']}, format='json').status_code, 400)
+        self.assertEqual(client.post('/api/backtest/', {**request, 'strategy': 'macd'}, format='json').status_code, 400)
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class BasketTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('basket', password='pw')
+        self.first = Stock.objects.create(ticker='BSKA', company_name='Basket A', current_price=Decimal('1'))
+        self.second = Stock.objects.create(ticker='BSKB', company_name='Basket B', current_price=Decimal('1'))
+
+    def assertUnchanged(self):
+        self.assertEqual(Profile.objects.get(user=self.user).cash, Decimal('10000'))
+        self.assertFalse(Holding.objects.filter(user=self.user).exists())
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_basket_fills_every_leg(self):
+        result = execute_basket(self.user, [
+            {'ticker': 'bska', 'side': 'buy', 'quantity': '2'},
+            {'ticker': 'BSKA', 'side': 'SELL', 'quantity': '0.5'},
+            {'ticker': 'BSKB', 'side': 'BUY', 'quantity': '1'},
+        ])
+
+        self.assertEqual([(fill['ticker'], fill['side'], fill['quantity']) for fill in result['fills']],
+                         [('BSKA', 'BUY', Decimal('2')), ('BSKA', 'SELL', Decimal('0.5')), ('BSKB', 'BUY', Decimal('1'))])
+        spent = sum((fill['total_amount'] if fill['side'] == 'BUY' else -fill['total_amount']) for fill in result['fills'])
+        self.assertEqual(result['cash_remaining'], (Decimal('10000') - spent).quantize(Decimal('0.01')))
+        self.assertEqual(Profile.objects.get(user=self.user).cash, result['cash_remaining'])
+        self.assertEqual(dict(Holding.objects.filter(user=self.user).values_list('ticker__ticker', 'shares_owned')),
+                         {'BSKA': Decimal('1.5'), 'BSKB': Decimal('1')})
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+
+    def test_uncovered_sell_rolls_back_every_leg(self):
+        with self.assertRaises(OrderError):
+            execute_basket(self.user, [
+                {'ticker': 'BSKA', 'side': 'BUY', 'quantity': '1'},
+                {'ticker': 'BSKB', 'side': 'SELL', 'quantity': '1'},
+            ])
+        self.assertUnchanged()
+
+    def test_unaffordable_basket_rolls_back_every_leg(self):
+        with self.assertRaises(OrderError):
+            execute_basket(self.user, [
+                {'ticker': 'BSKA', 'side': 'BUY', 'quantity': '1'},
+                {'ticker': 'BSKB', 'side': 'BUY', 'quantity': '1000000'},
+            ])
+        self.assertUnchanged()
+
+    def test_unknown_ticker_is_rejected(self):
+        with self.assertRaisesMessage(OrderError, 'NOPE'):
+            execute_basket(self.user, [{'ticker': 'BSKA', 'side': 'BUY', 'quantity': '1'}, {'ticker': 'NOPE', 'side': 'BUY', 'quantity': '1'}])
+        self.assertUnchanged()
+
+    def test_one_upstream_call_prices_the_whole_basket(self):
+        clear_market_data_caches()
+        calls = get_provider().calls
+
+        execute_basket(self.user, [{'ticker': 'BSKA', 'side': 'BUY', 'quantity': '1'}, {'ticker': 'BSKB', 'side': 'BUY', 'quantity': '1'}])
+
+        self.assertEqual(get_provider().calls - calls, 1)
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post('/api/orders/batch/', {'orders': [{'ticker': 'BSKA', 'side': 'BUY', 'quantity': '1'}]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['fills']), 1)
+        response = client.post('/api/orders/batch/', {'orders': [{'ticker': 'BSKA', 'side': 'HOLD', 'quantity': '1'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@NO_PRICE_MATRIX
+class SettleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('settler', password='pw')
+        self.stock = Stock.objects.create(ticker='STL', company_name='Settle', current_price=Decimal('10'))
+
+    def settle(self, side, quantity, price):
+        with db_transaction.atomic():
+            settle(self.user.pk, self.stock, side, Decimal(quantity), Decimal(price))
+
+    def position(self):
+        cash = Profile.objects.get(user=self.user).cash
+        holding = Holding.objects.filter(user=self.user, ticker=self.stock).values_list('shares_owned', 'average_price').first()
+        return cash, holding
+
+    def test_buys_average_and_sells_close_the_position(self):
+        self.settle('BUY', '2', '10')
+        self.settle('BUY', '2', '20')
+        self.assertEqual(self.position(), (Decimal('9940'), (Decimal('4'), Decimal('15'))))
+
+        self.settle('SELL', '4', '25')
+
+        self.assertEqual(self.position(), (Decimal('10040'), None))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+
+    def test_short_fills_roll_back(self):
+        self.settle('BUY', '1', '10')
+
+        with self.assertRaisesMessage(OrderError, 'Insufficient shares'):
+            self.settle('SELL', '2', '10')
+        with self.assertRaisesMessage(OrderError, 'Insufficient balance'):
+            self.settle('BUY', '1000', '10')
+
+        self.assertEqual(self.position(), (Decimal('9990'), (Decimal('1'), Decimal('10'))))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+
+# Orders from worker threads must commit for the others to see them
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class ConcurrentOrderTests(TransactionTestCase):
+    def test_concurrent_orders_keep_cash_and_shares_in_step_with_the_ledger(self):
+        user = User.objects.create_user('contended', password='pw')
+        stock = Stock.objects.create(ticker='CON', company_name='Contended', current_price=Decimal('1'))
+        Holding.objects.create(user=user, ticker=stock, company_name='Contended', shares_owned=Decimal('5'), average_price=Decimal('1'))
+
+        def place(side):
+            try:
+                while True:
+                    try:
+                        execute_order(user, stock, side, Decimal('1'))
+                        return
+                    except OrderError:
+                        return
+                    except OperationalError:
+                        # SQLite fails instead of waiting on a locked table
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(place, ['BUY', 'SELL'] * 20))
+
+        ledger = Transaction.objects.filter(user=user)
+        flows = dict(ledger.values('transaction_type').annotate(total=Sum('total_amount')).values_list('transaction_type', 'total'))
+        moved = dict(ledger.values('transaction_type').annotate(total=Sum('quantity')).values_list('transaction_type', 'total'))
+        self.assertEqual(Profile.objects.get(user=user).cash, Decimal('10000') - flows.get('BUY', 0) + flows.get('SELL', 0))
+        held = Holding.objects.filter(user=user, ticker=stock).values_list('shares_owned', flat=True).first() or 0
+        self.assertEqual(held, 5 + moved.get('BUY', 0) - moved.get('SELL', 0))
+        self.assertGreater(ledger.count(), 20)
+
+
+class OrderBookTests(SimpleTestCase):
+    def test_cross_triggers_and_fills_in_price_order(self):
+        book = OrderBook()
+        book.add(1, 'BUY', 'LIMIT', Decimal('10'), None)
+        book.add(2, 'BUY', 'LIMIT', Decimal('9'), None)
+        book.add(3, 'SELL', 'LIMIT', Decimal('12'), None)
+        book.add(4, 'BUY', 'STOP', None, Decimal('15'))
+        book.add(5, 'SELL', 'STOP_LIMIT', Decimal('7'), Decimal('8'))
+
+        self.assertEqual(book.cross(Decimal('11')), ([], []))
+        self.assertEqual(book.cross(Decimal('9.5')), ([1], []))
+        # The stop-limit triggers, then rests as a limit the same price already crosses
+        self.assertEqual(book.cross(Decimal('8')), ([2, 5], [5]))
+        self.assertEqual(book.cross(Decimal('15')), ([4, 3], []))
+        self.assertEqual(len(book), 0)
+
+    def test_triggered_stop_limit_waits_for_its_limit(self):
+        book = OrderBook()
+        book.add(1, 'BUY', 'STOP_LIMIT', Decimal('21'), Decimal('20'))
+
+        self.assertEqual(book.cross(Decimal('22')), ([], [1]))
+        self.assertEqual(book.cross(Decimal('21.5')), ([], []))
+        self.assertEqual(book.cross(Decimal('21')), ([1], []))
+
+
+@NO_PRICE_MATRIX
+class MatchOrdersTests(TestCase):
+    def setUp(self):
+        # A fresh process-local book, so orders from other tests never leak in
+        patcher = mock.patch.object(orders, '_books', DeltaSync(orders.load_order_books, orders._load_placed))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('orders', password='pw')
+        self.stock = Stock.objects.create(ticker='ORDA', company_name='Order A', current_price=Decimal('100'))
+        Holding.objects.create(user=self.user, ticker=self.stock, company_name='Order A', shares_owned=Decimal('1'), average_price=Decimal('100'))
+
+    def order(self, side, order_type, quantity, limit_price=None, stop_price=None):
+        return Order.objects.create(user=self.user, stock=self.stock, side=side, order_type=order_type,
+                                    quantity=Decimal(quantity), limit_price=limit_price, stop_price=stop_price)
+
+    def move(self, price):
+        Stock.objects.filter(pk=self.stock.pk).update(current_price=price)
+        self.stock.refresh_from_db()
+        return match_orders([self.stock])
+
+    def test_orders_fill_when_the_price_crosses_them(self):
+        buy = self.order('BUY', 'LIMIT', '2', limit_price=Decimal('95'))
+        stop = self.order('SELL', 'STOP', '1', stop_price=Decimal('90'))
+        resting = self.order('BUY', 'LIMIT', '1', limit_price=Decimal('80'))
+
+        self.assertEqual(self.move(Decimal('100')), 0)
+        self.assertEqual(self.move(Decimal('94')), 1)
+        buy.refresh_from_db()
+        self.assertEqual((buy.status, buy.fill_price), ('FILLED', Decimal('94')))
+        self.assertEqual(Profile.objects.get(user=self.user).cash, Decimal('10000') - 2 * Decimal('94'))
+
+        self.assertEqual(self.move(Decimal('89')), 1)
+        stop.refresh_from_db()
+        self.assertEqual((stop.status, stop.fill_price), ('FILLED', Decimal('89')))
+        self.assertEqual(Holding.objects.get(user=self.user).shares_owned, Decimal('2'))
+        self.assertEqual(Order.objects.get(pk=resting.pk).status, 'OPEN')
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_cancelled_and_unaffordable_orders_do_not_fill(self):
+        cancelled = self.order('BUY', 'LIMIT', '1', limit_price=Decimal('99'))
+        too_big = self.order('BUY', 'LIMIT', '1000', limit_price=Decimal('99'))
+        self.assertEqual(self.move(Decimal('100')), 0)
+        Order.objects.filter(pk=cancelled.pk).update(status='CANCELLED')
+
+        self.assertEqual(self.move(Decimal('98')), 0)
+
+        self.assertEqual(Order.objects.get(pk=cancelled.pk).status, 'CANCELLED')
+        too_big.refresh_from_db()
+        self.assertEqual(too_big.status, 'REJECTED')
+        self.assertTrue(too_big.message)
+        self.assertEqual(Profile.objects.get(user=self.user).cash, Decimal('10000'))
+
+    def test_orders_placed_after_the_book_loads_are_picked_up(self):
+        self.assertEqual(self.move(Decimal('100')), 0)
+        self.order('BUY', 'LIMIT', '1', limit_price=Decimal('99'))
+
+        self.assertEqual(self.move(Decimal('99')), 1)
+
+
+class DeltaSyncTests(SimpleTestCase):
+    def test_refreshes_from_the_last_sync_and_rebuilds_periodically(self):
+        calls = []
+        sync = DeltaSync(lambda: calls.append('build') or [], lambda value, since: calls.append(since), full_sync_seconds=60)
+
+        sync.get()
+        sync.get()
+        synced_at = sync._synced_at
+        sync.get()
+
+        self.assertEqual(calls[0], 'build')
+        self.assertEqual(calls[2], synced_at - sync.overlap)
+        sync._full_sync_at -= 61
+        sync.get()
+        self.assertEqual(calls[-1], 'build')
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('snapshot', password='pw')
+        self.stock = Stock.objects.create(ticker='SNP', company_name='Snap', current_price=Decimal('12'), price_updated_at=timezone.now())
+        Holding.objects.create(user=self.user, ticker=self.stock, company_name='Snap', shares_owned=Decimal('10'), average_price=Decimal('10'))
+
+    def test_refresh_values_holdings_and_records_the_version(self):
+        Profile.objects.filter(user=self.user).update(analytics_version=7)
+
+        self.assertEqual(refresh_snapshots([self.user.pk]), 1)
+
+        snapshot = load_snapshot(self.user.pk)
+        self.assertEqual((snapshot.cash, snapshot.market_value, snapshot.cost_basis), (Decimal('10000'), Decimal('120'), Decimal('100')))
+        self.assertEqual((snapshot.analytics_version, snapshot.profile_version), (7, 7))
+        self.assertEqual(snapshot.positions[0]['total_value'], '120.00')
+
+    def test_revalue_keeps_a_row_written_since_it_was_loaded(self):
+        refresh_snapshots([self.user.pk])
+        loaded = load_snapshot(self.user.pk)
+        Holding.objects.filter(user=self.user).update(shares_owned=Decimal('20'))
+        refresh_snapshots([self.user.pk])
+
+        snapshot = revalue_snapshot(loaded)
+
+        self.assertEqual(snapshot.market_value, Decimal('240'))
+        self.assertEqual(PortfolioSnapshot.objects.get(user=self.user).market_value, Decimal('240'))
+
+    def test_revalue_reprices_stored_positions(self):
+        refresh_snapshots([self.user.pk])
+        Stock.objects.filter(pk=self.stock.pk).update(current_price=Decimal('15'))
+
+        snapshot = revalue_snapshot(load_snapshot(self.user.pk))
+
+        self.assertEqual(snapshot.market_value, Decimal('150'))
+        self.assertEqual(PortfolioSnapshot.objects.get(user=self.user).market_value, Decimal('150'))
+
+    def test_dashboard_rebuilds_a_snapshot_that_missed_a_trade(self):
+        refresh_snapshots([self.user.pk])
+        # Hooks never run inside a TestCase, just as when a trade's deferred rebuild fails
+        with db_transaction.atomic():
+            settle(self.user.pk, self.stock, 'BUY', Decimal('5'), Decimal('12'))
+        self.assertEqual(PortfolioSnapshot.objects.get(user=self.user).market_value, Decimal('120'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/dashboard/')
+
+        self.assertEqual(response.data['market_value'], Decimal('180'))
+        self.assertEqual(response.data['cash'], Decimal('9940'))
+        snapshot = load_snapshot(self.user.pk)
+        self.assertEqual(snapshot.analytics_version, snapshot.profile_version)
+
+
+@NO_PRICE_MATRIX
+@override_settings(MARKET_DATA_PROVIDER='api.market_data.FakeMarketDataProvider', MARKET_DATA_PROVIDER_OPTIONS={})
+class DashboardHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('dashboard', password='pw')
+        PortfolioHistory.objects.bulk_create([
+            PortfolioHistory(user=self.user, date=date(2024, 1, 1) + timedelta(days=i), total_value=Decimal(10000 + i)) for i in range(21)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def dates(self, **params):
+        response = self.client.get('/api/dashboard/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['date'] for row in response.data['portfolio_history']]
+
+    def test_range_resolution_and_since(self):
+        self.assertEqual(self.dates(**{'from': '2024-01-19', 'to': '2024-01-21'}), ['2024-01-19', '2024-01-20', '2024-01-21'])
+        self.assertEqual(self.dates(**{'from': '2024-01-01', 'to': '2024-01-21', 'resolution': 'weekly'}), ['2024-01-07', '2024-01-14', '2024-01-21'])
+        self.assertEqual(self.dates(**{'to': '2024-01-21', 'since': '2024-01-20'}), ['2024-01-21'])
+
+    def test_invalid_parameters(self):
+        for params in ({'from': '01/02/2024'}, {'from': '2024-01-05', 'to': '2024-01-01'}, {'resolution': 'hourly'}):
+            self.assertEqual(self.client.get('/api/dashboard/', params).status_code, 400)
+
+    def test_etag_changes_only_when_the_dashboard_does(self):
+        etag = self.client.get('/api/dashboard/')['ETag']
+
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get('/api/dashboard/', {'resolution': 'weekly'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PortfolioHistory.objects.create(user=self.user, date=date(2023, 12, 31), total_value=Decimal('10000'))
+        response = self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        refresh_snapshots([self.user.pk])
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class RingBufferTests(SimpleTestCase):
+    def test_appends_past_capacity_overwrite_the_oldest(self):
+        buffer = RingBuffer(2, 3)
+        for timestamp, values in ((1, [1, np.nan]), (2, [2, 20]), (3, [3, np.nan]), (4, [4, np.nan])):
+            buffer.append(timestamp, values)
+
+        self.assertEqual([series.tolist() for series in buffer.series(0)], [[2, 3, 4], [2, 3, 4]])
+        self.assertEqual([series.tolist() for series in buffer.series(1)], [[2], [20]])
+        self.assertEqual(buffer.latest().tolist(), [4, 20])
+
+    def test_bytes_roundtrip(self):
+        buffer = RingBuffer(2, 3)
+        buffer.append(1, [1, 2])
+
+        restored = RingBuffer.from_bytes(buffer.to_bytes())
+
+        self.assertEqual((restored.size, restored.start, restored.count), (3, 0, 1))
+        self.assertEqual(restored.latest().tolist(), [1, 2])
+        self.assertTrue(np.isnan(RingBuffer(1, 2).latest()).all())
+
+    def test_capacity_covers_the_session(self):
+        self.assertEqual(capacity(300), 79)
+
+
+@NO_PRICE_MATRIX
+@override_settings(INTRADAY_CACHE_ALIAS='default')
+class IntradayTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.day = last_session_day()
+        self.users = [User.objects.create_user(f'intraday{i}', password='pw') for i in range(2)]
+        stock = Stock.objects.create(ticker='INT', company_name='Intraday', current_price=Decimal('10'))
+        Holding.objects.create(user=self.users[0], ticker=stock, company_name='Intraday', shares_owned=Decimal('5'), average_price=Decimal('10'))
+        refresh_snapshots([user.pk for user in self.users])
+        # An idle account with no positions is left out of the session
+        PortfolioSnapshot.objects.filter(user=self.users[1]).update(updated_at=session_open(self.day) - timedelta(days=1))
+
+    def test_samples_are_read_back_per_user(self):
+        now = session_open(self.day) + timedelta(hours=1)
+        self.assertEqual(sample(now), 1)
+        PortfolioSnapshot.objects.filter(user=self.users[0]).update(market_value=Decimal('60'))
+        sample(now + timedelta(minutes=5))
+
+        series = read_series(self.users[0].pk, self.day)
+
+        self.assertEqual([value for _, value in series], [10050, 10060])
+        self.assertEqual(series[1][0] - series[0][0], timedelta(minutes=5))
+        self.assertEqual(read_series(self.users[1].pk, self.day), [])
+
+    def test_close_rolls_the_last_sample_into_history_once(self):
+        self.assertIsNone(close_session(self.day))
+        sample()
+        PortfolioSnapshot.objects.filter(user=self.users[0]).update(market_value=Decimal('70'))
+
+        self.assertEqual(close_session(self.day), 1)
+
+        self.assertEqual(PortfolioHistory.objects.get(user=self.users[0], date=self.day).total_value, Decimal('10070'))
+        self.assertIsNone(close_session(self.day))
+
+    def test_endpoint(self):
+        sample()
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+
+        response = client.get('/api/portfolio/intraday/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['date'], self.day)
+        self.assertEqual([point['value'] for point in response.data['points']], [10050])
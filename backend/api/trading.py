@@ -0,0 +1,203 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .leaderboard import update_scores
+from .market_data import get_quote, get_quotes
+from .models import Holding, Profile, Stock, Transaction
+from .snapshots import refresh_snapshots
+
+SIDES = ('BUY', 'SELL')
+MAX_BASKET_ORDERS = 100
+CENT = Decimal('0.01')
+SHARE = Decimal('0.0001')
+
+
+class OrderError(Exception):
+    """An order that cannot be filled; the message is safe to show the user."""
+
+
+def parse_quantity(value):
+    try:
+        quantity = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    if not quantity.is_finite() or quantity < SHARE or quantity != quantity.quantize(SHARE):
+        return None
+    return quantity
+
+
+def settle(user_id, stock, side, quantity, price):
+    """
+    Move cash and shares for one fill, record its Transaction and rebuild
+    the user's PortfolioSnapshot once it commits. Must run inside a
+    transaction; raises OrderError, leaving the caller to roll back, when
+    cash or shares fall short.
+
+    Cash and shares change only through conditional UPDATEs with F()
+    expressions, so concurrent fills on one account can neither overdraw it
+    nor lose an update, and rows stay locked just until the caller commits.
+    The Profile row is always written first so concurrent fills lock rows in
+    the same order, and that write also bumps the user's analytics version.
+    """
+    amount = quantity * price
+    profiles = Profile.objects.filter(user_id=user_id)
+    holding = Holding.objects.filter(user_id=user_id, ticker=stock)
+    if side == 'BUY':
+        if not profiles.filter(cash__gte=amount).update(cash=F('cash') - amount, analytics_version=F('analytics_version') + 1):
+            raise OrderError('Insufficient balance.')
+        # An empty row first, so the update below both creates and adds to a position
+        Holding.objects.bulk_create(
+            [Holding(user_id=user_id, ticker=stock, company_name=stock.company_name, shares_owned=0, average_price=price)],
+            ignore_conflicts=True,
+        )
+        # SET expressions all read the pre-update row
+        holding.update(
+            average_price=(F('shares_owned') * F('average_price') + amount) / (F('shares_owned') + quantity),
+            shares_owned=F('shares_owned') + quantity,
+        )
+    else:
+        profiles.update(cash=F('cash') + amount, analytics_version=F('analytics_version') + 1)
+        if not holding.filter(shares_owned__gte=quantity).update(shares_owned=F('shares_owned') - quantity):
+            raise OrderError('Insufficient shares to sell.')
+        holding.filter(shares_owned=0).delete()
+
+    Transaction.objects.create(user_id=user_id, stock=stock, transaction_type=side, quantity=quantity,
+                               price_per_share=price, total_amount=amount)
+    # Rebuilt once the trade commits, so its Profile lock is not held across the rebuild
+    db_transaction.on_commit(lambda: refresh_snapshots([user_id]), robust=True)
+
+
+def execute_order(user, stock, side, quantity):
+    """
+    Fill a market order for ``user`` and return the cash left afterwards. The
+    quote is fetched before the transaction opens, so no lock is held across
+    the upstream call.
+    """
+    latest = get_quote(stock.ticker, fresh=True)
+    if latest is None:
+        raise OrderError(f"Could not fetch latest price for ticker {stock.ticker}")
+    price = Decimal(str(latest)).quantize(CENT)
+    Stock.objects.filter(pk=stock.pk).update(current_price=price, price_updated_at=timezone.now())
+    stock.current_price = price
+
+    with db_transaction.atomic():
+        settle(user.pk, stock, side, quantity, price)
+        cash = Profile.objects.filter(user=user).values_list('cash', flat=True).get()
+        # The order stands even if its leaderboard refresh fails
+        db_transaction.on_commit(lambda: update_scores([user.pk]), robust=True)
+    return cash
+
+
+def parse_orders(orders):
+    """Validate a basket given as [{'ticker', 'side', 'quantity'}] and normalize it."""
+    if not isinstance(orders, list) or not 1 <= len(orders) <= MAX_BASKET_ORDERS:
+        raise OrderError(f'orders must be a list of 1 to {MAX_BASKET_ORDERS} orders.')
+    parsed = []
+    for i, order in enumerate(orders):
+        if not isinstance(order, dict):
+            raise OrderError(f'Order {i} must be an object.')
+        ticker = str(order.get('ticker') or '').strip().upper()
+        side = str(order.get('side') or '').upper()
+        quantity = parse_quantity(order.get('quantity'))
+        if not ticker:
+            raise OrderError(f'Order {i} needs a ticker.')
+        if side not in SIDES:
+            raise OrderError(f'Order {i} side must be BUY or SELL.')
+        if quantity is None:
+            raise OrderError(f'Order {i} quantity must be a positive number with at most 4 decimal places.')
+        parsed.append((ticker, side, quantity))
+    return parsed
+
+
+def execute_basket(user, orders):
+    """
+    Fill a basket of market orders for ``user`` as one unit. Quotes for every
+    ticker come from one batched upstream call made before any lock is taken.
+    The basket is checked up front against the locked cash and holdings: every
+    sell must be covered by shares held at that point in the basket, and the
+    cash left after all legs must not be negative. Either every leg is written
+    (with bulk writes for Holding and Transaction) or none is. Returns the
+    fills and the remaining cash.
+    """
+    orders = parse_orders(orders)
+    tickers = list(dict.fromkeys(ticker for ticker, _, _ in orders))
+    stocks = Stock.objects.in_bulk(tickers, field_name='ticker')
+    unknown = [ticker for ticker in tickers if ticker not in stocks]
+    if unknown:
+        raise OrderError(f'Unknown ticker(s): {", ".join(unknown)}.')
+
+    quotes = get_quotes(tickers, fresh=True)
+    missing = [ticker for ticker in tickers if ticker not in quotes]
+    if missing:
+        raise OrderError(f'Could not fetch latest price for: {", ".join(missing)}.')
+    prices = {ticker: Decimal(str(quotes[ticker])).quantize(CENT) for ticker in tickers}
+
+    now = timezone.now()
+    for ticker, stock in stocks.items():
+        stock.current_price = prices[ticker]
+        stock.price_updated_at = now
+    # An upsert compiles far faster than bulk_update's CASE expression per row
+    Stock.objects.bulk_create(list(stocks.values()), update_conflicts=True, unique_fields=['ticker'],
+                              update_fields=['current_price', 'price_updated_at'])
+
+    with db_transaction.atomic():
+        profile = Profile.objects.select_for_update().get(user=user)
+        holdings = {
+            holding.ticker_id: holding
+            for holding in Holding.objects.select_for_update().filter(user=user, ticker__in=list(stocks.values()))
+        }
+
+        cash = profile.cash
+        positions = {stock_id: (holding.shares_owned, holding.average_price) for stock_id, holding in holdings.items()}
+        transactions = []
+        for ticker, side, quantity in orders:
+            stock = stocks[ticker]
+            price = prices[ticker]
+            amount = quantity * price
+            shares, average = positions.get(stock.pk, (Decimal('0'), price))
+            if side == 'BUY':
+                average = (shares * average + amount) / (shares + quantity) if shares else price
+                shares += quantity
+                cash -= amount
+            else:
+                if shares < quantity:
+                    raise OrderError(f'Insufficient shares of {ticker} to sell.')
+                shares -= quantity
+                cash += amount
+            positions[stock.pk] = (shares, average)
+            transactions.append(Transaction(user=user, stock=stock, transaction_type=side, quantity=quantity,
+                                            price_per_share=price, total_amount=amount))
+        if cash < 0:
+            raise OrderError('Insufficient balance.')
+        cash = cash.quantize(CENT)
+
+        kept, emptied = [], []
+        for ticker in tickers:
+            stock = stocks[ticker]
+            shares, average = positions[stock.pk]
+            if shares:
+                kept.append(Holding(user=user, ticker=stock, company_name=stock.company_name,
+                                    shares_owned=shares, average_price=average.quantize(CENT)))
+            elif stock.pk in holdings:
+                emptied.append(holdings[stock.pk].pk)
+
+        # Bumping the analytics version in the same write keeps it in step with the basket
+        Profile.objects.filter(pk=profile.pk).update(cash=cash, analytics_version=F('analytics_version') + 1)
+        Holding.objects.bulk_create(kept, update_conflicts=True, unique_fields=['user', 'ticker'],
+                                    update_fields=['shares_owned', 'average_price'])
+        Holding.objects.filter(pk__in=emptied).delete()
+        Transaction.objects.bulk_create(transactions)
+        db_transaction.on_commit(lambda: refresh_snapshots([user.pk]), robust=True)
+        # The basket stands even if its leaderboard refresh fails
+        db_transaction.on_commit(lambda: update_scores([user.pk]), robust=True)
+    return {
+        'fills': [
+            {'ticker': tx.stock.ticker, 'side': tx.transaction_type, 'quantity': tx.quantity,
+             'price_per_share': tx.price_per_share, 'total_amount': tx.total_amount}
+            for tx in transactions
+        ],
+        'cash_remaining': cash,
+    }
@@ -15,6 +15,18 @@ urlpatterns = [
     # User Dashboard
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
 
+    # Strategy backtests
+    path('backtest/', BacktestView.as_view(), name='backtest'),
+
+    # Leaderboard
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+
+    # Intraday portfolio value
+    path('portfolio/intraday/', IntradayView.as_view(), name='portfolio-intraday'),
+
+    # Portfolio Analytics
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+
     # Email Verification
     path('verify/<uidb64>/<token>/', VerifyEmail.as_view(), name='verify-email'),
 
@@ -33,4 +45,8 @@ urlpatterns = [
     # Transactions
     path('buy-stock/<str:ticker>/', BuyStockView.as_view(), name='buy-stock'),
     path('sell-stock/<str:ticker>/', SellStockView.as_view(), name='sell-stock'),
+    path('orders/batch/', BasketOrderView.as_view(), name='basket-orders'),
+    path('orders/', OrderListView.as_view(), name='orders'),
+    path('orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+    path('transactions/', TransactionListView.as_view(), name='transactions'),
 ]
\ No newline at end of file
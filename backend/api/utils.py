@@ -1,4 +1,3 @@
-from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from django.urls import reverse
 from django.contrib.sites.shortcuts import get_current_site
@@ -8,8 +7,9 @@ from django.contrib.auth.tokens import default_token_generator
 from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import datetime
+from .outbox import queue_email
 
-def send_verification_email(user, request):
+def queue_verification_email(user):
     token = default_token_generator.make_token(user)
     uid = urlsafe_base64_encode(force_bytes(user.pk))
     verification_link = f"https://titan-hazel.vercel.app/verify/{uid}/{token}/"
@@ -24,6 +24,5 @@ def send_verification_email(user, request):
         'current_year': datetime.now().year,
     })
 
-    email = EmailMultiAlternatives(subject, '', from_email, [to_email])
-    email.attach_alternative(html_content, "text/html")
-    email.send()
\ No newline at end of file
+    # Delivered by the send_emails worker so registration never waits on SMTP
+    return queue_email(subject, html_content, from_email, to_email)
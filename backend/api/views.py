@@ -6,18 +6,41 @@ from django.core.management import call_command
 from rest_framework.response import Response
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.utils.http import urlsafe_base64_decode
+from django.utils.http import parse_etags, quote_etag, urlsafe_base64_decode
 from django.utils.encoding import force_str
 from django.contrib.auth.tokens import default_token_generator
 from .serializers import *
-from .utils import send_verification_email
+from .utils import queue_verification_email
+from .market_data import aget_history, aget_info
+from .downsample import downsample_series
+from .search import get_ticker_index
+from .analytics import get_analytics
+from .pagination import KeysetPagination
+from .leaderboard import METRICS, get_leaderboard
+from .backtest import STRATEGIES, parameter_grid, sweep
+from .trading import OrderError, execute_basket, execute_order, parse_quantity
+from .orders import cancel_order, place_order
+from .snapshots import load_snapshot, refresh_snapshots, revalue_snapshot
+from .intraday import read_series
+from .market_hours import last_session_day
+from django.conf import settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import *
-import yfinance as yf
-from django.db.models import Q, Case, When, IntegerField
 from decimal import Decimal
-from django.db import transaction as db_transaction
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views import View
+from django.contrib.auth.models import AnonymousUser
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+import asyncio
+import hashlib
 import math
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
+from django.db.models import Max, Subquery
+from django.db.models.functions import TruncMonth, TruncWeek
 
 # Registration View
 class RegisterView(generics.CreateAPIView):
@@ -27,7 +50,7 @@ class RegisterView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        send_verification_email(user, request)
+        queue_verification_email(user)
         return Response({"message": "User registered successfully. Please check your email to verify your account."}, status=status.HTTP_201_CREATED)
 
 # Login View
@@ -76,13 +99,79 @@ class VerifyEmail(APIView):
         else:
             return Response({'error': 'Invalid verification link.'}, status=status.HTTP_400_BAD_REQUEST)
 
-class StockSummary(APIView):
-    def get(self, request, ticker):
+def run_unpinned(fn):
+    """
+    ``fn`` as a coroutine function that runs in the default executor instead of
+    the single thread sync_to_async and the async ORM share by default, so
+    concurrent requests do not queue behind each other. Each call releases
+    its thread's database connection as a finished request would.
+    """
+    def call(*args, **kwargs):
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            if not (info['shortName'] or info['longName']):
-                return Response(
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+def authenticate_jwt(request):
+    """
+    Resolve ``request.user`` from the JWT header for plain async Django views,
+    matching what DRF's JWTAuthentication does for APIViews.
+    """
+    result = JWTAuthentication().authenticate(request)
+    return result[0] if result else AnonymousUser()
+
+@run_unpinned
+def summary_holdings(request, ticker):
+    # Every query the summary needs, so the request uses one worker thread and connection
+    user = authenticate_jwt(request)
+    return Holding.objects.filter(user=user.pk, ticker__ticker=ticker.upper()).values_list('shares_owned', flat=True).first()
+
+class StockSummary(View):
+    async def get(self, request, ticker):
+        try:
+            holdings = await summary_holdings(request, ticker)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            time_periods = {
+                "5d": "5d",
+                "1mo": "1mo",
+                "3mo": "3mo",
+                "1y": "1y",
+                "5y": "5y",
+                "10y": "10y",
+                "ytd": "ytd",
+                "max": "max"
+            }
+            
+            period = request.GET.get('period', '1mo')
+            if period not in time_periods:
+                return JsonResponse(
+                    {"valid": False, "message": "Invalid time period specified."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            points = request.GET.get('points')
+            if points is not None:
+                if not points.isdigit() or int(points) < 3:
+                    return JsonResponse(
+                        {"valid": False, "message": "points must be an integer of at least 3."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                points = int(points)
+
+            # Both upstream lookups run at once
+            info, historical_data = await asyncio.gather(
+                aget_info(ticker),
+                aget_history(ticker, time_periods[period]),
+            )
+            # The latest daily bar carries the current price, so no separate quote is fetched
+            latest = next((close for close in reversed(historical_data['close']) if close is not None), None)
+
+            if not (info.get('shortName') or info.get('longName')):
+                return JsonResponse(
                     {"valid": False, "message": "Invalid ticker symbol."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
@@ -96,7 +185,7 @@ class StockSummary(APIView):
                 "valid": True,
                 "companyName": sanitize(info.get("shortName")) or sanitize(info.get("longName")),
                 "ticker": ticker.upper(),
-                "currentPrice": sanitize(info.get("currentPrice")) or sanitize(info.get("ask")) or sanitize(info.get("regularMarketPreviousClose")),
+                "currentPrice": latest or sanitize(info.get("currentPrice")) or sanitize(info.get("ask")) or sanitize(info.get("regularMarketPreviousClose")),
                 "marketCap": sanitize(info.get("marketCap")) or "--",
                 "volume": sanitize(info.get("volume")),
                 "sector": sanitize(info.get("sector")) or "--",
@@ -104,61 +193,25 @@ class StockSummary(APIView):
                 "exchange": sanitize(info.get("exchange")),
             }
             
-            time_periods = {
-                "5d": "5d",
-                "1mo": "1mo",
-                "3mo": "3mo",
-                "1y": "1y",
-                "5y": "5y",
-                "10y": "10y",
-                "ytd": "ytd",
-                "max": "max"
-            }
-            
-            period = request.GET.get('period', '1mo')
-            if period not in time_periods:
-                return Response(
-                    {"valid": False, "message": "Invalid time period specified."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            hist = stock.history(period=time_periods[period])
-            if hist.empty:
-                return Response(
+            if not historical_data['dates']:
+                return JsonResponse(
                     {"valid": False, "message": "No historical data available for this ticker."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            historical_data = {
-                "dates": hist.index.strftime('%Y-%m-%d').tolist(),
-                "open": [sanitize(x) for x in hist['Open'].tolist()],
-                "high": [sanitize(x) for x in hist['High'].tolist()],
-                "low": [sanitize(x) for x in hist['Low'].tolist()],
-                "close": [sanitize(x) for x in hist['Close'].tolist()],
-                "volume": [sanitize(x) for x in hist['Volume'].tolist()],
-            }
-
-            # Get current holdings of the stock if any
-            user = request.user
-            stockObj = Stock.objects.get(ticker=ticker.upper())
+            if points is not None:
+                historical_data = downsample_series(historical_data, points)
 
-            try:
-                holding = Holding.objects.get(user=user.pk, ticker=stockObj.pk)
-                holdings = holding.shares_owned
-            except Holding.DoesNotExist:
-                holdings = 0
-            
             response_data = {
                 "stockDetails": stock_data,
                 "historicalData": historical_data,
-                "currentHoldings": holdings
+                "currentHoldings": holdings if holdings is not None else 0
             }
             
-            return Response(response_data, status=status.HTTP_200_OK)
+            return JsonResponse(response_data, status=status.HTTP_200_OK)
 
         except Exception as e:
             print(f"Error fetching stock data for ticker {ticker}: {e}")
-            return Response(
+            return JsonResponse(
                 {"valid": False, "message": "An error occurred while fetching stock data."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
@@ -172,123 +225,281 @@ class TickerSuggestionsAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        stocks = Stock.objects.annotate(
-        priority=Case(
-            When(ticker__iexact=query, then=1),
-            default=0,
-            output_field=IntegerField(),
-        )
-        ).filter(
-            Q(ticker__icontains=query) | Q(company_name__icontains=query)
-        ).order_by('-priority', 'ticker')[:10] 
-        
+        tickers = get_ticker_index().search(query, limit=10)
+        found = Stock.objects.in_bulk(tickers, field_name='ticker')
+        stocks = [found[ticker] for ticker in tickers if ticker in found]
+
         serializer = StockSerializer(stocks, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 # Buy Stock View
 class BuyStockView(APIView):
     def post(self, request, ticker):
-        user = request.user
-        quantity = Decimal(request.data.get('quantity'))
+        quantity = parse_quantity(request.data.get('quantity'))
+        if quantity is None:
+            return Response({'error': 'quantity must be a positive number with at most 4 decimal places.'}, status=status.HTTP_400_BAD_REQUEST)
 
         stock = generics.get_object_or_404(Stock, ticker=ticker.upper())
         try:
-            stock.update_current_price()
-        except ValueError as e:
+            cash = execute_order(request.user, stock, 'BUY', quantity)
+        except OrderError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_cost = quantity * stock.current_price
-
-        with db_transaction.atomic():
-            if user.profile.cash < total_cost:
-                return Response({'error': 'Insufficient balance.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            user.profile.cash -= total_cost
-            user.profile.save()
-
-            holding, created = Holding.objects.get_or_create(
-                user=user,
-                ticker=stock,
-                company_name = stock.company_name,
-                defaults={'shares_owned': Decimal('0.0000'),
-                          'average_price': Decimal(stock.current_price)
-                          }
-            )
-            
-            if not created:
-                new_average = ((holding.shares_owned * holding.average_price) + total_cost) / (holding.shares_owned + quantity)
-                holding.average_price = new_average
-            
-            holding.shares_owned += quantity
-            holding.save()
-
-            Transaction.objects.create(
-                user=user,
-                stock=stock,
-                transaction_type='BUY',
-                quantity=quantity,
-                price_per_share=stock.current_price,
-                total_amount=total_cost
-            )
-
-        return Response({'message': 'Stock purchased successfully.', 'cash_remaining': user.profile.cash}, status=status.HTTP_200_OK)
+        return Response({'message': 'Stock purchased successfully.', 'cash_remaining': cash}, status=status.HTTP_200_OK)
 
 # Sell Stock View
 class SellStockView(APIView):
     def post(self, request, ticker):
-        user = request.user
-        quantity = Decimal(request.data.get('quantity'))
+        quantity = parse_quantity(request.data.get('quantity'))
+        if quantity is None:
+            return Response({'error': 'quantity must be a positive number with at most 4 decimal places.'}, status=status.HTTP_400_BAD_REQUEST)
 
         stock = generics.get_object_or_404(Stock, ticker=ticker.upper())
-
+        generics.get_object_or_404(Holding, user=request.user, ticker=stock)
         try:
-            stock.update_current_price()
-        except ValueError as e:
+            cash = execute_order(request.user, stock, 'SELL', quantity)
+        except OrderError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_revenue = quantity * stock.current_price
+        return Response({'message': 'Stock sold successfully.', 'cash_total': cash}, status=status.HTTP_200_OK)
 
-        with db_transaction.atomic():
-            holding = generics.get_object_or_404(Holding, user=user, ticker=stock)
-            if holding.shares_owned < quantity:
-                return Response({'error': 'Insufficient shares to sell.'}, status=status.HTTP_400_BAD_REQUEST)
+class BasketOrderView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-            user.profile.cash += total_revenue
-            user.profile.save()
+    def post(self, request):
+        try:
+            result = execute_basket(request.user, request.data.get('orders'))
+        except OrderError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': 'Orders filled successfully.', **result}, status=status.HTTP_200_OK)
 
-            holding.shares_owned -= quantity
-            if holding.shares_owned == 0:
-                holding.delete()
-            else:
-                holding.save()
-
-            Transaction.objects.create(
-                user=user,
-                stock=stock,
-                transaction_type='SELL',
-                quantity=quantity,
-                price_per_share=stock.current_price,
-                total_amount=total_revenue
+class OrderListView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        orders = Order.objects.filter(user=request.user).select_related('stock').order_by('-created_at', '-pk')
+        order_status = request.GET.get('status')
+        if order_status:
+            if order_status.upper() not in dict(Order.STATUSES):
+                return Response({'error': f'status must be one of {", ".join(dict(Order.STATUSES))}.'}, status=status.HTTP_400_BAD_REQUEST)
+            orders = orders.filter(status=order_status.upper())
+        return Response(OrderSerializer(orders, many=True).data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        stock = generics.get_object_or_404(Stock, ticker=str(request.data.get('ticker') or '').strip().upper())
+        try:
+            order = place_order(
+                request.user,
+                stock,
+                request.data.get('side'),
+                request.data.get('order_type'),
+                request.data.get('quantity'),
+                limit_price=request.data.get('limit_price'),
+                stop_price=request.data.get('stop_price'),
             )
+        except OrderError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+class OrderDetailView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        return Response({'message': 'Stock sold successfully.', 'cash_total': user.profile.cash}, status=status.HTTP_200_OK)
+    def delete(self, request, pk):
+        generics.get_object_or_404(Order, pk=pk, user=request.user)
+        if not cancel_order(request.user, pk):
+            return Response({'error': 'Only open orders can be cancelled.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': 'Order cancelled.'}, status=status.HTTP_200_OK)
+
+def parse_date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({'error': f'{name} must be a date in YYYY-MM-DD format.'})
 
 class DashboardView(APIView):
+    """
+    Holdings from the user's PortfolioSnapshot plus their PortfolioHistory
+    series, optionally limited to ``from``/``to``, reduced in SQL to the last
+    row of each week or month with ``resolution``, or, with ``since``, only
+    rows dated after that day. A weekly or monthly row is dated by the last
+    day it covers, so a delta may carry a newer row for a period the client
+    already has. Responses carry an ETag; a matching If-None-Match gets a
+    304 before anything is serialized.
+    """
     permission_classes = [permissions.IsAuthenticated]
+    RESOLUTIONS = {'daily': None, 'weekly': TruncWeek, 'monthly': TruncMonth}
+
+    def history(self, user, start, end, since, resolution):
+        rows = PortfolioHistory.objects.filter(user=user)
+        if start:
+            rows = rows.filter(date__gte=start)
+        if end:
+            rows = rows.filter(date__lte=end)
+        trunc = self.RESOLUTIONS[resolution]
+        if trunc:
+            period_ends = rows.annotate(period=trunc('date')).values('period').annotate(last=Max('date')).values('last')
+            rows = rows.filter(date__in=Subquery(period_ends))
+        if since:
+            rows = rows.filter(date__gt=since)
+        return rows.order_by('date')
 
     def get(self, request):
         user = request.user
+        params = request.query_params
+        start, end, since = parse_date_param(params, 'from'), parse_date_param(params, 'to'), parse_date_param(params, 'since')
+        resolution = params.get('resolution', 'daily')
+        if resolution not in self.RESOLUTIONS:
+            return Response({'error': f'resolution must be one of {", ".join(self.RESOLUTIONS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        if start and end and start > end:
+            return Response({'error': 'from must not be after to.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Trades and refresh_prices keep the snapshot current. Rebuild it here if the Profile has moved past
+        # the version it was built from, as when a trade's rebuild failed, and revalue it if prices went stale
+        snapshot = load_snapshot(user.pk)
+        max_age = timedelta(seconds=settings.PRICE_MAX_AGE)
+        if snapshot is None or snapshot.analytics_version != snapshot.profile_version:
+            refresh_snapshots([user.pk], live=True)
+            snapshot = load_snapshot(user.pk)
+        elif snapshot.positions and timezone.now() - snapshot.updated_at > max_age:
+            snapshot = revalue_snapshot(snapshot)
+
+        # Every snapshot write moves updated_at, and every trade or history write bumps the analytics version
+        key = [user.pk, start, end, since, resolution, snapshot.updated_at, snapshot.profile_version]
+        etag = quote_etag(hashlib.sha1(repr(key).encode()).hexdigest())
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            portfolio_history_serializer = PortfolioHistorySerializer(self.history(user, start, end, since, resolution), many=True)
+            dashboard_data = {
+                'portfolio_history': portfolio_history_serializer.data,
+                'current_holdings': snapshot.positions,
+                'cash': snapshot.cash,
+                'market_value': snapshot.market_value,
+                'total_value': snapshot.cash + snapshot.market_value,
+                'cost_basis': snapshot.cost_basis,
+                'day_change': snapshot.day_change,
+                'updated_at': snapshot.updated_at,
+            }
+            response = Response(dashboard_data, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        # Browsers revalidate every time instead of showing a stale portfolio
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class IntradayView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        # Served from the sampler's ring buffers only; no quotes or portfolio queries
+        day = last_session_day()
+        points = [{'time': moment, 'value': value} for moment, value in read_series(request.user.pk, day)]
+        return Response({'date': day, 'interval': settings.INTRADAY_INTERVAL, 'points': points}, status=status.HTTP_200_OK)
+
+class AnalyticsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        portfolio_history_qs = PortfolioHistory.objects.filter(user=user).order_by('date')
-        portfolio_history_serializer = PortfolioHistorySerializer(portfolio_history_qs, many=True)
+    def get(self, request):
+        return Response(get_analytics(request.user), status=status.HTTP_200_OK)
 
-        current_holdings_qs = Holding.objects.filter(user=user)
-        current_holdings_serializer = HoldingSerializer(current_holdings_qs, many=True)
+class TransactionListView(generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = TransactionSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = Transaction.objects.filter(user=self.request.user).select_related('stock')
+
+        if params.get('ticker'):
+            queryset = queryset.filter(stock__ticker=params['ticker'].strip().upper())
+        if params.get('side'):
+            side = params['side'].upper()
+            if side not in dict(Transaction.TRANSACTION_TYPES):
+                raise ValidationError({'error': 'side must be BUY or SELL.'})
+            queryset = queryset.filter(transaction_type=side)
+
+        # Bounds are compared as timestamps so the (user, timestamp, id) index still applies
+        tz = timezone.get_current_timezone()
+        start, end = parse_date_param(params, 'from'), parse_date_param(params, 'to')
+        if start:
+            queryset = queryset.filter(timestamp__gte=timezone.make_aware(datetime.combine(start, time.min), tz))
+        if end:
+            queryset = queryset.filter(timestamp__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz))
+        return queryset
+
+class LeaderboardView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        dashboard_data = {
-            'portfolio_history': portfolio_history_serializer.data,
-            'current_holdings': current_holdings_serializer.data,
-        }
+    def get(self, request):
+        metric = request.GET.get('by', 'value')
+        if metric not in METRICS:
+            return Response({'error': f'by must be one of: {", ".join(METRICS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        offset = request.GET.get('offset', '0')
+        limit = request.GET.get('limit', '50')
+        if not offset.isdigit() or not limit.isdigit() or not 1 <= int(limit) <= 100:
+            return Response({'error': 'offset must be a non-negative integer and limit from 1 to 100.'}, status=status.HTTP_400_BAD_REQUEST)
+        offset, limit = int(offset), int(limit)
+
+        board = get_leaderboard()
+        rows = board.page(metric, offset, limit)
+        usernames = dict(User.objects.filter(pk__in=[row[1] for row in rows] + [request.user.pk]).values_list('pk', 'username'))
+
+        def entry(rank, user_id, value, return_pct):
+            return {'rank': rank, 'username': usernames.get(user_id), 'portfolio_value': value, 'return_pct': return_pct}
+
+        me = board.scores.get(request.user.pk)
+        return Response({
+            'count': len(board),
+            'results': [entry(*row) for row in rows],
+            'me': entry(board.rank(metric, request.user.pk), request.user.pk, *me) if me else None,
+        }, status=status.HTTP_200_OK)
+
+
+class BacktestView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        serializer = DashboardSerializer(dashboard_data)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+    def post(self, request):
+        tickers = request.data.get('tickers')
+        if not isinstance(tickers, list) or not 1 <= len(tickers) <= settings.BACKTEST_MAX_TICKERS or not all(isinstance(t, str) for t in tickers):
+            return Response({'error': f'tickers must be a list of 1 to {settings.BACKTEST_MAX_TICKERS} symbols.'}, status=status.HTTP_400_BAD_REQUEST)
+        tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers))
+
+        try:
+            start = date.fromisoformat(request.data.get('start', ''))
+            end = date.fromisoformat(request.data.get('end') or timezone.localdate().isoformat())
+        except (TypeError, ValueError):
+            return Response({'error': 'start and end must be dates in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
+        if start >= end:
+            return Response({'error': 'start must be before end.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        strategy = request.data.get('strategy')
+        if strategy not in STRATEGIES:
+            return Response({'error': f'strategy must be one of: {", ".join(STRATEGIES)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        params = request.data.get('params') or {}
+        try:
+            initial_cash = Decimal(str(request.data.get('initial_cash', Profile._meta.get_field('cash').default)))
+            if not isinstance(params, dict) or initial_cash <= 0:
+                raise ValueError('params must be an object and initial_cash positive.')
+            runs = len(parameter_grid(strategy, params))
+        except (ArithmeticError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if runs > settings.BACKTEST_MAX_RUNS:
+            return Response({'error': f'{runs} parameter combinations requested; the limit is {settings.BACKTEST_MAX_RUNS}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        stored = set(PriceBar.objects.filter(stock__ticker__in=tickers).values_list('stock__ticker', flat=True).distinct())
+        missing = [ticker for ticker in tickers if ticker not in stored]
+        if missing:
+            return Response({'error': f'No stored price history for: {", ".join(missing)}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = sweep(tickers, start, end, strategy, params, initial_cash=initial_cash)
+        return Response({
+            'strategy': strategy,
+            'tickers': tickers,
+            'start': start,
+            'end': end,
+            'runs': runs,
+            'results': results,
+        }, status=status.HTTP_200_OK)
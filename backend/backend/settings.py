@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -70,8 +71,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Request histograms are served at /metrics to these addresses only
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -92,8 +100,87 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Market data provider
+# Any api.market_data.MarketDataProvider subclass. FakeMarketDataProvider is an
+# offline, deterministic provider for tests and benchmarks.
+MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', 'api.market_data.YFinanceProvider')
+MARKET_DATA_PROVIDER_OPTIONS = {}
+# RecordingProvider passes calls through to another provider (YFinanceProvider
+# by default) and saves the responses here; ReplayProvider serves them back
+# with no network access.
+MARKET_DATA_RECORDINGS = os.getenv('MARKET_DATA_RECORDINGS', str(BASE_DIR / 'market_data_recordings'))
+
+# Market data caching
+# Quotes are kept in a per-process LRU in front of the cache backend named by
+# QUOTE_CACHE_ALIAS. Point that alias at a shared backend (e.g. Redis) to share
+# quotes between workers.
+QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', 15))
+QUOTE_CACHE_LOCAL_SIZE = 2048
+QUOTE_CACHE_ALIAS = 'default'
+
+# Each worker keeps the ticker search index in memory and checks at most every
+# TICKER_INDEX_CHECK_SECONDS whether stocks were added or import_stocks bumped
+# the index generation in the QUOTE_CACHE_ALIAS cache. That bump only reaches
+# other processes through a shared cache, so an index older than
+# TICKER_INDEX_MAX_AGE seconds is rebuilt regardless.
+TICKER_INDEX_CHECK_SECONDS = int(os.getenv('TICKER_INDEX_CHECK_SECONDS', 30))
+TICKER_INDEX_MAX_AGE = int(os.getenv('TICKER_INDEX_MAX_AGE', 3600))
+
+# refresh_prices polls held tickers every PRICE_REFRESH_INTERVAL seconds and
+# writes Stock.current_price. Reads trust a stored price up to PRICE_MAX_AGE
+# seconds old and fall back to the quote cache after that.
+PRICE_REFRESH_INTERVAL = int(os.getenv('PRICE_REFRESH_INTERVAL', 30))
+PRICE_MAX_AGE = int(os.getenv('PRICE_MAX_AGE', 90))
+
+# Threads that async views use to wait on blocking market data calls
+MARKET_DATA_THREADS = int(os.getenv('MARKET_DATA_THREADS', 256))
+
+# Daily history is cached for HISTORY_CACHE_TTL seconds during regular trading
+# hours and until the next session opens otherwise. MARKET_HOLIDAYS lists
+# exchange holidays as ISO dates.
+HISTORY_CACHE_TTL = int(os.getenv('HISTORY_CACHE_TTL', 60))
+MARKET_TIME_ZONE = 'America/New_York'
+MARKET_HOLIDAYS = [day for day in os.getenv('MARKET_HOLIDAYS', '').split(',') if day]
+
+# /api/analytics/ results are cached per user until a trade or history row
+# lands, and for at most ANALYTICS_CACHE_TTL seconds so unrealized P&L follows
+# prices. RISK_FREE_RATE is the annual rate the Sharpe ratio is measured against.
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 60))
+RISK_FREE_RATE = float(os.getenv('RISK_FREE_RATE', 0.0))
+
+# /api/backtest/ limits. Parameter sweeps of at least BACKTEST_PARALLEL_MIN_RUNS
+# sets run across a pool of BACKTEST_WORKERS processes.
+BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', os.cpu_count() or 1))
+BACKTEST_PARALLEL_MIN_RUNS = int(os.getenv('BACKTEST_PARALLEL_MIN_RUNS', 32))
+BACKTEST_MAX_TICKERS = 50
+BACKTEST_MAX_RUNS = 500
+
+# sample_intraday records each active user's portfolio value every
+# INTRADAY_INTERVAL seconds of the session in ring buffers kept in the
+# INTRADAY_CACHE_ALIAS cache, and rolls the last value into PortfolioHistory at
+# the close. The file cache lets web workers on the same host read what the
+# sampler wrote; point the alias at a shared backend (e.g. Redis) across hosts.
+INTRADAY_INTERVAL = int(os.getenv('INTRADAY_INTERVAL', 300))
+INTRADAY_CACHE_ALIAS = 'intraday'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'intraday': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('INTRADAY_CACHE_PATH', str(BASE_DIR / 'intraday_cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# sync_bars publishes every stored close as a days x tickers array here, which
+# worker processes memory-map and share
+PRICE_MATRIX_PATH = os.getenv('PRICE_MATRIX_PATH', str(BASE_DIR / 'price_matrix'))
+
 CRONJOBS = [
     ('0 0 * * *', 'django.core.management.call_command', ['update_portfolio_history']),
+    # Fallback delivery when no long-running send_emails worker is deployed
+    ('* * * * *', 'django.core.management.call_command', ['send_emails'], {'once': True}),
 ]
 
 # Database
@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from api.views import *
 from django.urls import path, include
+from api.instrumentation import metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -25,4 +26,5 @@ from rest_framework_simplejwt.views import (
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file